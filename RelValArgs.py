@@ -8,7 +8,10 @@ from _py2with3compatibility import run_cmd
 monitor_script = ""
 if "CMS_DISABLE_MONITORING" not in environ:
     monitor_script = dirname(abspath(__file__)) + "/monitor_workflow.py"
-    e, o = run_cmd("python3 -c 'import psutil'")
+    e = 0
+    if environ.get("CMS_MONITOR_SAMPLER", "") != "proc":
+        # the /proc sampler of monitor_sampler.py does not need psutil
+        e, o = run_cmd("python3 -c 'import psutil'")
     if e:
         e, o = run_cmd("python2 -c 'import psutil'")
         if e:
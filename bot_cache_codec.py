@@ -0,0 +1,243 @@
+"""
+Compact encoding of the cms-bot PR cache (see process_pr.py) with delta updates.
+
+Encoded data is "v2:" followed by ";" separated base64 segments: the first one
+is the full cache and each of the following is a delta (the values set and the
+keys deleted since the previous state). New deltas are only appended, so the
+beginning of the encoded data (i.e. the already written cache comments) does not
+change.
+
+Each segment is a zlib compressed, msgpack-like binary layout:
+  - every string is written once and then referenced by its index (github users,
+    emoji and dict keys repeat a lot)
+  - file paths are stored as a list of (also dictionary coded) path components
+  - 40 chars hex SHAs are stored as 20 bytes, numeric strings (e.g. comment ids
+    used as keys) as integers
+"""
+
+import base64
+import re
+import struct
+import zlib
+
+BOT_CACHE_V2_PREFIX = "v2:"
+BOT_CACHE_MAX_DELTAS = 16
+
+# Type tags, do not renumber: they are part of the stored format
+T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR = range(6)
+T_REF, T_SHA, T_NUMSTR, T_LIST, T_DICT, T_PATH = range(6, 12)
+REGEX_SHA = re.compile("^[0-9a-f]{40}$")
+REGEX_NUMSTR = re.compile("^[1-9][0-9]{0,17}$")
+
+
+class BotCacheDecodeError(Exception):
+    pass
+
+
+def _write_uint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_uint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+
+class _Encoder(object):
+    def __init__(self):
+        self.out = bytearray()
+        self.strings = {}
+
+    def encode(self, value):
+        out = self.out
+        if value is None:
+            out.append(T_NONE)
+        elif value is True:
+            out.append(T_TRUE)
+        elif value is False:
+            out.append(T_FALSE)
+        elif isinstance(value, int):
+            out.append(T_INT)
+            _write_uint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+        elif isinstance(value, float):
+            out.append(T_FLOAT)
+            out.extend(struct.pack(">d", value))
+        elif isinstance(value, str):
+            if value in self.strings:
+                out.append(T_REF)
+                _write_uint(out, self.strings[value])
+                return
+            self.strings[value] = len(self.strings)
+            if REGEX_SHA.match(value):
+                out.append(T_SHA)
+                out.extend(bytes.fromhex(value))
+            elif REGEX_NUMSTR.match(value):
+                out.append(T_NUMSTR)
+                _write_uint(out, int(value))
+            elif "/" in value:
+                parts = value.split("/")
+                out.append(T_PATH)
+                _write_uint(out, len(parts))
+                for part in parts:
+                    self.encode(part)
+            else:
+                data = value.encode("utf-8")
+                out.append(T_STR)
+                _write_uint(out, len(data))
+                out.extend(data)
+        elif isinstance(value, (list, tuple)):
+            out.append(T_LIST)
+            _write_uint(out, len(value))
+            for v in value:
+                self.encode(v)
+        elif isinstance(value, dict):
+            out.append(T_DICT)
+            _write_uint(out, len(value))
+            for k in sorted(value):
+                self.encode(k)
+                self.encode(value[k])
+        else:
+            raise TypeError("Unable to encode %s in bot cache" % type(value))
+
+
+class _Decoder(object):
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+        self.strings = []
+
+    def decode(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag == T_NONE:
+            return None
+        if tag == T_TRUE:
+            return True
+        if tag == T_FALSE:
+            return False
+        if tag == T_INT:
+            value, self.pos = _read_uint(self.data, self.pos)
+            return (value >> 1) if not (value & 1) else -((value + 1) >> 1)
+        if tag == T_FLOAT:
+            self.pos += 8
+            return struct.unpack(">d", self.data[self.pos - 8 : self.pos])[0]
+        if tag == T_REF:
+            index, self.pos = _read_uint(self.data, self.pos)
+            return self.strings[index]
+        if tag == T_SHA:
+            self.pos += 20
+            value = self.data[self.pos - 20 : self.pos].hex()
+        elif tag == T_NUMSTR:
+            value, self.pos = _read_uint(self.data, self.pos)
+            value = str(value)
+        elif tag == T_STR:
+            size, self.pos = _read_uint(self.data, self.pos)
+            self.pos += size
+            value = self.data[self.pos - size : self.pos].decode("utf-8")
+        elif tag == T_PATH:
+            size, self.pos = _read_uint(self.data, self.pos)
+            index = len(self.strings)
+            self.strings.append(None)
+            self.strings[index] = "/".join([self.decode() for _ in range(size)])
+            return self.strings[index]
+        elif tag == T_LIST:
+            size, self.pos = _read_uint(self.data, self.pos)
+            return [self.decode() for _ in range(size)]
+        elif tag == T_DICT:
+            size, self.pos = _read_uint(self.data, self.pos)
+            res = {}
+            for _ in range(size):
+                k = self.decode()
+                res[k] = self.decode()
+            return res
+        else:
+            raise BotCacheDecodeError("Invalid tag %s at %s" % (tag, self.pos - 1))
+        self.strings.append(value)
+        return value
+
+
+def encode_segment(value):
+    enc = _Encoder()
+    enc.encode(value)
+    return base64.b64encode(zlib.compress(bytes(enc.out), 9)).decode("ascii")
+
+
+def decode_segment(segment):
+    try:
+        return _Decoder(zlib.decompress(base64.b64decode(segment))).decode()
+    except (ValueError, IndexError, zlib.error) as e:
+        raise BotCacheDecodeError(str(e))
+
+
+def diff_bot_cache(old, new, path=None, delta=None):
+    """Returns {"s": [[path, value], ...], "d": [path, ...]} to go from old to new"""
+    if delta is None:
+        delta = {"s": [], "d": []}
+    path = path or []
+    for k in sorted(old):
+        if k not in new:
+            delta["d"].append(path + [k])
+    for k in sorted(new):
+        if (k in old) and isinstance(old[k], dict) and isinstance(new[k], dict):
+            diff_bot_cache(old[k], new[k], path + [k], delta)
+        elif (k not in old) or (old[k] != new[k]) or (type(old[k]) != type(new[k])):
+            delta["s"].append([path + [k], new[k]])
+    return delta
+
+
+def apply_bot_cache_delta(cache, delta):
+    for path in delta["d"]:
+        obj = cache
+        for k in path[:-1]:
+            obj = obj[k]
+        del obj[path[-1]]
+    for path, value in delta["s"]:
+        obj = cache
+        for k in path[:-1]:
+            obj = obj.setdefault(k, {})
+        obj[path[-1]] = value
+    return cache
+
+
+def is_bot_cache_v2(data):
+    return data.startswith(BOT_CACHE_V2_PREFIX)
+
+
+def decode_bot_cache(data):
+    segments = data[len(BOT_CACHE_V2_PREFIX) :].split(";")
+    cache = decode_segment(segments[0])
+    for segment in segments[1:]:
+        apply_bot_cache_delta(cache, decode_segment(segment))
+    return cache
+
+
+def encode_bot_cache(cache, old_data=""):
+    """
+    Returns the encoded cache. If old_data is a v2 encoded cache then the changes are
+    appended to it as a new delta, unless there are already too many deltas.
+    """
+    if old_data and is_bot_cache_v2(old_data):
+        try:
+            old_cache = decode_bot_cache(old_data)
+        except BotCacheDecodeError:
+            old_cache = None
+        if old_cache is not None:
+            delta = diff_bot_cache(old_cache, cache)
+            if not (delta["s"] or delta["d"]):
+                return old_data
+            segments = old_data[len(BOT_CACHE_V2_PREFIX) :].split(";")
+            segment = encode_segment(delta)
+            deltas_size = sum(len(s) for s in segments[1:]) + len(segment)
+            if (len(segments) <= BOT_CACHE_MAX_DELTAS) and (deltas_size < len(segments[0])):
+                return old_data + ";" + segment
+    return BOT_CACHE_V2_PREFIX + encode_segment(cache)
@@ -8,6 +8,7 @@ Copyright (c) 2008 CERN. All rights reserved.
 from __future__ import print_function
 import sys, os, re, time
 import getopt
+from buildLogRules import getBuildLogRules
 
 if sys.version_info[0] == 3:
 
@@ -74,7 +75,14 @@ class LogFileAnalyzer(object):
     """docstring for LogFileAnalyzer"""
 
     def __init__(
-        self, topDirIn=".", topUrlIn="", verbose=-1, pkgsList=None, release=None, ignoreWarnings=[]
+        self,
+        topDirIn=".",
+        topUrlIn="",
+        verbose=-1,
+        pkgsList=None,
+        release=None,
+        ignoreWarnings=[],
+        jobs=1,
     ):
         super(LogFileAnalyzer, self).__init__()
 
@@ -91,6 +99,8 @@ class LogFileAnalyzer(object):
         self.release = release
         self.pkgsList = pkgsList
         self.verbose = verbose
+        self.jobs = jobs
+        self.phaseTimes = []
 
         self.tagList = {}
 
@@ -165,8 +175,22 @@ class LogFileAnalyzer(object):
         if self.verbose > 0:
             print("going to analyze ", len(packageList), "files.")
 
-        for logFile in packageList:
-            self.analyzeFile(logFile)
+        if self.jobs > 1:
+            pool = getPool(self.jobs)
+            args = [(logFile, self.release, self.ignoreWarnings) for logFile in packageList]
+            matches = pool.map(matchLogFile, args, chunksize=8)
+            pool.close()
+            pool.join()
+        else:
+            matches = [
+                matchLogFile((logFile, self.release, self.ignoreWarnings))
+                for logFile in packageList
+            ]
+        self.phaseTimes.append(["analyzing log files", time.time() - start])
+
+        mergeStart = time.time()
+        for logFile, found in zip(packageList, matches):
+            self.analyzeFile(logFile, found)
 
         pkgDone = []
         for pkg in self.packageList:
@@ -184,6 +208,7 @@ class LogFileAnalyzer(object):
                 self.pkgOK.append(pkg)
 
         stop = time.time()
+        self.phaseTimes.append(["merging package results", stop - mergeStart])
         self.anaTime = stop - start
         pass
 
@@ -209,14 +234,28 @@ class LogFileAnalyzer(object):
         )
         start = time.time()
         self.makeHTMLSummaryPage()
+        self.phaseTimes.append(["creating summary page", time.time() - start])
+        pkgStart = time.time()
+        htmlPkgs = []
         for key in self.errorKeys:
-            pkgList = sorted(self.errMap[key], key=lambda x: x.name())
-            for pkg in pkgList:
+            htmlPkgs += sorted(self.errMap[key], key=lambda x: x.name())
+        htmlPkgs += self.pkgOK
+        if self.jobs > 1:
+            global HTML_JOBS
+            HTML_JOBS = (self, htmlPkgs)
+            pool = getPool(self.jobs)
+            pool.map(makeHTMLLogFileJob, range(len(htmlPkgs)), chunksize=8)
+            pool.close()
+            pool.join()
+            HTML_JOBS = None
+        else:
+            for pkg in htmlPkgs:
                 self.makeHTMLLogFile(pkg)
-        for pkg in self.pkgOK:
-            self.makeHTMLLogFile(pkg)
         stop = time.time()
+        self.phaseTimes.append(["creating package pages", stop - pkgStart])
         print("creating html pages took ", str(stop - start), "sec.")
+        for phase, phaseTime in self.phaseTimes:
+            print("  %-26s: %.3f sec. (jobs: %s)" % (phase, phaseTime, self.jobs))
 
     def makeHTMLSummaryPage(self):
         keyList = self.errorKeys
@@ -391,7 +430,12 @@ class LogFileAnalyzer(object):
             return
         htmlDir = "../html/" + pkg.name() + "/"
         if not os.path.exists(htmlDir):
-            os.makedirs(htmlDir)
+            try:
+                os.makedirs(htmlDir)
+            except OSError:
+                # another job might have created the subsystem directory
+                if not os.path.isdir(htmlDir):
+                    raise
         htmlFileName = htmlDir + "log.html"
 
         logFileName = pkg.name() + "/build.log"
@@ -447,317 +491,61 @@ class LogFileAnalyzer(object):
         htmlFile.write("</html>\n")
         htmlFile.close()
 
-    def analyzeFile(self, fileNameIn):
-        """read in file and check for errors"""
+    def analyzeFile(self, fileNameIn, matches=None):
+        """read in file and check for errors, unless the matches were found by a job"""
         subsys, pkg, logFile = fileNameIn.split("/")
 
         if self.verbose > 5:
             print("analyzing file : ", fileNameIn)
 
-        fileIn = open(fileNameIn, "r")
-        shLib = "so"
-        if os.uname()[0] == "Darwin":
-            shLib = "dylib"
-        errorInf = [
-            {str("^.*? cannot find -l(.*?)$"): ["linkError", 'missing library "%s"']},
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/src/"
-                    + subsys
-                    + pkg
-                    + "/classes_rflx\\.cpp"
-                ): ["dictError", "for package dictionary"]
-            },
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/src/"
-                    + subsys
-                    + pkg
-                    + "/.*?\\."
-                    + shLib
-                ): ["linkError", "for package library"]
-            },
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/src/"
-                    + subsys
-                    + pkg
-                    + "/.*?\\.o"
-                ): ["compError", "for package library"]
-            },
-            {
-                str("^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/bin/(.*?)/.*?\\.o"): [
-                    "compError",
-                    "for executable %s",
-                ]
-            },
-            {
-                str("^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/bin/(.*?)/\1"): [
-                    "linkError",
-                    "for executable %s",
-                ]
-            },
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/bin/(.*?)/lib\1\\."
-                    + shLib
-                ): ["linkError", "for shared library %s in bin"]
-            },
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/test/stubs/lib(.*?)\\."
-                    + shLib
-                ): ["linkError", "for shared library %s in test/stubs"]
-            },
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/test/(.*?)/.*?\\."
-                    + shLib
-                ): ["linkError", "for shared library %s in test"]
-            },
-            {
-                str("^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/test/stubs/.*?\\.o"): [
-                    "compError",
-                    "for library in test/stubs",
-                ]
-            },
-            {
-                str("^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/test/(.*?)/.*?\\.o"): [
-                    "compError",
-                    "for executable %s in test",
-                ]
-            },
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/test/(.*?)\\." + shLib
-                ): [
-                    "linkError",
-                    "for shared library %s in test",
-                ]
-            },
-            {
-                str("^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/test/(.*?)\\.o"): [
-                    "compError",
-                    "for executable %s in test",
-                ]
-            },
-            {
-                str("^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/test/(.*?)/\1"): [
-                    "linkError",
-                    "for executable %s in test",
-                ]
-            },
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/plugins/(.*?)/.*?\\.o"
-                ): [
-                    "compError",
-                    "for plugin %s in plugins",
-                ]
-            },
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/plugins/(.*?)/lib.*?\\."
-                    + shLib
-                ): ["linkError", "for plugin library %s in plugins"]
-            },
-            {
-                str("^ *\\*\\*\\* Break \\*\\*\\* illegal instruction"): [
-                    "compError",
-                    "Break illegal instruction",
-                ]
-            },
-            {str("^AttributeError: .*"): ["pythonError", "importing another module"]},
-            {str("^ImportError: .*"): ["pythonError", "importing another module"]},
-            {str("^SyntaxError: .*"): ["pythonError", "syntax error in module"]},
-            {str("^NameError: .*"): ["pythonError", "name error in module"]},
-            {str("^TypeError: .*"): ["pythonError", "type error in module"]},
-            {str("^ValueError: .*"): ["pythonError", "value error in module"]},
-            {
-                str(
-                    "^gmake: \\*\\*\\* .*?/src/" + subsys + "/" + pkg + "/test/data/download\\.url"
-                ): [
-                    "dwnlError",
-                    "for file in data/download.url in test",
-                ]
-            },
-            {
-                str(
-                    "^ *(/.*?/"
-                    + self.release
-                    + "/|)src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + ".*?\\:\\d*\\: warning: "
-                ): ["compWarning", "for file in package"]
-            },
-            {
-                str("^ *(/.*?/" + self.release + "/|)src/.*?\\:\\d+\\: warning: "): [
-                    "compWarning",
-                    "for file in release",
-                ]
-            },
-            {
-                str(
-                    "^ *(/.*?/"
-                    + self.release
-                    + "/|)src/.*?\\([0-9]+\\)\\: warning #[0-9]+-[A-Z]: "
-                ): [
-                    "compWarning",
-                    "for file in release",
-                ]
-            },
-            {str("^Warning: "): ["compWarning", "for file in package"]},
-            {
-                str(
-                    "^ *(/.*?/"
-                    + self.release
-                    + "/|)src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + ".*?\\:\\d+\\: error: "
-                ): ["compError", "for file in package"]
-            },
-            {
-                str("^ *(/.*?/" + self.release + "/|)src/.*?\\:\\d+\\: error: "): [
-                    "compError",
-                    "for file in release",
-                ]
-            },
-            {str("^.*?\\:\\d+\\: error: "): ["compError", "for file in externals"]},
-            {
-                str(
-                    "^ *tmp/.*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/src/(.*?)/lib.*?\\."
-                    + shLib
-                    + "\\: undefined reference to .*"
-                ): ["linkError", "for package library %s "]
-            },
-            {
-                str(
-                    "^ *tmp/.*?/src/"
-                    + subsys
-                    + "/"
-                    + pkg
-                    + "/plugins/(.*?)/lib.*?\\."
-                    + shLib
-                    + "\\: undefined reference to .*"
-                ): ["linkError", "for plugin library %s in plugins"]
-            },
-            {
-                str("error: class .+ has a different checksum for ClassVersion"): [
-                    "compError",
-                    "for a different checksum for ClassVersion",
-                ]
-            },
-            {
-                str("^.*: (more undefined references to|undefined reference to).*"): [
-                    "compError",
-                    "Missing symbols in a package",
-                ]
-            },
-        ]
+        rules = getBuildLogRules(self.release)
+        if matches is None:
+            matches = matchLogFile((fileNameIn, self.release, self.ignoreWarnings))
+        pkgInfo = PackageInfo(subsys, pkg)
+        for lineNo, index, msg, ignored in matches:
+            errTyp, msg = rules.getError(index, msg, ignored)
+            if errTyp in self.nErrorInfo.keys():
+                self.nErrorInfo[errTyp] += 1
+            else:
+                self.nErrorInfo[errTyp] = 1
+            pkgInfo.addErrInfo(ErrorInfo(errTyp, msg), lineNo)
 
-        miscErrRe = re.compile("^gmake: \\*\\*\\* (.*)$")
-        genericLinkErrRe = re.compile(
-            "^gmake: \\*\\*\\* \\[tmp/.*?/lib.*?" + shLib + "\\] Error 1"
-        )
+        self.packageList.append(pkgInfo)
 
-        if "_gcc46" in os.environ["SCRAM_ARCH"]:
-            errorInf.append(
-                {str("^.*?:\\d+\\: warning\\: "): ["compWarning", "from external in package"]}
-            )
-        else:
-            errorInf.append(
-                {str("^.*?:\\d+\\: warning\\: "): ["ignoreWarning", "from external in package"]}
-            )
-            errorInf.append(
-                {str("^.*?ERROR:Private Header:"): ["compError", "Private header usage."]}
-            )
-        errors = []
-        for errI in errorInf:
-            for err, info in errI.items():
-                errors.append({re.compile(err): info})
+        return
 
-        pkgInfo = PackageInfo(subsys, pkg)
-        lineNo = -1
-        for line in fileIn:
-            lineNo += 1
-            errFound = False
-            for errI in errors:
-                isMatched = False
-                for errRe, info in errI.items():
-                    errMatch = errRe.match(line)
-                    if errMatch:
-                        errFound = True
-                        isMatched = True
-                        errTyp, msg = info
-                        if (
-                            self.ignoreWarnings
-                            and (errTyp == "compWarning")
-                            and [w for w in self.ignoreWarnings if w in line]
-                        ):
-                            errTyp = "ignoreWarning"
-                        if "%s" in msg:
-                            msg = info[1] % errMatch.groups(1)
-                        if errTyp in self.nErrorInfo.keys():
-                            self.nErrorInfo[errTyp] += 1
-                        else:
-                            self.nErrorInfo[errTyp] = 1
-                        pkgInfo.addErrInfo(ErrorInfo(errTyp, msg), lineNo)
-                        break
-                if isMatched:
-                    break
-            if not errFound:
-                miscErrMatch = miscErrRe.match(line)
-                if miscErrMatch:
-                    if not genericLinkErrRe.match(line):
-                        errTyp = "miscError"
-                        msg = "Unknown error found: %s" % miscErrMatch.groups(1)
-                        if errTyp in self.nErrorInfo.keys():
-                            self.nErrorInfo[errTyp] += 1
-                        else:
-                            self.nErrorInfo[errTyp] = 1
-                        pkgInfo.addErrInfo(ErrorInfo(errTyp, msg), lineNo)
 
+# ================================================================================
+
+# (analyzer, packages) whose html pages are created by the (forked) jobs
+HTML_JOBS = None
+
+
+def getPool(jobs):
+    from multiprocessing import get_context
+
+    return get_context("fork").Pool(jobs)
+
+
+def matchLogFile(args):
+    """
+    returns the matches (see buildLogRules.BuildLogRules.matchLines) of a build.log.
+    Only rule indices and formatted messages are returned, so the PackageInfo objects
+    are always created in the main process from the same rule objects and the pickled
+    results do not depend on the number of jobs.
+    """
+    fileNameIn, release, ignoreWarnings = args
+    subsys, pkg, logFile = fileNameIn.split("/")
+    fileIn = open(fileNameIn, "r")
+    try:
+        return getBuildLogRules(release).matchLines(fileIn, subsys, pkg, ignoreWarnings)
+    finally:
         fileIn.close()
 
-        self.packageList.append(pkgInfo)
 
-        return
+def makeHTMLLogFileJob(index):
+    analyzer, packages = HTML_JOBS
+    analyzer.makeHTMLLogFile(packages[index])
 
 
 # ================================================================================
@@ -769,6 +557,7 @@ help_message = """
      -p, --pkgList <file>: Path to PackageList.cmssw file
      -t, --topURL  <url> : the base URL to use for generating the html files
      -v, --verbose <lvl> : set verbosity level, the higher the number, the more verbose printout you will get
+     -j, --jobs <n>      : number of parallel jobs to analyze the log files and create the html pages
 
 Example:
 when run in: /build/intBld/rc/wed-21/CMSSW_3_1_X_2009-07-08-2100/tmp/slc4_ia32_gcc345/cache/log/src as:
@@ -793,6 +582,7 @@ def main(argv=None):
         pkgList += "/src/PackageList.cmssw"
     rel = os.getenv("CMSSW_VERSION", "master")
     igWarning = []
+    jobs = 1
     if argv is None:
         argv = sys.argv
 
@@ -800,7 +590,7 @@ def main(argv=None):
         try:
             opts, args = getopt.getopt(
                 argv[1:],
-                "hv:l:t:p:r:",
+                "hv:l:t:p:r:j:",
                 [
                     "help",
                     "verbose=",
@@ -809,6 +599,7 @@ def main(argv=None):
                     "pkgList=",
                     "release=",
                     "ignoreWarning=",
+                    "jobs=",
                 ],
             )
         except getopt.error as msg:
@@ -828,6 +619,8 @@ def main(argv=None):
                 pkgList = value
             if option in ("-t", "--topURL"):
                 topURL = value
+            if option in ("-j", "--jobs"):
+                jobs = int(value)
             if option == "--ignoreWarning":
                 igWarning = [w.strip() for w in value.split(",") if w.strip()]
 
@@ -837,7 +630,7 @@ def main(argv=None):
         if not os.path.exists(logDir):
             return
 
-        lfa = LogFileAnalyzer(logDir, topURL, verbose, pkgList, rel, igWarning)
+        lfa = LogFileAnalyzer(logDir, topURL, verbose, pkgList, rel, igWarning, jobs)
         lfa.analyze()
         lfa.report()
 
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Error/warning rules of buildLogAnalyzer.py.
+
+The rules are ordered regexps (first match wins). Most of them only depend on the
+release and are compiled once per run; the ones which depend on the package
+(subsys/pkg) are compiled lazily, only when a line of that package could match.
+Each rule has a literal which must be part of any line it matches: lines without
+any of these literals (i.e. almost all the lines of a build log) are skipped with
+a single prefilter search, the others are only tried against the rules whose
+literal they contain.
+"""
+
+from __future__ import print_function
+import os, re
+
+GMAKE = "gmake: *** "
+GMAKE_RE = "^gmake: \\*\\*\\* .*?/src/%(subsys)s/%(pkg)s"
+RELEASE_SRC_RE = "^ *(/.*?/%(release)s/|)src/"
+
+# (regexp, error type, message, literal which must be in the matched line)
+BUILD_LOG_RULES = [
+    ("^.*? cannot find -l(.*?)$", "linkError", 'missing library "%s"', " cannot find -l"),
+    (
+        GMAKE_RE + "/src/%(subsys)s%(pkg)s/classes_rflx\\.cpp",
+        "dictError",
+        "for package dictionary",
+        GMAKE,
+    ),
+    (
+        GMAKE_RE + "/src/%(subsys)s%(pkg)s/.*?\\.%(shLib)s",
+        "linkError",
+        "for package library",
+        GMAKE,
+    ),
+    (GMAKE_RE + "/src/%(subsys)s%(pkg)s/.*?\\.o", "compError", "for package library", GMAKE),
+    (GMAKE_RE + "/bin/(.*?)/.*?\\.o", "compError", "for executable %s", GMAKE),
+    (GMAKE_RE + "/bin/(.*?)/\1", "linkError", "for executable %s", GMAKE),
+    (
+        GMAKE_RE + "/bin/(.*?)/lib\1\\.%(shLib)s",
+        "linkError",
+        "for shared library %s in bin",
+        GMAKE,
+    ),
+    (
+        GMAKE_RE + "/test/stubs/lib(.*?)\\.%(shLib)s",
+        "linkError",
+        "for shared library %s in test/stubs",
+        GMAKE,
+    ),
+    (
+        GMAKE_RE + "/test/(.*?)/.*?\\.%(shLib)s",
+        "linkError",
+        "for shared library %s in test",
+        GMAKE,
+    ),
+    (GMAKE_RE + "/test/stubs/.*?\\.o", "compError", "for library in test/stubs", GMAKE),
+    (GMAKE_RE + "/test/(.*?)/.*?\\.o", "compError", "for executable %s in test", GMAKE),
+    (
+        GMAKE_RE + "/test/(.*?)\\.%(shLib)s",
+        "linkError",
+        "for shared library %s in test",
+        GMAKE,
+    ),
+    (GMAKE_RE + "/test/(.*?)\\.o", "compError", "for executable %s in test", GMAKE),
+    (GMAKE_RE + "/test/(.*?)/\1", "linkError", "for executable %s in test", GMAKE),
+    (GMAKE_RE + "/plugins/(.*?)/.*?\\.o", "compError", "for plugin %s in plugins", GMAKE),
+    (
+        GMAKE_RE + "/plugins/(.*?)/lib.*?\\.%(shLib)s",
+        "linkError",
+        "for plugin library %s in plugins",
+        GMAKE,
+    ),
+    (
+        "^ *\\*\\*\\* Break \\*\\*\\* illegal instruction",
+        "compError",
+        "Break illegal instruction",
+        "*** Break *** illegal instruction",
+    ),
+    ("^AttributeError: .*", "pythonError", "importing another module", "AttributeError: "),
+    ("^ImportError: .*", "pythonError", "importing another module", "ImportError: "),
+    ("^SyntaxError: .*", "pythonError", "syntax error in module", "SyntaxError: "),
+    ("^NameError: .*", "pythonError", "name error in module", "NameError: "),
+    ("^TypeError: .*", "pythonError", "type error in module", "TypeError: "),
+    ("^ValueError: .*", "pythonError", "value error in module", "ValueError: "),
+    (
+        GMAKE_RE + "/test/data/download\\.url",
+        "dwnlError",
+        "for file in data/download.url in test",
+        GMAKE,
+    ),
+    (
+        RELEASE_SRC_RE + "%(subsys)s/%(pkg)s.*?\\:\\d*\\: warning: ",
+        "compWarning",
+        "for file in package",
+        ": warning: ",
+    ),
+    (
+        RELEASE_SRC_RE + ".*?\\:\\d+\\: warning: ",
+        "compWarning",
+        "for file in release",
+        ": warning: ",
+    ),
+    (
+        RELEASE_SRC_RE + ".*?\\([0-9]+\\)\\: warning #[0-9]+-[A-Z]: ",
+        "compWarning",
+        "for file in release",
+        ": warning #",
+    ),
+    ("^Warning: ", "compWarning", "for file in package", "Warning: "),
+    (
+        RELEASE_SRC_RE + "%(subsys)s/%(pkg)s.*?\\:\\d+\\: error: ",
+        "compError",
+        "for file in package",
+        ": error: ",
+    ),
+    (RELEASE_SRC_RE + ".*?\\:\\d+\\: error: ", "compError", "for file in release", ": error: "),
+    ("^.*?\\:\\d+\\: error: ", "compError", "for file in externals", ": error: "),
+    (
+        "^ *tmp/.*?/src/%(subsys)s/%(pkg)s/src/(.*?)/lib.*?\\.%(shLib)s"
+        + "\\: undefined reference to .*",
+        "linkError",
+        "for package library %s ",
+        ": undefined reference to ",
+    ),
+    (
+        "^ *tmp/.*?/src/%(subsys)s/%(pkg)s/plugins/(.*?)/lib.*?\\.%(shLib)s"
+        + "\\: undefined reference to .*",
+        "linkError",
+        "for plugin library %s in plugins",
+        ": undefined reference to ",
+    ),
+    (
+        "error: class .+ has a different checksum for ClassVersion",
+        "compError",
+        "for a different checksum for ClassVersion",
+        " has a different checksum for ClassVersion",
+    ),
+    (
+        "^.*: (more undefined references to|undefined reference to).*",
+        "compError",
+        "Missing symbols in a package",
+        "undefined reference",
+    ),
+]
+
+BUILD_LOG_RULES_GCC46 = [
+    ("^.*?:\\d+\\: warning\\: ", "compWarning", "from external in package", ": warning: "),
+]
+
+BUILD_LOG_RULES_DEFAULT = [
+    ("^.*?:\\d+\\: warning\\: ", "ignoreWarning", "from external in package", ": warning: "),
+    ("^.*?ERROR:Private Header:", "compError", "Private header usage.", "ERROR:Private Header:"),
+]
+
+BUILD_LOG_RULES_CACHE = {}
+
+
+def getSharedLibExt():
+    if os.uname()[0] == "Darwin":
+        return "dylib"
+    return "so"
+
+
+def getRuleList(gcc46=False):
+    return BUILD_LOG_RULES + (BUILD_LOG_RULES_GCC46 if gcc46 else BUILD_LOG_RULES_DEFAULT)
+
+
+class BuildLogRules(object):
+    """compiled rules of a release, shared by all the packages"""
+
+    def __init__(self, release, shLib="so", gcc46=False):
+        super(BuildLogRules, self).__init__()
+        params = {"release": release, "shLib": shLib, "subsys": "%(subsys)s", "pkg": "%(pkg)s"}
+        # [literal, compiled regexp or None for package rules, regexp, errType, msg]
+        self.rules = []
+        for regexp, errType, msg, literal in getRuleList(gcc46):
+            regexp = regexp % params
+            compiled = None
+            if "%(" not in regexp:
+                compiled = re.compile(regexp)
+            self.rules.append([literal, compiled, regexp, errType, msg])
+        self.prefilter = re.compile(
+            "|".join(re.escape(l) for l in sorted(set(r[0] for r in self.rules)))
+        )
+        self.miscErrRe = re.compile("^gmake: \\*\\*\\* (.*)$")
+        self.genericLinkErrRe = re.compile(
+            "^gmake: \\*\\*\\* \\[tmp/.*?/lib.*?" + shLib + "\\] Error 1"
+        )
+
+    def analyzeLines(self, lines, subsys, pkg, ignoreWarnings=None):
+        """returns [(lineNo, errType, msg), ...] for all the matching lines"""
+        return [
+            (lineNo,) + self.getError(index, msg, ignored)
+            for lineNo, index, msg, ignored in self.matchLines(lines, subsys, pkg, ignoreWarnings)
+        ]
+
+    def matchLines(self, lines, subsys, pkg, ignoreWarnings=None):
+        """
+        returns [(lineNo, ruleIndex, msg, ignored), ...] for all the matching lines, msg is
+        None unless it was formatted from the line. See getError.
+        """
+        found = []
+        pkgRules = {}
+        prefilter = self.prefilter.search
+        for lineNo, line in enumerate(lines):
+            if not prefilter(line):
+                continue
+            err = self.classify(line, subsys, pkg, pkgRules)
+            if err:
+                index, msg = err
+                ignored = (
+                    ignoreWarnings
+                    and (index >= 0)
+                    and (self.rules[index][3] == "compWarning")
+                    and [w for w in ignoreWarnings if w in line]
+                )
+                found.append((lineNo, index, msg, bool(ignored)))
+        return found
+
+    def getError(self, index, msg=None, ignored=False):
+        """returns (errType, msg) of a match returned by matchLines"""
+        if index < 0:
+            errType = "miscError"
+        else:
+            errType = self.rules[index][3]
+            if msg is None:
+                msg = self.rules[index][4]
+        if ignored:
+            errType = "ignoreWarning"
+        return errType, msg
+
+    def classify(self, line, subsys, pkg, pkgRules):
+        """returns (ruleIndex, formatted msg or None) for the first rule matching the line"""
+        for index, rule in enumerate(self.rules):
+            literal, compiled, regexp, errType, msg = rule
+            if literal not in line:
+                continue
+            if compiled is None:
+                if index not in pkgRules:
+                    pkgRules[index] = re.compile(regexp % {"subsys": subsys, "pkg": pkg})
+                compiled = pkgRules[index]
+            errMatch = compiled.match(line)
+            if errMatch:
+                if "%s" in msg:
+                    return index, msg % errMatch.groups(1)
+                return index, None
+        miscErrMatch = self.miscErrRe.match(line)
+        if miscErrMatch and not self.genericLinkErrRe.match(line):
+            return -1, "Unknown error found: %s" % miscErrMatch.groups(1)
+        return None
+
+
+def getBuildLogRules(release, shLib=None, gcc46=None):
+    """returns the (cached) rules of a release for the current platform/SCRAM_ARCH"""
+    if shLib is None:
+        shLib = getSharedLibExt()
+    if gcc46 is None:
+        gcc46 = "_gcc46" in os.environ["SCRAM_ARCH"]
+    key = (release, shLib, gcc46)
+    if key not in BUILD_LOG_RULES_CACHE:
+        BUILD_LOG_RULES_CACHE[key] = BuildLogRules(release, shLib, gcc46)
+    return BUILD_LOG_RULES_CACHE[key]
+
+
+def analyzeLinesRegexp(lines, subsys, pkg, release, shLib="so", gcc46=False, ignoreWarnings=None):
+    """Reference implementation: compile all the rules and try them in turn on each line"""
+    params = {"release": release, "shLib": shLib, "subsys": subsys, "pkg": pkg}
+    errors = [(re.compile(r[0] % params), r[1], r[2]) for r in getRuleList(gcc46)]
+    miscErrRe = re.compile("^gmake: \\*\\*\\* (.*)$")
+    genericLinkErrRe = re.compile("^gmake: \\*\\*\\* \\[tmp/.*?/lib.*?" + shLib + "\\] Error 1")
+    found = []
+    for lineNo, line in enumerate(lines):
+        for errRe, errType, msg in errors:
+            errMatch = errRe.match(line)
+            if errMatch:
+                if (
+                    ignoreWarnings
+                    and (errType == "compWarning")
+                    and [w for w in ignoreWarnings if w in line]
+                ):
+                    errType = "ignoreWarning"
+                if "%s" in msg:
+                    msg = msg % errMatch.groups(1)
+                found.append((lineNo, errType, msg))
+                break
+        else:
+            miscErrMatch = miscErrRe.match(line)
+            if miscErrMatch and not genericLinkErrRe.match(line):
+                found.append(
+                    (lineNo, "miscError", "Unknown error found: %s" % miscErrMatch.groups(1))
+                )
+    return found
+
+
+def makeSyntheticLogTree(topDir, packages=1000, lines=200, release="CMSSW_X_Y_Z"):
+    """creates topDir/<subsys>/<pkg>/build.log files with a few errors and warnings"""
+    pkgList = []
+    for n in range(packages):
+        subsys, pkg = "Subsys%s" % (n // 20), "Package%s" % n
+        pkgDir = os.path.join(topDir, subsys, pkg)
+        if not os.path.exists(pkgDir):
+            os.makedirs(pkgDir)
+        src = "/build/%s/src/%s/%s" % (release, subsys, pkg)
+        with open(os.path.join(pkgDir, "build.log"), "w") as ref:
+            for l in range(lines):
+                if l % 50 == 7 and n % 4 == 0:
+                    ref.write(
+                        "%s/src/file%s.cc:%s:5: warning: unused variable 'x'\n" % (src, l, l)
+                    )
+                elif l % 97 == 13 and n % 10 == 0:
+                    ref.write(
+                        "%s/plugins/plugin%s.cc:%s:1: error: 'foo' was not declared\n"
+                        % (src, l, l)
+                    )
+                elif l == lines - 1 and n % 25 == 0:
+                    ref.write(
+                        "gmake: *** [tmp/el9_amd64_gcc12/src/%s/%s/src/%s%s/file.o] Error 1\n"
+                        % (subsys, pkg, subsys, pkg)
+                    )
+                elif l % 3:
+                    ref.write(">> Compiling  %s/src/file%s.cc\n" % (src, l))
+                else:
+                    ref.write("  adding %s/interface/file%s.h to the dependency list\n" % (src, l))
+        pkgList.append((subsys, pkg))
+    return pkgList
+
+
+if __name__ == "__main__":
+    from glob import glob
+    from optparse import OptionParser
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    from time import time
+
+    parser = OptionParser(usage="%prog [-p packages] [-l lines] [log-dir]")
+    parser.add_option("-p", "--packages", dest="packages", type="int", default=1000)
+    parser.add_option("-l", "--lines", dest="lines", type="int", default=200)
+    parser.add_option("-r", "--release", dest="release", default="CMSSW_X_Y_Z")
+    opts, args = parser.parse_args()
+    topDir = args[0] if args else mkdtemp()
+    try:
+        if args:
+            pkgList = [tuple(d.split("/")[-3:-1]) for d in glob(topDir + "/*/*/build.log")]
+        else:
+            pkgList = makeSyntheticLogTree(topDir, opts.packages, opts.lines, opts.release)
+        logs = {}
+        for subsys, pkg in pkgList:
+            with open(os.path.join(topDir, subsys, pkg, "build.log")) as ref:
+                logs[(subsys, pkg)] = ref.readlines()
+        print("Packages: %s, lines: %s" % (len(logs), sum(len(l) for l in logs.values())))
+
+        stime = time()
+        ref_found = [analyzeLinesRegexp(logs[p], p[0], p[1], opts.release) for p in pkgList]
+        ref_time = time() - stime
+
+        stime = time()
+        rules = BuildLogRules(opts.release)
+        found = [rules.analyzeLines(logs[p], p[0], p[1]) for p in pkgList]
+        rules_time = time() - stime
+
+        print(
+            "Regexp per package: %.3f sec, %s matches" % (ref_time, sum(len(f) for f in ref_found))
+        )
+        print(
+            "Rules engine      : %.3f sec, %s matches" % (rules_time, sum(len(f) for f in found))
+        )
+        if found != ref_found:
+            print("ERROR: results differ")
+            exit(1)
+        if rules_time > 0:
+            print("Speedup: %.1fx" % (ref_time / rules_time))
+    finally:
+        if not args:
+            rmtree(topDir)
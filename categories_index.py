@@ -0,0 +1,79 @@
+"""
+Reverse index of CMSSW_CATEGORIES (categories_map.py): package -> categories.
+
+CMSSW_CATEGORIES maps a category to its list of packages, so finding the
+categories of a package means scanning all the lists. The index is built once
+per categories map (and per set of legacy categories) and answers it with a
+single dict lookup. It can also be serialized to json (see
+generate-categories-json.py) for tools which do not want to import cms-bot.
+"""
+
+import json
+from datetime import datetime, timezone
+from os.path import abspath, dirname, join
+
+PACKAGE_INDEX_FILE = join(dirname(abspath(__file__)), "package2category.json")
+CATEGORIES_INDEX_CACHE = {}
+
+
+class CategoriesIndex(object):
+    def __init__(self, categories):
+        self.categories = categories
+        self.packages = {}
+        for cat, packages in list(categories.items()):
+            for package in packages:
+                self.packages.setdefault(package, []).append(cat)
+
+    def get_package_categories(self, package):
+        return list(self.packages.get(package, []))
+
+    def has_package(self, package):
+        return package in self.packages
+
+    def has_category(self, category):
+        return category in self.categories
+
+    def without(self, categories):
+        """Returns a new index without the given (e.g. legacy) categories"""
+        return CategoriesIndex(
+            dict((c, p) for c, p in list(self.categories.items()) if c not in categories)
+        )
+
+    def dump(self, index_file=PACKAGE_INDEX_FILE):
+        with open(index_file, "w") as ref:
+            json.dump(
+                {
+                    "categories_to_packages": self.categories,
+                    "packages_to_categories": self.packages,
+                },
+                ref,
+                indent=2,
+                sort_keys=True,
+            )
+
+
+def load_categories_index(index_file=PACKAGE_INDEX_FILE):
+    with open(index_file) as ref:
+        return CategoriesIndex(json.load(ref)["categories_to_packages"])
+
+
+def get_legacy_categories(legacy_categories, when=None):
+    """
+    LEGACY_CATEGORIES is a mapping from name to datetime (when the category becomes legacy).
+    Returns the categories which are legacy at the given time (default: now).
+    """
+    if when is None:
+        when = datetime.now(tz=timezone.utc)
+    return sorted(cat for cat, ts in list((legacy_categories or {}).items()) if when > ts)
+
+
+def get_categories_index(categories, legacy_categories=None):
+    """Returns the (cached) index of categories, without the legacy_categories"""
+    legacy = tuple(sorted(c for c in (legacy_categories or []) if c in categories))
+    key = (id(categories), legacy)
+    if (key not in CATEGORIES_INDEX_CACHE) or (CATEGORIES_INDEX_CACHE[key][0] is not categories):
+        index = CategoriesIndex(dict(categories))
+        if legacy:
+            index = index.without(legacy)
+        CATEGORIES_INDEX_CACHE[key] = (categories, index)
+    return CATEGORIES_INDEX_CACHE[key][1]
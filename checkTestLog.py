@@ -16,13 +16,17 @@ if scriptPath not in sys.path:
     sys.path.append(scriptPath)
 sys.path.append(os.path.join(scriptPath, "python"))
 
+from unitTestLogParser import UnitTestLogConsumer, parseUnitTestLog
+
 # TODO is this file used?
 
 
-class TestLogChecker(object):
+class TestLogChecker(UnitTestLogConsumer):
     def __init__(self, outFileIn=None, verbIn=False):
         self.outFile = sys.stdout
-        if outFileIn:
+        if hasattr(outFileIn, "write"):
+            self.outFile = outFileIn
+        elif outFileIn:
             print("Summary file:", outFileIn)
             self.outFile = open(outFileIn, "w")
 
@@ -111,103 +115,70 @@ class TestLogChecker(object):
     # --------------------------------------------------------------------------------
 
     def check(self, logFile):
-        self.outFile.write("going to check " + logFile + "\n")
-
-        subsysRe = re.compile("^>> Tests for package ([A-Za-z].*/[A-Za-z].*) ran.")
-
-        pkgTestStartRe = re.compile('^===== Test "(.*)" ====')
-        pkgTestEndRe = re.compile(r"^\^\^\^\^ End Test (.*) \^\^\^\^")
-        pkgTestResultRe = re.compile(".*---> test ([^ ]+) (had ERRORS|succeeded)")
-
-        pkgStartRe = re.compile("^>> Entering Package (.*)")
-        pkgEndRe = re.compile("^>> Leaving Package (.*)")
-
-        pkgSubsysMap = {}
-        subsysPkgMap = {}
-
-        lf = open(logFile, "r")
+        parseUnitTestLog(logFile, [self])
 
-        startTime = time.time()
-        nLines = 0
-        testNames = {}
-        testLines = {}
-        pkgLines = {}
-        results = {}
-        pkgTests = {}
-
-        actPkg = "None"
-        actTest = "None"
-        actTstLines = 0
-        actPkgLines = 0
-        for line in lf:
-            nLines += 1
-            actTstLines += 1
-            actPkgLines += 1
-            subsysMatch = subsysRe.match(line)
-            if subsysMatch:
-                subsys, pkg = subsysMatch.group(1).split("/")
-                if pkg not in pkgSubsysMap:
-                    pkgSubsysMap[pkg] = subsys
-                if subsys in subsysPkgMap:
-                    subsysPkgMap[subsys].append(pkg)
-                else:
-                    subsysPkgMap[subsys] = [pkg]
-                continue
+    # UnitTestLogConsumer events, see unitTestLogParser.py
 
-            pkgStartMatch = pkgStartRe.match(line)
-            if pkgStartMatch:
-                pkg = pkgStartMatch.group(1)
-                actPkg = pkg
-                pkgTests[pkg] = 0
-                actPkgLines = 0
-                continue
-
-            pkgEndMatch = pkgEndRe.match(line)
-            if pkgEndMatch:
-                pkg = pkgEndMatch.group(1)
-                if actPkg != pkg:
-                    self.outFile.write(
-                        "pkgEndMatch> package mismatch: pkg found "
-                        + pkg
-                        + " actPkg="
-                        + actPkg
-                        + "\n"
-                    )
-                pkgLines[pkg] = actPkgLines
-
-            pkgTestResultMatch = pkgTestResultRe.match(line)
-            if pkgTestResultMatch:  # this seems to only appear if there is an ERROR
-                tstName = pkgTestResultMatch.group(1)
-                results[tstName] = pkgTestResultMatch.group(2)
-
-            pkgTestStartMatch = pkgTestStartRe.match(line)
-            if pkgTestStartMatch:
-                tst = pkgTestStartMatch.group(1)
-                actTest = tst
-                actTstLines = 0
-                pkgTests[actPkg] += 1
-                if actPkg in testNames:
-                    testNames[actPkg].append(actTest)
-                else:
-                    testNames[actPkg] = [actTest]
-                if actTest not in results:
-                    results[actTest] = "succeeded"  # set the default, no error seen yet
-
-            pkgTestEndMatch = pkgTestEndRe.match(line)
-            if pkgTestEndMatch:
-                tst = pkgTestEndMatch.group(1)
-                if actTest != tst:
-                    self.outFile.write(
-                        "pkgTestEndMatch> test mismatch: pkg found "
-                        + tst
-                        + " actPkg="
-                        + actTest
-                        + "\n"
-                    )
-                testLines[tst] = actTstLines
+    def startLog(self, logFile):
+        self.outFile.write("going to check " + logFile + "\n")
 
+        self.startTime = time.time()
+        self.testNames = {}
+        self.testLines = {}
+        self.pkgLines = {}
+        self.results = {}
+        self.pkgTests = {}
+
+        self.actPkg = "None"
+        self.actTest = "None"
+        self.actTstStart = -1
+        self.actPkgStart = -1
+
+    def packageStart(self, pkg, lineNo):
+        self.actPkg = pkg
+        self.pkgTests[pkg] = 0
+        self.actPkgStart = lineNo
+
+    def packageLeave(self, pkg, lineNo):
+        if self.actPkg != pkg:
+            self.outFile.write(
+                "pkgEndMatch> package mismatch: pkg found " + pkg + " actPkg=" + self.actPkg + "\n"
+            )
+        self.pkgLines[pkg] = lineNo - self.actPkgStart
+
+    def testResult(self, test, result, lineNo):
+        # this seems to only appear if there is an ERROR
+        self.results[test] = result
+
+    def testStart(self, test, lineNo):
+        self.actTest = test
+        self.actTstStart = lineNo
+        self.pkgTests[self.actPkg] += 1
+        if self.actPkg in self.testNames:
+            self.testNames[self.actPkg].append(test)
+        else:
+            self.testNames[self.actPkg] = [test]
+        if test not in self.results:
+            self.results[test] = "succeeded"  # set the default, no error seen yet
+
+    def testEnd(self, test, lineNo):
+        if self.actTest != test:
+            self.outFile.write(
+                "pkgTestEndMatch> test mismatch: pkg found "
+                + test
+                + " actPkg="
+                + self.actTest
+                + "\n"
+            )
+        self.testLines[test] = lineNo - self.actTstStart
+
+    def endLog(self, nLines):
         stopTime = time.time()
-        lf.close()
+        startTime = self.startTime
+        testNames = self.testNames
+        testLines = self.testLines
+        results = self.results
+        pkgTests = self.pkgTests
 
         self.outFile.write("found a total of " + str(nLines) + " lines in logfile.\n")
         self.outFile.write("analysis took " + str(stopTime - startTime) + " sec.\n")
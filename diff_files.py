@@ -0,0 +1,184 @@
+"""
+Changed files of a (huge) pull request from its unified diff.
+
+The diff is read line by line from the http response and only the git headers
+(diff --git, rename/copy from/to, ---/+++) are looked at, so the patch body is
+never kept in memory. Results are cached per head commit in CMS_DIFF_FILES_CACHE_DIR
+(default $HOME/.cache/cms-bot/diff-files, an empty value disables it), so re-processing
+the same commit does not download the diff again. Entries not used for
+CMS_DIFF_FILES_CACHE_MAX_AGE days are removed.
+"""
+
+import json
+import logging
+from os import getenv, getpid, listdir, makedirs, remove, rename, stat, utime
+from os.path import exists, expanduser, join
+from time import sleep, time
+from _py2with3compatibility import Request, urlopen
+
+DIFF_FILES_CACHE_DIR = getenv(
+    "CMS_DIFF_FILES_CACHE_DIR", join(expanduser("~"), ".cache", "cms-bot", "diff-files")
+)
+DIFF_FILES_CACHE_MAX_AGE = int(getenv("CMS_DIFF_FILES_CACHE_MAX_AGE", "30")) * 86400
+DIFF_FETCH_RETRIES = int(getenv("CMS_DIFF_FETCH_RETRIES", "3"))
+DIFF_FETCH_BACKOFF = int(getenv("CMS_DIFF_FETCH_BACKOFF", "10"))
+DIFF_FETCH_TIMEOUT = 300
+
+logger = logging.getLogger(__name__)
+
+
+class DiffFetchError(Exception):
+    pass
+
+
+def _unquote_path(path):
+    # git quotes paths with special chars as C strings with octal escapes
+    if path.startswith('"') and path.endswith('"'):
+        path = path[1:-1].encode("latin-1").decode("unicode_escape")
+        path = path.encode("latin-1").decode("utf-8")
+    return path
+
+
+def _strip_prefix(path, prefix):
+    path = _unquote_path(path)
+    if path.startswith(prefix):
+        return path[len(prefix) :]
+    return path
+
+
+def _parse_git_line(line):
+    """Returns [a_path, b_path] of a 'diff --git a/X b/Y' line, if they can be split"""
+    paths = line[len("diff --git ") :]
+    if paths.startswith('"'):
+        end = paths.index('"', 1)
+        while paths[end - 1] == "\\":
+            end = paths.index('"', end + 1)
+        return [_strip_prefix(paths[: end + 1], "a/"), _strip_prefix(paths[end + 2 :], "b/")]
+    if paths.endswith('"'):
+        start = paths.rindex(' "')
+        return [_strip_prefix(paths[:start], "a/"), _strip_prefix(paths[start + 1 :], "b/")]
+    # Unquoted names may contain spaces: only trust the line if both names are the same,
+    # otherwise (rename/copy) the following header lines have the names.
+    half = (len(paths) - 1) // 2
+    if paths[half] == " " and paths[2:half] == paths[half + 3 :]:
+        return [paths[2:half]]
+    return []
+
+
+def parse_diff_files(lines):
+    """
+    Yields the files (old and new names) found in the git headers of a unified diff.
+    lines can be str or bytes, e.g. an open file or http response.
+    """
+    in_header = False
+    for line in lines:
+        if isinstance(line, bytes):
+            if not line.startswith((b"diff --git ", b"rename ", b"copy ", b"--- ", b"+++ ")):
+                if line.startswith((b"@@ ", b"Binary files ", b"GIT binary patch")):
+                    in_header = False
+                continue
+            line = line.decode("utf-8", "replace")
+        line = line.rstrip("\r\n")
+        if line.startswith("diff --git "):
+            in_header = True
+            for path in _parse_git_line(line):
+                yield path
+        elif not in_header:
+            continue
+        elif line.startswith(("@@ ", "Binary files ", "GIT binary patch")):
+            in_header = False
+        elif line.startswith(("rename from ", "rename to ", "copy from ", "copy to ")):
+            yield _unquote_path(line.split(" ", 2)[2])
+        elif line.startswith(("--- ", "+++ ")):
+            path = line[4:].split("\t", 1)[0]
+            if path != "/dev/null":
+                yield _strip_prefix(path, "a/" if line[0] == "-" else "b/")
+
+
+def _cache_file(head_sha):
+    return join(DIFF_FILES_CACHE_DIR, head_sha[0:2], head_sha + ".json")
+
+
+def read_diff_files_cache(head_sha):
+    if not (DIFF_FILES_CACHE_DIR and head_sha):
+        return None
+    cache_file = _cache_file(head_sha)
+    if not exists(cache_file):
+        return None
+    try:
+        with open(cache_file) as ref:
+            files = json.load(ref)
+        # Keep the entries in use from being pruned
+        utime(cache_file, None)
+        return files
+    except Exception as e:
+        logger.warning("Unable to read %s: %s", cache_file, e)
+    return None
+
+
+def prune_diff_files_cache(cache_dir):
+    """Removes the entries of cache_dir not used for DIFF_FILES_CACHE_MAX_AGE"""
+    old_time = time() - DIFF_FILES_CACHE_MAX_AGE
+    for cfile in listdir(cache_dir):
+        cfile = join(cache_dir, cfile)
+        try:
+            if stat(cfile).st_mtime < old_time:
+                remove(cfile)
+        except OSError:
+            pass
+
+
+def write_diff_files_cache(head_sha, files):
+    if not (DIFF_FILES_CACHE_DIR and head_sha):
+        return
+    cache_file = _cache_file(head_sha)
+    cache_dir = join(DIFF_FILES_CACHE_DIR, head_sha[0:2])
+    try:
+        makedirs(cache_dir, exist_ok=True)
+        # Only the directory of the new entry is pruned, the writes are spread over all of them
+        prune_diff_files_cache(cache_dir)
+        tmp_file = "%s.%s.tmp" % (cache_file, getpid())
+        with open(tmp_file, "w") as ref:
+            json.dump(files, ref)
+        rename(tmp_file, cache_file)
+    except Exception as e:
+        logger.warning("Unable to write %s: %s", cache_file, e)
+
+
+def stream_diff_files(diff_url, timeout=DIFF_FETCH_TIMEOUT):
+    """Downloads the diff and returns the sorted list of changed files"""
+    response = urlopen(Request(diff_url), timeout=timeout)
+    try:
+        return sorted(set(parse_diff_files(response)))
+    finally:
+        response.close()
+
+
+def fetch_diff_files(diff_url, head_sha=None, retries=None, backoff=None):
+    """
+    Returns the changed files of diff_url (cached by head_sha), retrying with an
+    increasing delay on failures. Raises DiffFetchError if all attempts fail.
+    """
+    files = read_diff_files_cache(head_sha)
+    if files is not None:
+        logger.info("Changed files of %s read from cache", head_sha)
+        return files
+    retries = DIFF_FETCH_RETRIES if retries is None else retries
+    backoff = DIFF_FETCH_BACKOFF if backoff is None else backoff
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            logger.warning("Retrying %s in %ss", diff_url, backoff * attempt)
+            sleep(backoff * attempt)
+        try:
+            files = stream_diff_files(diff_url)
+        except Exception as e:
+            logger.error("Request to %s failed: %s", diff_url, e)
+            error = str(e)
+            continue
+        if files:
+            write_diff_files_cache(head_sha, files)
+            return files
+        error = "no changes returned, is the PR too big?"
+        logger.error("Request to %s did not return any changes", diff_url)
+    raise DiffFetchError("Unable to get changed files from %s: %s" % (diff_url, error))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Batched indexing of apache access logs in ES, for the es_*_apache.py scripts.
+
+The new lines of the logs are read by logwatch in batches; each line is parsed with a
+compiled regexp (timestamps are parsed once per second), turned into documents by the
+script's callback and the documents of a batch are sent with _bulk requests (grouped per
+index). The logwatch checkpoint only moves forward once a batch is indexed (or spooled).
+"""
+
+import re
+from datetime import datetime
+from hashlib import sha1
+from json import dumps
+from os import getenv
+from time import mktime, time
+from cmsutils import epoch2week
+from es_utils import send_bulk
+from logwatch import logwatch, LOGWATCH_APACHE_IGNORE_AGENTS
+
+APACHE_LOG_BATCH_SIZE = int(getenv("CMS_APACHE_LOG_BATCH_SIZE", "1000"))
+# The first 10 space separated items (the timestamp one without its "[") and the rest
+APACHE_LOG_RE = re.compile(
+    r"^([^ ]*) ([^ ]*) ([^ ]*) \[([^ ]*) ([^ ]*\])"
+    + r" ([^ ]*) ([^ ]*) ([^ ]*) ([^ ]*) ([^ ]*)(?: (.*))?$"
+)
+FORWARDED_IP_RE = re.compile(r'^"[0-9]+(\.[0-9]+)+"$')
+TIMESTAMPS = {}
+
+
+def apache_timestamp(stamp):
+    """(epoch seconds, week) of an apache log timestamp (e.g. 18/Oct/2026:10:00:00)"""
+    if stamp not in TIMESTAMPS:
+        if len(TIMESTAMPS) > 100000:
+            TIMESTAMPS.clear()
+        tsec = mktime(datetime.strptime(stamp, "%d/%b/%Y:%H:%M:%S").timetuple())
+        TIMESTAMPS[stamp] = (tsec, epoch2week(tsec))
+    return TIMESTAMPS[stamp]
+
+
+def parse_apache_line(line):
+    """
+    Returns the space separated items of an access log line (as line.split(" "), with the
+    leading "[" of the timestamp removed) or None if it is not an access log line.
+    """
+    m = APACHE_LOG_RE.match(line)
+    if not m:
+        return None
+    items = list(m.groups())
+    rest = items.pop()
+    if rest is not None:
+        items += rest.split(" ")
+    return items
+
+
+def access_log_payload(items, tsec):
+    payload = {}
+    payload["ip"] = items[0]
+    payload["ident"] = items[1]
+    payload["auth"] = items[2]
+    payload["verb"] = items[5][1:]
+    payload["request"] = items[6]
+    payload["httpversion"] = items[7][:-1]
+    payload["response"] = items[8]
+    try:
+        payload["bytes"] = int(items[9])
+    except:
+        payload["bytes"] = 0
+    payload["@timestamp"] = int(tsec * 1000)
+    return payload
+
+
+def add_forwarded_agent(payload, items):
+    """referrer and, for proxied requests, the client ip and agent"""
+    if len(items) > 10:
+        payload["referrer"] = items[10][1:-1]
+    if len(items) > 11 and FORWARDED_IP_RE.match(items[11]):
+        payload["ip"] = items[11][1:-1]
+        if len(items) > 12:
+            agent = " ".join(items[12:]).replace('"', "")
+            payload["agent"] = agent
+            payload["agent_type"] = agent.replace(" ", "-").split("/", 1)[0].upper()
+    return payload
+
+
+def apache_log_docs(lines, make_docs):
+    """
+    Returns the (index, id, json payload) of the lines, sorted by index. make_docs(items,
+    payload, week) returns the list of (index, payload) of a line.
+    """
+    docs = []
+    for line in lines:
+        skip = False
+        for agent in LOGWATCH_APACHE_IGNORE_AGENTS:
+            if agent in line:
+                skip = True
+                break
+        if skip:
+            continue
+        items = parse_apache_line(line)
+        if not items:
+            continue
+        try:
+            tsec, week = apache_timestamp(items[3])
+            id = sha1(line.encode()).hexdigest()
+            for index, payload in make_docs(items, access_log_payload(items, tsec), week):
+                docs.append((index, id, dumps(payload)))
+        except Exception as e:
+            print("ERROR: Unable to process line: %s: %s" % (line, e))
+    docs.sort(key=lambda doc: doc[0])
+    return docs
+
+
+def process_apache_logs(logs, make_docs, service="httpd", log_dir="/data/es", batch_size=None):
+    """Indexes the new lines of the logs, returns (status, number of lines processed)"""
+    if batch_size is None:
+        batch_size = APACHE_LOG_BATCH_SIZE
+    stime = time()
+
+    def process_batch(lines, count):
+        if not send_bulk(apache_log_docs(lines, make_docs)):
+            return False
+        print("Processed entries", count)
+        return True
+
+    log = logwatch(service, log_dir=log_dir)
+    s, c = log.process_batches(logs, process_batch, batch_size)
+    print("Total entries processed", c)
+    dtime = time() - stime
+    if c and dtime > 0:
+        print("Throughput: %.1f lines/s (%s lines in %.1f sec)" % (c / dtime, c, dtime))
+    return s, c
@@ -5,10 +5,11 @@ from hashlib import sha1
 import os, json, datetime, sys, copy, re
 from glob import glob
 from os.path import exists, dirname, getmtime
-from es_utils import send_payload
+from es_utils import send_payload, BulkSender
 from _py2with3compatibility import run_cmd
 from cmsutils import cmsswIB2Week
-from logreaderUtils import transform_and_write_config_file, add_exception_to_config, ResultTypeEnum
+from logreaderUtils import transform_and_write_config_file, get_exception_rule_set, ResultTypeEnum
+from unitTestLogParser import UnitTestLogConsumer, parseUnitTestLog
 import traceback
 
 
@@ -35,141 +36,155 @@ def send_unittest_dataset(datasets, payload, id, index, doc):
         send_payload(index, doc, sha1hexdigest(id + ds), json.dumps(payload))
 
 
-def process_unittest_log(logFile):
-    t = getmtime(logFile)
-    timestp = int(t * 1000)
-    pathInfo = logFile.split("/")
-    architecture = pathInfo[4]
-    release = pathInfo[8]
-    gpu = "-"
-    if pathInfo[9] == "gpu":
-        gpu = pathInfo[10]
-    week, rel_sec = cmsswIB2Week(release)
-    es_index = "ibs-" + week
-    package = pathInfo[-3] + "/" + pathInfo[-2]
-    payload_dataset = {"type": "unittest", "gpu": gpu}
-    payload_dataset["release"] = release
-    release_queue = "_".join(release.split("_", -1)[:-1]).split("_", 3)
-    payload_dataset["release_queue"] = "_".join(release_queue[0:3])
-    flavor = release_queue[-1]
-    if flavor == "X":
-        flavor = "DEFAULT"
-    payload_dataset["flavor"] = flavor
-    payload_dataset["architecture"] = architecture
-    payload_dataset["@timestamp"] = timestp
-
-    payload_utest = copy.deepcopy(payload_dataset)
-    del payload_utest["type"]
-
-    inStacktrace = False
-    stacktrace = []
-    datasets = []
+class UnitTestPayloads(UnitTestLogConsumer):
+    """Sends the ES documents of the unit tests and datasets of a package unitTest.log"""
 
-    config_list = []
-    custom_rule_set = [
-        {
-            "str_to_match": "test (.*) had ERRORS",
-            "name": "{0} failed",
-            "control_type": ResultTypeEnum.ISSUE,
-        },
-        {
-            "str_to_match": r'===== Test "([^\s]+)" ====',
-            "name": "{0}",
-            "control_type": ResultTypeEnum.TEST,
-        },
-    ]
-
-    pkgTestStartRe = re.compile('^===== Test\s+"([^\s]+)" ====')
-    pkgTestEndRe = re.compile(r"^\^\^\^\^ End Test\s+([^\s]+)\s+\^\^\^\^")
-    pkgTestResultRe = re.compile(".*---> test\s+([^\s]+)\s+(had ERRORS|succeeded)")
+    def __init__(self, logFile):
+        self.logFile = logFile
+        t = getmtime(logFile)
+        timestp = int(t * 1000)
+        pathInfo = logFile.split("/")
+        self.architecture = pathInfo[4]
+        self.release = pathInfo[8]
+        self.gpu = "-"
+        if pathInfo[9] == "gpu":
+            self.gpu = pathInfo[10]
+        self.week, rel_sec = cmsswIB2Week(self.release)
+        self.es_index = "ibs-" + self.week
+        self.package = pathInfo[-3] + "/" + pathInfo[-2]
+        payload_dataset = {"type": "unittest", "gpu": self.gpu}
+        payload_dataset["release"] = self.release
+        release_queue = "_".join(self.release.split("_", -1)[:-1]).split("_", 3)
+        payload_dataset["release_queue"] = "_".join(release_queue[0:3])
+        flavor = release_queue[-1]
+        if flavor == "X":
+            flavor = "DEFAULT"
+        payload_dataset["flavor"] = flavor
+        payload_dataset["architecture"] = self.architecture
+        payload_dataset["@timestamp"] = timestp
+        self.payload_dataset = payload_dataset
 
-    with open(logFile, encoding="ascii", errors="ignore") as f:
-        utname = None
-        datasets = []
-        test_status = 0
-        for index, l in enumerate(f):
-            l = l.strip()
-            config_list = add_exception_to_config(l, index, config_list, custom_rule_set)
-            if m := pkgTestStartRe.match(l):
-                utname = m[1]
-                test_status = 0
-                datasets = []
-                continue
-
-            if m := pkgTestResultRe.match(l):
-                if m[1] != utname:
-                    print(
-                        "ERROR: Unit test name mismatch - expected {0}, got {1}".format(
-                            utname, m[1]
-                        )
-                    )  # TODO: do we want a more visible error (exit 1)? Or maybe skip this file?
-                else:
-                    test_status = 1 if m[2] == "had ERRORS" else 0
-                continue
-
-            if m := pkgTestEndRe.match(l):
-                if m[1] != utname:
-                    print(
-                        "ERROR: Unit test name mismatch - expected {0}, got {1}".format(
-                            utname, m[1]
-                        )
-                    )  # TODO: do we want a more visible error (exit 1)? Or maybe skip this file?
-                    continue
-
-                if test_status == -1:
-                    print("ERROR: test state for UT {0} unknown".format(utname))
-                    continue
-
-                payload_utest["url"] = (
-                    "https://cmssdt.cern.ch/SDT/cgi-bin/buildlogs/"
-                    + architecture
-                    + "/"
-                    + release
-                    + "/unitTestLogs/"
-                    + package
-                )
-                payload_utest["status"] = test_status
-                payload_utest["name"] = utname
-                payload_utest["package"] = package
-                if stacktrace:
-                    payload_utest["stacktrace"] = "\n".join(stacktrace)
-                    stacktrace = []
-                utest_id = sha1hexdigest(release + architecture + utname + gpu)
-                print("==> ", json.dumps(payload_utest) + "\n")
-                send_payload(es_index, "unittests", utest_id, json.dumps(payload_utest))
-
-                payload_dataset["name"] = "%s/%s" % (package, utname)
-                dataset_id = sha1hexdigest(release + architecture + package + utname + gpu)
-                print("==> ", json.dumps(payload_dataset) + "\n")
-                send_unittest_dataset(
-                    datasets, payload_dataset, dataset_id, "ib-dataset-" + week, "unittest-dataset"
-                )
-                continue
+        self.payload_utest = copy.deepcopy(payload_dataset)
+        del self.payload_utest["type"]
 
-            if " Initiating request to open file " in l:
-                try:
-                    rootfile = l.split(" Initiating request to open file ")[1].split(" ")[0]
-                    if (not "file:" in rootfile) and (not rootfile in datasets):
-                        datasets.append(rootfile)
-                except Exception as e:
-                    print("ERROR: ", logFile, e)
-                    traceback.print_exc(file=sys.stdout)
-                continue
+        self.inStacktrace = False
+        self.stacktrace = []
+        self.config_list = []
+        self.utname = None
+        self.datasets = []
+        self.test_status = 0
 
-            if "sig_dostack_then_abort" in l:
-                inStacktrace = True
-                continue
+    def exception(self, config):
+        self.config_list.append(config)
 
-            if inStacktrace and not l.startswith("#"):
-                inStacktrace = False
-                continue
+    def testStart(self, test, lineNo):
+        self.utname = test
+        self.test_status = 0
+        self.datasets = []
 
-            if inStacktrace:
-                if len(stacktrace) < 20:
-                    stacktrace.append(l)
-                continue
+    def testResult(self, test, result, lineNo):
+        if test != self.utname:
+            print(
+                "ERROR: Unit test name mismatch - expected {0}, got {1}".format(self.utname, test)
+            )  # TODO: do we want a more visible error (exit 1)? Or maybe skip this file?
+        else:
+            self.test_status = 1 if result == "had ERRORS" else 0
 
-    transform_and_write_config_file(logFile + "-read_config", config_list)
+    def testEnd(self, test, lineNo):
+        utname = self.utname
+        if test != utname:
+            print(
+                "ERROR: Unit test name mismatch - expected {0}, got {1}".format(utname, test)
+            )  # TODO: do we want a more visible error (exit 1)? Or maybe skip this file?
+            return
+        if self.test_status == -1:
+            print("ERROR: test state for UT {0} unknown".format(utname))
+            return
+
+        release, architecture, package, gpu = (
+            self.release,
+            self.architecture,
+            self.package,
+            self.gpu,
+        )
+        payload_utest = self.payload_utest
+        payload_utest["url"] = (
+            "https://cmssdt.cern.ch/SDT/cgi-bin/buildlogs/"
+            + architecture
+            + "/"
+            + release
+            + "/unitTestLogs/"
+            + package
+        )
+        payload_utest["status"] = self.test_status
+        payload_utest["name"] = utname
+        payload_utest["package"] = package
+        if self.stacktrace:
+            payload_utest["stacktrace"] = "\n".join(self.stacktrace)
+            self.stacktrace = []
+        utest_id = sha1hexdigest(release + architecture + utname + gpu)
+        print("==> ", json.dumps(payload_utest) + "\n")
+        send_payload(self.es_index, "unittests", utest_id, json.dumps(payload_utest))
+
+        self.payload_dataset["name"] = "%s/%s" % (package, utname)
+        dataset_id = sha1hexdigest(release + architecture + package + utname + gpu)
+        print("==> ", json.dumps(self.payload_dataset) + "\n")
+        send_unittest_dataset(
+            self.datasets,
+            self.payload_dataset,
+            dataset_id,
+            "ib-dataset-" + self.week,
+            "unittest-dataset",
+        )
+
+    def line(self, line, lineNo, isTestMarker):
+        if isTestMarker:
+            return
+        l = line.strip()
+        if " Initiating request to open file " in l:
+            try:
+                rootfile = l.split(" Initiating request to open file ")[1].split(" ")[0]
+                if (not "file:" in rootfile) and (not rootfile in self.datasets):
+                    self.datasets.append(rootfile)
+            except Exception as e:
+                print("ERROR: ", self.logFile, e)
+                traceback.print_exc(file=sys.stdout)
+            return
+
+        if "sig_dostack_then_abort" in l:
+            self.inStacktrace = True
+            return
+
+        if self.inStacktrace and not l.startswith("#"):
+            self.inStacktrace = False
+            return
+
+        if self.inStacktrace:
+            if len(self.stacktrace) < 20:
+                self.stacktrace.append(l)
+
+    def endLog(self, nLines):
+        transform_and_write_config_file(self.logFile + "-read_config", self.config_list)
+
+
+UNITTEST_EXCEPTION_RULES = [
+    {
+        "str_to_match": "test (.*) had ERRORS",
+        "name": "{0} failed",
+        "control_type": ResultTypeEnum.ISSUE,
+        "literal": " had errors",
+    },
+    {
+        "str_to_match": r'===== Test "([^\s]+)" ====',
+        "name": "{0}",
+        "control_type": ResultTypeEnum.TEST,
+        "literal": '===== test "',
+    },
+]
+
+
+def process_unittest_log(logFile):
+    parseUnitTestLog(logFile, [UnitTestPayloads(logFile)], UNITTEST_EXCEPTION_RULES)
     return
 
 
@@ -188,10 +203,13 @@ def process_addon_log(logFile):
     payload["name"] = pathInfo[-1].split("-")[1].split("_cmsRun_")[0].split("_cmsDriver.py_")[0]
     id = sha1hexdigest(release + architecture + "addon" + payload["name"])
     config_list = []
+    rule_set = get_exception_rule_set()
     with open(logFile, encoding="ascii", errors="ignore") as f:
         for index, l in enumerate(f):
             l = l.strip()
-            config_list = add_exception_to_config(l, index, config_list)
+            config = rule_set.match(l, index)
+            if config:
+                config_list.append(config)
             if " Initiating request to open file " in l:
                 try:
                     rootfile = l.split(" Initiating request to open file ")[1].split(" ")[0]
@@ -249,8 +267,9 @@ for dep in ["6", "8"]:
                 )
                 err, utlogs = run_cmd("find %s/UT -name 'unitTest.log' -type f" % utdir)
                 if not err:
-                    for utlog in utlogs.split("\n"):
-                        process_unittest_log(utlog)
+                    with BulkSender():
+                        for utlog in utlogs.split("\n"):
+                            process_unittest_log(utlog)
                     run_cmd("touch %s" % flagFile)
             except Exception as e:
                 print("ERROR: ", logFile, e)
@@ -272,8 +291,9 @@ for logFile in logs:
             )
             err, utlogs = run_cmd("find %s/AO -name '*.log' -type f" % utdir)
             if not err:
-                for utlog in utlogs.split("\n"):
-                    process_addon_log(utlog)
+                with BulkSender():
+                    for utlog in utlogs.split("\n"):
+                        process_addon_log(utlog)
                 run_cmd("touch %s" % flagFile)
         except Exception as e:
             print("ERROR:", e)
@@ -287,10 +307,11 @@ for d in dirs:
     flagFile = d + ".checked"
     if exists(flagFile):
         continue
-    for logFile in glob(d + "/*.log"):
-        print("Working on ", logFile)
-        try:
-            process_hlt_log(logFile)
-        except Exception as e:
-            print("ERROR:", e)
+    with BulkSender():
+        for logFile in glob(d + "/*.log"):
+            print("Working on ", logFile)
+            try:
+                process_hlt_log(logFile)
+            except Exception as e:
+                print("ERROR:", e)
     run_cmd("touch %s" % flagFile)
@@ -1,6 +1,6 @@
 #!/bin/env python3
 import sys, json, os
-from es_utils import send_payload
+from es_utils import send_payload, BulkSender
 
 timestp = os.path.getmtime(sys.argv[1])
 items = sys.argv[1].split("/")[:-1]
@@ -18,19 +18,20 @@ payload["@timestamp"] = int(timestp * 1000)
 index = "iwyu"
 document = "iwyu-stats"
 id = False
-for item in data:
-    payload["package"] = item
-    files, includes, excludes = data[item]
-    payload["files"] = files
-    payload["includes"] = includes
-    payload["excludes"] = excludes
-    payload["url"] = (
-        "https://cmssdt.cern.ch/SDT/cgi-bin/buildlogs/iwyu/"
-        + arch
-        + "/"
-        + rel
-        + "/"
-        + item
-        + "/index.html"
-    )
-    send_payload(index, document, id, json.dumps(payload))
+with BulkSender():
+    for item in data:
+        payload["package"] = item
+        files, includes, excludes = data[item]
+        payload["files"] = files
+        payload["includes"] = includes
+        payload["excludes"] = excludes
+        payload["url"] = (
+            "https://cmssdt.cern.ch/SDT/cgi-bin/buildlogs/iwyu/"
+            + arch
+            + "/"
+            + rel
+            + "/"
+            + item
+            + "/index.html"
+        )
+        send_payload(index, document, id, json.dumps(payload))
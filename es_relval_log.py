@@ -2,7 +2,7 @@
 from hashlib import sha1
 import os, sys, json, re
 from os.path import exists
-from es_utils import send_payload
+from es_utils import send_payload, BulkSender
 import xml.etree.ElementTree as ET
 from cmsutils import cmsswIB2Week
 
@@ -210,27 +210,28 @@ def es_parse_log(logFile):
         payload = es_parse_jobreport(payload, logFile)
     except Exception as e:
         print(e)
-    try:
-        send_payload(index, document, id, json.dumps(payload))
-    except:
-        pass
-    if datasets:
-        dataset = {"type": "relvals", "name": "%s/%s" % (payload["workflow"], payload["step"])}
-        for fld in ["release", "architecture", "@timestamp"]:
-            dataset[fld] = payload[fld]
-        for ds in datasets:
-            ds_items = ds.split("?", 1)
-            ds_items.append("")
-            ibeos = "/store/user/cmsbuild"
-            if ibeos in ds_items[0]:
-                ds_items[0] = ds_items[0].replace(ibeos, "")
-            else:
-                ibeos = ""
-            dataset["protocol"] = ds_items[0].split("/store/", 1)[0] + ibeos
-            dataset["protocol_opts"] = ds_items[1]
-            dataset["lfn"] = "/store/" + ds_items[0].split("/store/", 1)[1].strip()
-            idx = sha1((id + ds).encode()).hexdigest()
-            send_payload("ib-dataset-" + week, "relvals-dataset", idx, json.dumps(dataset))
+    with BulkSender():
+        try:
+            send_payload(index, document, id, json.dumps(payload))
+        except:
+            pass
+        if datasets:
+            dataset = {"type": "relvals", "name": "%s/%s" % (payload["workflow"], payload["step"])}
+            for fld in ["release", "architecture", "@timestamp"]:
+                dataset[fld] = payload[fld]
+            for ds in datasets:
+                ds_items = ds.split("?", 1)
+                ds_items.append("")
+                ibeos = "/store/user/cmsbuild"
+                if ibeos in ds_items[0]:
+                    ds_items[0] = ds_items[0].replace(ibeos, "")
+                else:
+                    ibeos = ""
+                dataset["protocol"] = ds_items[0].split("/store/", 1)[0] + ibeos
+                dataset["protocol_opts"] = ds_items[1]
+                dataset["lfn"] = "/store/" + ds_items[0].split("/store/", 1)[1].strip()
+                idx = sha1((id + ds).encode()).hexdigest()
+                send_payload("ib-dataset-" + week, "relvals-dataset", idx, json.dumps(dataset))
     ref = open(stamp, "w")
     ref.close()
 
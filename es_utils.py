@@ -4,17 +4,24 @@ from os.path import exists
 from glob import glob
 from os import getenv, remove
 from hashlib import sha1
-from cmsutils import cmsswIB2Week, percentile, epoch2week
-from _py2with3compatibility import Request, urlopen, run_cmd
+from cmsutils import cmsswIB2Week, epoch2week
+from _py2with3compatibility import Request, run_cmd
+from http_utils import urlopen, get_ssl_context as get_pooled_ssl_context
 from os import stat as tstat
-from time import time
+from time import time, sleep
 from datetime import datetime
+from threading import Thread
+from stats_utils import rows_to_columns, summary_stats, group_means, load_summary
 
 CMSSDT_ES_QUERY = "https://cmssdt.cern.ch/SDT/cgi-bin/es_query"
 ES_SERVER = "https://os-cmssdt1.cern.ch/os"
 ES_NEW_SERVER = ES_SERVER
 ES_PASSWD = None
 SEND_ERROR = None
+ES_BULK_MAX_DOCS = int(getenv("CMS_ES_BULK_MAX_DOCS", "500"))
+ES_BULK_MAX_BYTES = int(getenv("CMS_ES_BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+ES_BULK_MAX_SECONDS = int(getenv("CMS_ES_BULK_MAX_SECONDS", "30"))
+BULK_SENDERS = []
 
 
 def format(s, **kwds):
@@ -58,7 +65,7 @@ def get_es_query(
 def get_ssl_context():
     sslcon = None
     try:
-        sslcon = ssl._create_unverified_context()
+        sslcon = get_pooled_ssl_context(verify=False)
     except Exception as e:
         sslcon = None
     return sslcon
@@ -98,6 +105,16 @@ def es_get_passwd(passwd_file=None):
     return ES_PASSWD
 
 
+def es_request_header(passwd_file=None, content_type="application/json"):
+    passwd = es_get_passwd(passwd_file)
+    if not passwd:
+        return None
+    return {
+        "Content-Type": content_type,
+        "Authorization": "Basic %s" % base64.b64encode(("cmssdt:%s" % passwd).encode()).decode(),
+    }
+
+
 def send_request(
     uri,
     payload=None,
@@ -114,18 +131,14 @@ def send_request(
         ):
             return False
     SEND_ERROR = None
-    header = {"Content-Type": "application/json"}
     xuri = uri.split("/")
     if (not ignore_doc) and (xuri[1] != "_doc"):
         xuri[1] = "_doc"
         uri = "/".join(xuri)
-    passwd = es_get_passwd(passwd_file)
-    if not passwd:
+    header = es_request_header(passwd_file)
+    if not header:
         return False
     url = "%s/%s" % (es_ser, uri)
-    header["Authorization"] = (
-        "Basic %s" % base64.b64encode(("cmssdt:%s" % passwd).encode()).decode()
-    )
     try:
         if payload is None:
             request = Request(url, payload, header)
@@ -195,9 +208,176 @@ def send_payload(index, document, id, payload, passwd_file=None):
         cache_dir = es_cache_dir()
         if cache_dir:
             return es_cache_payload(id, uri, payload, passwd_file)
+    if BULK_SENDERS and BULK_SENDERS[-1].passwd_file == passwd_file:
+        return BULK_SENDERS[-1].add(index, id, payload)
     return send_request(uri, payload=payload, method="POST", passwd_file=passwd_file)
 
 
+def es_index_name(index):
+    if not index.startswith("cmssdt-"):
+        index = "cmssdt-" + index
+    return index
+
+
+def bulk_payload(docs):
+    """NDJSON _bulk body to index docs, a list of (index, id, json payload)"""
+    lines = []
+    for index, id, payload in docs:
+        action = {"_index": es_index_name(index)}
+        if id:
+            action["_id"] = id
+        lines.append(json.dumps({"index": action}))
+        lines.append(payload)
+    return "\n".join(lines) + "\n"
+
+
+def send_bulk_request(docs, passwd_file=None, es_ser=ES_SERVER):
+    """
+    Sends docs with one _bulk request. Returns the list of the (index, id, payload, error,
+    retry) of the docs which were not indexed, retry is True for the temporary errors.
+    """
+    header = es_request_header(passwd_file, "application/x-ndjson")
+    if not header:
+        return [doc + ("Unable to read ES password", False) for doc in docs]
+    url = "%s/_bulk" % es_ser
+    try:
+        request = Request(url, bulk_payload(docs).encode(), header)
+        res = json.loads(urlopen(request, context=get_ssl_context()).read())
+    except Exception as e:
+        print("ERROR:", url, str(e))
+        return [doc + (str(e), True) for doc in docs]
+    failed = []
+    if res.get("errors"):
+        for doc, item in zip(docs, res["items"]):
+            item = list(item.values())[0]
+            if item.get("status", 500) < 300:
+                continue
+            error = json.dumps(item.get("error", item.get("status", 500)))
+            failed.append(doc + (error, item.get("status", 500) in [429, 500, 502, 503, 504]))
+    print("OK: %s (%s docs, %s failed)" % (url, len(docs), len(failed)))
+    return failed
+
+
+def send_bulk_server(docs, passwd_file, es_ser, retries, backoff):
+    """Returns the (index, id, payload, error, retry) of the docs es_ser did not index"""
+    pending, failed = docs, []
+    for attempt in range(retries + 1):
+        if attempt:
+            sleep(backoff * attempt)
+        res = send_bulk_request(pending, passwd_file, es_ser)
+        failed += [doc for doc in res if not doc[4]]
+        pending = [doc[:3] for doc in res if doc[4]]
+        if not pending:
+            return failed
+    return failed + [doc for doc in res if doc[4]]
+
+
+def send_bulk(docs, passwd_file=None, retries=3, backoff=5):
+    """
+    Indexes docs, a list of (index, id, json payload), with _bulk requests (to ES_NEW_SERVER
+    too, concurrently, if it differs). Docs failed with a temporary error are retried; the
+    ones which still failed are spooled in CMS_ES_CACHE_DIR (see send_cached_payload) if it
+    is set. Returns False if some docs could neither be indexed nor spooled.
+    """
+    if not docs:
+        return True
+    servers = [ES_SERVER]
+    if ES_NEW_SERVER != ES_SERVER:
+        servers.append(ES_NEW_SERVER)
+    results = {}
+
+    def send_server(es_ser):
+        try:
+            results[es_ser] = send_bulk_server(docs, passwd_file, es_ser, retries, backoff)
+        except Exception as e:
+            results[es_ser] = [doc + (str(e), True) for doc in docs]
+
+    threads = []
+    for es_ser in servers[1:]:
+        thrd = Thread(target=send_server, args=(es_ser,))
+        thrd.start()
+        threads.append(thrd)
+    send_server(servers[0])
+    for thrd in threads:
+        thrd.join()
+    ok = True
+    spooled = set()
+    for es_ser in servers:
+        for index, id, payload, error, retry in results[es_ser]:
+            print("ERROR: %s %s/%s: %s" % (es_ser, index, id, error))
+            if not (id and es_cache_dir()):
+                ok = False
+                continue
+            if (index, id) in spooled:
+                continue
+            spooled.add((index, id))
+            uri = "%s/_doc/%s" % (es_index_name(index), id)
+            if not es_cache_payload(id, uri, payload, passwd_file):
+                ok = False
+    return ok
+
+
+class BulkSender(object):
+    """
+    Buffers the documents and indexes them with send_bulk once there are max_docs of them,
+    max_bytes of payloads or the first one is max_seconds old (checked when a document is
+    added) and when the sender is closed. Used as a context manager, send_payload adds
+    the documents to it instead of sending them one by one, e.g.
+
+      with BulkSender():
+          for ...:
+              send_payload(index, document, id, payload)
+    """
+
+    def __init__(self, max_docs=None, max_bytes=None, max_seconds=None, passwd_file=None):
+        self.max_docs = ES_BULK_MAX_DOCS if max_docs is None else max_docs
+        self.max_bytes = ES_BULK_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_seconds = ES_BULK_MAX_SECONDS if max_seconds is None else max_seconds
+        self.passwd_file = passwd_file
+        self.docs = []
+        self.size = 0
+        self.stime = 0
+        self.ok = True
+
+    def add(self, index, id, payload):
+        if not self.docs:
+            self.stime = time()
+        self.docs.append((index, id, payload))
+        self.size += len(payload)
+        if (
+            (len(self.docs) >= self.max_docs)
+            or (self.size >= self.max_bytes)
+            or (time() - self.stime >= self.max_seconds)
+        ):
+            return self.flush()
+        return True
+
+    def flush(self):
+        """Sends the buffered documents, returns False if some of them were lost"""
+        if not self.docs:
+            return True
+        docs = self.docs
+        self.docs = []
+        self.size = 0
+        if not send_bulk(docs, self.passwd_file):
+            self.ok = False
+            return False
+        return True
+
+    def close(self):
+        self.flush()
+        return self.ok
+
+    def __enter__(self):
+        BULK_SENDERS.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        BULK_SENDERS.remove(self)
+        self.close()
+        return False
+
+
 def send_template(name, payload, passwd_file=None):
     if not name.startswith("cmssdt-"):
         name = "cmssdt-" + name
@@ -306,7 +486,7 @@ def es_query(
     scroll=False,
     max_count=-1,
     fields=None,
-    must_fields=""
+    must_fields="",
 ):
     query_str = get_es_query(
         query=query,
@@ -324,43 +504,33 @@ def es_query(
 
 
 def es_workflow_stats(es_hits, rss="rss_75", cpu="cpu_75"):
-    wf_stats = {}
+    groups = []
+    rows = []
     for h in es_hits["hits"]["hits"]:
         hit = h["_source"]
         if "time" not in hit:
             continue
-        wf = hit["workflow"]
-        step = hit["step"]
+        groups.append((hit["workflow"], hit["step"]))
+        rows.append([hit["time"], hit[rss], hit[cpu], hit["rss_max"], hit["cpu_max"]])
+
+    wf_stats = {}
+    for (wf, step), means in group_means(groups, rows).items():
+        time_v, rss_v, cpu_v, rss_m, cpu_m = [int(m) for m in means]
+        if rss_v < 1024:
+            rss_v = rss_m
+        if cpu_v < 10:
+            cpu_v = cpu_m
         if not wf in wf_stats:
             wf_stats[wf] = {}
-        if not step in wf_stats[wf]:
-            wf_stats[wf][step] = []
-        wf_stats[wf][step].append(
-            [hit["time"], hit[rss], hit[cpu], hit["rss_max"], hit["cpu_max"]]
-        )
-
-    for wf in wf_stats:
-        for step in wf_stats[wf]:
-            hits = wf_stats[wf][step]
-            thits = len(hits)
-            time_v = int(sum([h[0] for h in hits]) / thits)
-            rss_v = int(sum([h[1] for h in hits]) / thits)
-            cpu_v = int(sum([h[2] for h in hits]) / thits)
-            rss_m = int(sum([h[3] for h in hits]) / thits)
-            cpu_m = int(sum([h[4] for h in hits]) / thits)
-            if rss_v < 1024:
-                rss_v = rss_m
-            if cpu_v < 10:
-                cpu_v = cpu_m
-            wf_stats[wf][step] = {
-                "time": time_v,
-                "rss": rss_v,
-                "cpu": cpu_v,
-                "rss_max": rss_m,
-                "cpu_max": cpu_m,
-                "rss_avg": int((rss_v + rss_m) / 2),
-                "cpu_avg": int((cpu_v + cpu_m) / 2),
-            }
+        wf_stats[wf][step] = {
+            "time": time_v,
+            "rss": rss_v,
+            "cpu": cpu_v,
+            "rss_max": rss_m,
+            "cpu_max": cpu_m,
+            "rss_avg": int((rss_v + rss_m) / 2),
+            "cpu_avg": int((cpu_v + cpu_m) / 2),
+        }
     return wf_stats
 
 
@@ -369,42 +539,11 @@ def get_summary_stats_from_json_file(stats_dict_file_path, cpu_normalize):
         stats_dict = json.load(stas_d_f)
     sdata = None
     try:
-        xdata = {}
-        for stat in stats_dict:
-            for item in stat:
-                try:
-                    xdata[item].append(stat[item])
-                except:
-                    xdata[item] = []
-                    xdata[item].append(stat[item])
-        sdata = {}
-        for x in xdata:
-            data = sorted(xdata[x])
-            if x in ["time", "num_threads", "processes", "num_fds"]:
-                sdata[x] = data[-1]
-                continue
-            if not x in ["rss", "vms", "pss", "uss", "shared", "data", "cpu"]:
-                continue
-            dlen = len(data)
-            if (x == "cpu") and (cpu_normalize > 1) and (data[-1] > 100):
-                data = [d / cpu_normalize for d in data]
-            for t in ["min", "max", "avg", "median", "25", "75", "90"]:
-                sdata[x + "_" + t] = 0
-            if dlen > 0:
-                sdata[x + "_min"] = data[0]
-                sdata[x + "_max"] = data[-1]
-                if dlen > 1:
-                    dlen2 = int(dlen / 2)
-                    if (dlen % 2) == 0:
-                        sdata[x + "_median"] = int((data[dlen2 - 1] + data[dlen2]) / 2)
-                    else:
-                        sdata[x + "_median"] = data[dlen2]
-                    sdata[x + "_avg"] = int(sum(data) / dlen)
-                    for t in [25, 75, 90]:
-                        sdata[x + "_" + str(t)] = int(percentile(t, data, dlen))
-                else:
-                    for t in ["25", "75", "90", "avg", "median"]:
-                        sdata[x + "_" + t] = data[0]
+        if isinstance(stats_dict, dict):
+            # summary sketches written by monitor_workflow.py instead of the samples
+            sdata = load_summary(stats_dict).summary(cpu_normalize)
+        else:
+            sdata = summary_stats(rows_to_columns(stats_dict), cpu_normalize)
     except Exception as e:
         print(str(e))
     return sdata
@@ -590,25 +729,26 @@ def set_avg_externals_build_stats(arch="*", lastNdays=60, extra_query=""):
         int(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()) * 1000
     )
     es_index = "externals_stats_avgs"
-    for btype in all_data:
-        for arch in all_data[btype]:
-            for name in all_data[btype][arch]:
-                total_entries = len(all_data[btype][arch][name]["time"])
-                for k in fields + [job_max_cpu]:
-                    top_values = sorted(all_data[btype][arch][name][k][:first_N], reverse=True)[
-                        :max_N
-                    ]
-                    all_data[btype][arch][name][k] = sum(top_values) / len(top_values)
-                all_data[btype][arch][name]["@timestamp"] = midday
-                all_data[btype][arch][name]["total_entries"] = total_entries
-                sha_str = "%s:%s:%s" % (arch, name, btype)
-                index_sha = sha1(sha_str.encode()).hexdigest()
-                try:
-                    send_payload(
-                        es_index, "_doc", index_sha, json.dumps(all_data[btype][arch][name])
-                    )
-                except Exception as e:
-                    print("ERROR:", e)
+    with BulkSender():
+        for btype in all_data:
+            for arch in all_data[btype]:
+                for name in all_data[btype][arch]:
+                    total_entries = len(all_data[btype][arch][name]["time"])
+                    for k in fields + [job_max_cpu]:
+                        top_values = sorted(
+                            all_data[btype][arch][name][k][:first_N], reverse=True
+                        )[:max_N]
+                        all_data[btype][arch][name][k] = sum(top_values) / len(top_values)
+                    all_data[btype][arch][name]["@timestamp"] = midday
+                    all_data[btype][arch][name]["total_entries"] = total_entries
+                    sha_str = "%s:%s:%s" % (arch, name, btype)
+                    index_sha = sha1(sha_str.encode()).hexdigest()
+                    try:
+                        send_payload(
+                            es_index, "_doc", index_sha, json.dumps(all_data[btype][arch][name])
+                        )
+                    except Exception as e:
+                        print("ERROR:", e)
     return
 
 
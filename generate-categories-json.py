@@ -2,6 +2,7 @@
 
 from collections import defaultdict
 from categories import CMSSW_CATEGORIES, CMSSW_L2, CMSSW_ORP
+from categories_index import get_categories_index, PACKAGE_INDEX_FILE
 import json
 
 # Generates a json file sumarizing the categories, their packages, and conveners
@@ -36,7 +37,13 @@ output = {}
 output["people_to_categories"] = CMSSW_L2
 output["categories_to_people"] = categories_to_people
 output["categories_to_packages"] = CMSSW_CATEGORIES
+index = get_categories_index(CMSSW_CATEGORIES)
+output["packages_to_categories"] = index.packages
 output["ORP"] = CMSSW_ORP
 
 with open(OUTPUT_FILE, "w") as out_json:
     json.dump(output, out_json, indent=4)
+
+# Regenerate the package -> categories index stored next to categories_map.py
+index.dump(PACKAGE_INDEX_FILE)
+print("Generated", PACKAGE_INDEX_FILE)
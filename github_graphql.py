@@ -0,0 +1,260 @@
+"""
+Optional GraphQL data loader for process_pr.
+
+Instead of many REST round-trips (PR commits, combined statuses, issue comments and, for
+every comment, its reactions), the state of a pull request is fetched with one GraphQL
+query (plus one extra query per 100 comments). The results are converted to the REST
+attribute layout and wrapped into the same PyGithub classes process_pr already uses, so
+edit/delete/create_status calls on them keep working.
+
+Requests go through the PyGithub requester, so they are recorded/replayed by the test
+framework like all other GitHub calls.
+"""
+
+from github.Commit import Commit
+from github.CommitStatus import CommitStatus
+from github.IssueComment import IssueComment
+
+GH_API_URL = "https://api.github.com"
+GRAPHQL_MAX_COMMITS = 250
+GRAPHQL_COMMENTS_PAGE = 100
+
+# GraphQL reaction content -> REST reaction content
+REACTIONS_MAP = {
+    "THUMBS_UP": "+1",
+    "THUMBS_DOWN": "-1",
+    "LAUGH": "laugh",
+    "HOORAY": "hooray",
+    "CONFUSED": "confused",
+    "HEART": "heart",
+    "ROCKET": "rocket",
+    "EYES": "eyes",
+}
+
+COMMENTS_FRAGMENT = """
+fragment prComments on IssueCommentConnection {
+  totalCount
+  pageInfo { hasNextPage endCursor }
+  nodes {
+    databaseId body createdAt updatedAt url
+    author { login }
+    reactionGroups { content viewerHasReacted reactors { totalCount } }
+  }
+}
+"""
+
+PR_SNAPSHOT_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $commits: Int!, $comments: Int!) {
+  viewer { login }
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      commits(last: $commits) {
+        totalCount
+        nodes {
+          commit {
+            oid message
+            author { name email date }
+            committer { name email date }
+            parents(first: 2) { nodes { oid } }
+          }
+        }
+      }
+      head: commits(last: 1) {
+        nodes {
+          commit {
+            oid
+            status { contexts { context state description targetUrl createdAt } }
+          }
+        }
+      }
+      comments(first: $comments) { ...prComments }
+    }
+  }
+}
+""" + COMMENTS_FRAGMENT
+
+PR_COMMENTS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $comments: Int!, $after: String!) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      comments(first: $comments, after: $after) { ...prComments }
+    }
+  }
+}
+""" + COMMENTS_FRAGMENT
+
+
+class GraphQLError(Exception):
+    pass
+
+
+class SnapshotIssueComment(IssueComment):
+    """IssueComment which already knows its reactions summary and the viewer's reactions."""
+
+    def __init__(self, requester, headers, attributes, completed):
+        self._snapshot_reactions = attributes.pop("reactions", {})
+        self.viewer = attributes.pop("viewer", None)
+        self.viewer_reactions = attributes.pop("viewer_reactions", [])
+        super(SnapshotIssueComment, self).__init__(requester, headers, attributes, completed)
+
+    @property
+    def reactions(self):
+        return self._snapshot_reactions
+
+
+def graphql_query(gh, query, variables):
+    # noinspection PyProtectedMember
+    _, data = gh._Github__requester.requestJsonAndCheck(
+        "POST", GH_API_URL + "/graphql", input={"query": query, "variables": variables}
+    )
+    if data.get("errors"):
+        raise GraphQLError("; ".join(e.get("message", str(e)) for e in data["errors"]))
+    return data["data"]
+
+
+def _user_attributes(actor):
+    # Deleted users ("ghost") have no author
+    login = actor["login"] if actor else "ghost"
+    return {"login": login, "url": "%s/users/%s" % (GH_API_URL, login)}
+
+
+def _comment_attributes(repository, node, viewer):
+    reactions = {"total_count": 0}
+    for v in REACTIONS_MAP.values():
+        reactions[v] = 0
+    viewer_reactions = []
+    for group in node["reactionGroups"] or []:
+        content = REACTIONS_MAP.get(group["content"], group["content"].lower())
+        reactions[content] = group["reactors"]["totalCount"]
+        reactions["total_count"] += reactions[content]
+        if group["viewerHasReacted"]:
+            viewer_reactions.append(content)
+    return {
+        "id": node["databaseId"],
+        "body": node["body"],
+        "created_at": node["createdAt"],
+        "updated_at": node["updatedAt"],
+        "html_url": node["url"],
+        "url": "%s/repos/%s/issues/comments/%s" % (GH_API_URL, repository, node["databaseId"]),
+        "user": _user_attributes(node["author"]),
+        "reactions": reactions,
+        "viewer": viewer,
+        "viewer_reactions": viewer_reactions,
+    }
+
+
+def _git_actor_attributes(actor):
+    actor = actor or {}
+    return {"name": actor.get("name"), "email": actor.get("email"), "date": actor.get("date")}
+
+
+def _commit_attributes(repository, commit):
+    url = "%s/repos/%s/commits/%s" % (GH_API_URL, repository, commit["oid"])
+    return {
+        "sha": commit["oid"],
+        "url": url,
+        "commit": {
+            "sha": commit["oid"],
+            "message": commit["message"],
+            "author": _git_actor_attributes(commit["author"]),
+            "committer": _git_actor_attributes(commit["committer"]),
+            "url": "%s/repos/%s/git/commits/%s" % (GH_API_URL, repository, commit["oid"]),
+        },
+        "parents": [
+            {"sha": p["oid"], "url": "%s/repos/%s/commits/%s" % (GH_API_URL, repository, p["oid"])}
+            for p in commit["parents"]["nodes"]
+        ],
+    }
+
+
+def _status_attributes(repository, sha, context):
+    return {
+        "context": context["context"],
+        "state": context["state"].lower(),
+        "description": context["description"],
+        "target_url": context["targetUrl"],
+        "created_at": context["createdAt"],
+        "updated_at": context["createdAt"],
+        "url": "%s/repos/%s/statuses/%s" % (GH_API_URL, repository, sha),
+    }
+
+
+class PullRequestSnapshot(object):
+    """
+    State of a pull request loaded via GraphQL:
+      commits: list of Commit, latest first (same order as get_pr_commits_reversed), or None
+               if the PR has too many commits to be loaded in one query
+      statuses: list of CommitStatus of the head commit
+      comments: list of SnapshotIssueComment in creation order
+    """
+
+    def __init__(self, gh, repository, number):
+        self.gh = gh
+        self.repository = repository
+        self.number = number
+        self.viewer = None
+        self.commits = None
+        self.head_sha = None
+        self.statuses = []
+        self.comments = []
+
+    def _make(self, klass, attributes):
+        # noinspection PyProtectedMember
+        return klass(self.gh._Github__requester, {}, attributes, completed=True)
+
+    def _add_comments(self, connection):
+        for node in connection["nodes"]:
+            self.comments.append(
+                self._make(
+                    SnapshotIssueComment,
+                    _comment_attributes(self.repository, node, self.viewer),
+                )
+            )
+        page_info = connection["pageInfo"]
+        return page_info["endCursor"] if page_info["hasNextPage"] else None
+
+    def load(self):
+        owner, name = self.repository.split("/", 1)
+        variables = {
+            "owner": owner,
+            "name": name,
+            "number": self.number,
+            "commits": GRAPHQL_MAX_COMMITS,
+            "comments": GRAPHQL_COMMENTS_PAGE,
+        }
+        data = graphql_query(self.gh, PR_SNAPSHOT_QUERY, variables)
+        self.viewer = data["viewer"]["login"]
+        pr = data["repository"]["pullRequest"]
+        if pr["commits"]["totalCount"] <= GRAPHQL_MAX_COMMITS:
+            self.commits = [
+                self._make(Commit, _commit_attributes(self.repository, n["commit"]))
+                for n in reversed(pr["commits"]["nodes"])
+            ]
+        for node in pr["head"]["nodes"]:
+            self.head_sha = node["commit"]["oid"]
+            status = node["commit"]["status"] or {"contexts": []}
+            self.statuses = [
+                self._make(CommitStatus, _status_attributes(self.repository, self.head_sha, c))
+                for c in status["contexts"]
+            ]
+        cursor = self._add_comments(pr["comments"])
+        while cursor:
+            variables = {
+                "owner": owner,
+                "name": name,
+                "number": self.number,
+                "comments": GRAPHQL_COMMENTS_PAGE,
+                "after": cursor,
+            }
+            data = graphql_query(self.gh, PR_COMMENTS_QUERY, variables)
+            cursor = self._add_comments(data["repository"]["pullRequest"]["comments"])
+        return self
+
+    def get_statuses(self, sha):
+        if sha != self.head_sha:
+            return None
+        return self.statuses
+
+
+def load_pr_snapshot(gh, repository, number):
+    return PullRequestSnapshot(gh, repository, number).load()
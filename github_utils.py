@@ -7,9 +7,12 @@ from __future__ import print_function
 import logging
 from sys import argv, version_info
 from hashlib import md5
-import json, sys, datetime
+import json, sys, datetime, threading
+from multiprocessing.pool import ThreadPool
 from time import sleep, gmtime, mktime, strptime
-from _py2with3compatibility import run_cmd, urlopen, Request, urlencode
+from _py2with3compatibility import run_cmd, Request, urlencode, HTTPError
+from http_utils import urlopen
+from os import environ, getenv, getpid, makedirs, remove, rename, stat, utime, walk
 from os.path import exists, dirname, abspath, join, basename, expanduser
 import re
 
@@ -17,7 +20,17 @@ GH_TOKENS = []
 GH_USER = None
 GH_TOKEN_INDEX = 0
 GH_RATE_LIMIT = [5000, 5000, 3600]
-GH_PAGE_RANGE = []
+GH_RATE_LIMIT_LOCK = threading.RLock()
+# Number of concurrent requests used to fetch the remaining pages of a paginated api call
+GH_API_PAGE_THREADS = int(getenv("CMS_GH_API_PAGE_THREADS", "4"))
+# Per thread state e.g. the page range of the last paginated api call
+GH_THREAD_DATA = threading.local()
+# On-disk cache of GET responses, revalidated with ETag/Last-Modified. GitHub does not
+# count "304 Not Modified" answers against the api rate limit.
+GH_API_CACHE_DIR = getenv("CMS_GH_API_CACHE_DIR", "")
+GH_API_CACHE_MAX_SIZE = int(getenv("CMS_GH_API_CACHE_MAX_SIZE", str(512 * 1024 * 1024)))
+GH_API_CACHE_SIZE = -1
+GH_API_CACHE_STATS = {"hit": 0, "miss": 0, "not_modified": 0, "store": 0, "evict": 0}
 try:
     from github import UnknownObjectException
 except:
@@ -47,7 +60,7 @@ def github_time(gh_time):
 
 
 def get_page_range():
-    return GH_PAGE_RANGE[:]
+    return getattr(GH_THREAD_DATA, "page_range", [])[:]
 
 
 def _check_rate_limits(
@@ -103,9 +116,12 @@ def _check_rate_limits(
 
 
 def check_rate_limits(msg=True, when_slow=False, prefix=""):
-    _check_rate_limits(
-        GH_RATE_LIMIT[0], GH_RATE_LIMIT[1], GH_RATE_LIMIT[2], msg, when_slow, prefix=prefix
-    )
+    # Threads fetching pages in parallel share one rate limit budget: only one of them
+    # at a time can decide to slow down (or switch token), the others wait for it.
+    with GH_RATE_LIMIT_LOCK:
+        _check_rate_limits(
+            GH_RATE_LIMIT[0], GH_RATE_LIMIT[1], GH_RATE_LIMIT[2], msg, when_slow, prefix=prefix
+        )
 
 
 def api_rate_limits_repo(obj, msg=True, when_slow=False, prefix=""):
@@ -561,6 +577,194 @@ def merge_dicts(old, new):
     return old
 
 
+def set_github_api_cache(cache_dir, max_size=None):
+    global GH_API_CACHE_DIR, GH_API_CACHE_MAX_SIZE, GH_API_CACHE_SIZE
+    GH_API_CACHE_DIR = cache_dir
+    GH_API_CACHE_SIZE = -1
+    if max_size is not None:
+        GH_API_CACHE_MAX_SIZE = max_size
+
+
+def set_default_github_api_cache():
+    """
+    Enables the cache in $HOME/.cache/cms-bot/github-api, unless CMS_GH_API_CACHE_DIR is
+    set (an empty value disables it)
+    """
+    if "CMS_GH_API_CACHE_DIR" not in environ:
+        set_github_api_cache(join(expanduser("~"), ".cache", "cms-bot", "github-api"))
+
+
+def get_github_api_cache_stats():
+    return dict(GH_API_CACHE_STATS)
+
+
+def reset_github_api_cache_stats():
+    for k in GH_API_CACHE_STATS:
+        GH_API_CACHE_STATS[k] = 0
+
+
+def add_github_api_cache_stats(stats):
+    """Adds the cache stats of another process (e.g. a query-and-process-prs.py worker)"""
+    for k in stats:
+        GH_API_CACHE_STATS[k] = GH_API_CACHE_STATS.get(k, 0) + stats[k]
+
+
+def print_github_api_cache_stats(prefix=""):
+    if not GH_API_CACHE_DIR:
+        return
+    stats = GH_API_CACHE_STATS
+    print(
+        "%sGitHub API cache: %s hits, %s not modified (304), %s misses, %s stored, %s evicted"
+        % (
+            prefix,
+            stats["hit"],
+            stats["not_modified"],
+            stats["miss"],
+            stats["store"],
+            stats["evict"],
+        )
+    )
+
+
+def _gh_api_cache_file(method, url, data):
+    key = "%s %s %s" % (method, url, data)
+    if version_info[0] == 3:
+        key = key.encode("utf-8", "ignore")
+    key = md5(key).hexdigest()
+    return join(GH_API_CACHE_DIR, key[0:2], key + ".json")
+
+
+def _gh_api_cache_read(cache_file):
+    if not exists(cache_file):
+        return None
+    try:
+        with open(cache_file) as ref:
+            return json.load(ref)
+    except Exception as e:
+        print("ERROR: Unable to read github api cache %s: %s" % (cache_file, e))
+    return None
+
+
+def _gh_api_cache_size():
+    global GH_API_CACHE_SIZE
+    if GH_API_CACHE_SIZE < 0:
+        GH_API_CACHE_SIZE = 0
+        for cdir, _, files in walk(GH_API_CACHE_DIR):
+            for f in files:
+                try:
+                    GH_API_CACHE_SIZE += stat(join(cdir, f)).st_size
+                except OSError:
+                    pass
+    return GH_API_CACHE_SIZE
+
+
+def _gh_api_cache_prune():
+    global GH_API_CACHE_SIZE
+    entries = []
+    for cdir, _, files in walk(GH_API_CACHE_DIR):
+        for f in files:
+            cfile = join(cdir, f)
+            try:
+                st = stat(cfile)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, cfile))
+    GH_API_CACHE_SIZE = sum([e[1] for e in entries])
+    # Drop least recently validated entries until we are back under 90% of the limit
+    for _, size, cfile in sorted(entries):
+        if GH_API_CACHE_SIZE <= GH_API_CACHE_MAX_SIZE * 0.9:
+            break
+        try:
+            remove(cfile)
+            GH_API_CACHE_SIZE -= size
+            GH_API_CACHE_STATS["evict"] += 1
+        except OSError:
+            pass
+
+
+def _gh_api_cache_write(cache_file, status, headers, content):
+    global GH_API_CACHE_SIZE
+    etag = headers.get("ETag")
+    last_modified = headers.get("Last-Modified")
+    if not (etag or last_modified):
+        return
+    try:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+    except UnicodeDecodeError:
+        # Not a text (json) response, just do not cache it
+        return
+    data = {
+        "status": status,
+        "etag": etag,
+        "last_modified": last_modified,
+        "link": headers.get("Link"),
+        "content": content,
+    }
+    try:
+        cache_dir = dirname(cache_file)
+        try:
+            makedirs(cache_dir)
+        except OSError:
+            pass
+        old_size = stat(cache_file).st_size if exists(cache_file) else 0
+        # Written then renamed, as concurrent processes (query-and-process-prs.py --jobs)
+        # share the cache
+        tmp_file = "%s.%s.tmp" % (cache_file, getpid())
+        with open(tmp_file, "w") as ref:
+            json.dump(data, ref)
+        rename(tmp_file, cache_file)
+        GH_API_CACHE_SIZE = _gh_api_cache_size() + stat(cache_file).st_size - old_size
+        GH_API_CACHE_STATS["store"] += 1
+    except Exception as e:
+        print("ERROR: Unable to write github api cache %s: %s" % (cache_file, e))
+        return
+    if GH_API_CACHE_SIZE > GH_API_CACHE_MAX_SIZE:
+        _gh_api_cache_prune()
+
+
+def _github_api_request(url, data, headers, method):
+    """
+    Sends the request and returns (status, headers, content). GET requests are
+    revalidated against the on-disk cache (if enabled) using conditional headers.
+    """
+    cache_file = None
+    cache = None
+    headers = dict(headers)
+    if GH_API_CACHE_DIR and (method == "GET"):
+        cache_file = _gh_api_cache_file(method, url, data)
+        cache = _gh_api_cache_read(cache_file)
+        if not cache:
+            GH_API_CACHE_STATS["miss"] += 1
+        else:
+            GH_API_CACHE_STATS["hit"] += 1
+            if cache["etag"]:
+                headers["If-None-Match"] = cache["etag"]
+            if cache["last_modified"]:
+                headers["If-Modified-Since"] = cache["last_modified"]
+    request = Request(url, data=data, headers=headers)
+    request.get_method = lambda: method
+    try:
+        response = urlopen(request)
+    except HTTPError as e:
+        if (e.code != 304) or (not cache):
+            raise
+        GH_API_CACHE_STATS["not_modified"] += 1
+        resp_headers = e.headers
+        try:
+            # Touch the entry so that size based eviction drops stale entries first
+            utime(cache_file, None)
+        except OSError:
+            pass
+        if cache["link"] and not resp_headers.get("Link"):
+            resp_headers["Link"] = cache["link"]
+        return cache["status"], resp_headers, cache["content"].encode("utf-8")
+    content = response.read()
+    if cache_file:
+        _gh_api_cache_write(cache_file, response.status, response.headers, content)
+    return response.status, response.headers, content
+
+
 def github_api(
     uri,
     params=None,
@@ -580,7 +784,7 @@ def github_api(
 
     check_rate_limits(msg=False)
 
-    global GH_RATE_LIMIT, GH_PAGE_RANGE
+    global GH_RATE_LIMIT
     if max_pages > 0 and page > max_pages:  # noqa for readability
         return "[]" if raw else []
     if not params:
@@ -606,55 +810,39 @@ def github_api(
         url = url + "page=%s" % page
     headers["Authorization"] = "token " + get_gh_token()
     logging.getLogger("github").debug("%s %s", method, url)
-    request = Request(url, data=data, headers=headers)
-    request.get_method = lambda: method
-    response = urlopen(request)
-    if page <= 1:
-        GH_PAGE_RANGE = []
+    resp_status, resp_headers, cont = _github_api_request(url, data, headers, method)
     try:
         GH_RATE_LIMIT = [
-            int(response.headers["X-RateLimit-Remaining"]),
-            int(response.headers["X-RateLimit-Limit"]),
-            int(response.headers["X-Ratelimit-Reset"]),
+            int(resp_headers["X-RateLimit-Remaining"]),
+            int(resp_headers["X-RateLimit-Limit"]),
+            int(resp_headers["X-Ratelimit-Reset"]),
         ]
     except Exception as e:
         print("ERROR:", e)
+    page_range = []
     if (page <= 1) and (method == "GET"):
-        link = response.headers.get("Link")
-        if link:
-            pages = []
-            for x in link.split(" "):
-                m = re.match("^.*[?&]page=([1-9][0-9]*).*$", x)
-                if m:
-                    pages.append(int(m.group(1)))
-            if len(pages) == 2:
-                GH_PAGE_RANGE += range(pages[0], pages[1] + 1)
-            elif len(pages) == 1:
-                GH_PAGE_RANGE += pages
-    cont = response.read()
+        page_range = _github_api_page_range(resp_headers.get("Link"))
+        GH_THREAD_DATA.page_range = page_range
     if status:
-        return response.status in status
+        return resp_status in status
     if raw:
         return cont
     data = json.loads(cont)
-    if GH_PAGE_RANGE and all_pages:
+    if page_range and all_pages:
         if last_page:
             return github_api(
                 uri,
                 params,
                 method,
                 headers,
-                GH_PAGE_RANGE[-1],
+                page_range[-1],
                 raw=False,
                 per_page=per_page,
                 all_pages=False,
             )
-        for page in GH_PAGE_RANGE:
-            if max_pages > 0 and page > max_pages:  # noqa for readability
-                break
-            new_data = github_api(
-                uri, params, method, headers, page, raw=raw, per_page=per_page, all_pages=False
-            )
+        if max_pages > 0:
+            page_range = [p for p in page_range if p <= max_pages]
+        for new_data in _github_api_pages(uri, params, method, headers, page_range, per_page):
             if merge_dict:
                 data = merge_dicts(data, new_data)
             else:
@@ -662,6 +850,41 @@ def github_api(
     return data
 
 
+def _github_api_page_range(link):
+    pages = []
+    if link:
+        for x in link.split(" "):
+            m = re.match("^.*[?&]page=([1-9][0-9]*).*$", x)
+            if m:
+                pages.append(int(m.group(1)))
+    if len(pages) == 2:
+        return list(range(pages[0], pages[1] + 1))
+    return pages
+
+
+def _github_api_pages(uri, params, method, headers, pages, per_page):
+    """
+    Fetches the given pages of a paginated api call, concurrently if there are enough
+    pages and api rate limit left. Results are returned in the page order.
+    """
+
+    def get_page(page):
+        return github_api(
+            uri, dict(params), method, dict(headers), page, per_page=per_page, all_pages=False
+        )
+
+    threads = min(GH_API_PAGE_THREADS, len(pages))
+    # Near the rate limit, fall back to serial requests so that slowing down is effective
+    if (threads <= 1) or (GH_RATE_LIMIT[0] < 1000 + len(pages)):
+        return [get_page(page) for page in pages]
+    pool = ThreadPool(threads)
+    try:
+        return pool.map(get_page, pages)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def get_pull_requests(gh_repo, branch=None, status="open"):
     """
     Get all pull request for the current branch of the repo
@@ -0,0 +1,286 @@
+#########################################################
+# This library need to support both python3 and python2 #
+# so makes sure changes work for both py2/py3
+#########################################################
+# Keep-alive connection pool shared by github_utils and es_utils. Instead of opening a new
+# TLS connection for every urlopen() call, connections are kept open per host and reused.
+from __future__ import print_function
+
+import errno, ssl, socket, threading
+from io import BytesIO
+from os import getenv
+from sys import version_info
+from time import time
+from _py2with3compatibility import urlparse, HTTPError, HTTPSConnection
+from _py2with3compatibility import urlopen as urllib_urlopen
+
+try:
+    from http.client import HTTPConnection, HTTPException, RemoteDisconnected
+except ImportError:
+    from httplib import HTTPConnection, HTTPException, BadStatusLine as RemoteDisconnected
+
+try:
+    STALE_SEND_ERRORS = (BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+except NameError:
+    STALE_SEND_ERRORS = ()
+
+try:
+    from urllib.request import getproxies, proxy_bypass
+except ImportError:
+    from urllib import getproxies, proxy_bypass
+
+HTTP_POOL_SIZE = int(getenv("CMS_HTTP_POOL_SIZE", "8"))
+HTTP_POOL_TIMEOUT = float(getenv("CMS_HTTP_POOL_TIMEOUT", "0"))
+HTTP_POOL_ENABLED = getenv("CMS_HTTP_POOL_DISABLE", "") == ""
+HTTP_MAX_REDIRECTS = 5
+# Methods which can be sent again if the connection fails after the request was sent
+HTTP_IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]
+HTTP_POOLS = {}
+HTTP_POOLS_LOCK = threading.Lock()
+SSL_CONTEXTS = {}
+
+
+def get_ssl_context(verify=True):
+    """Returns a cached SSL context, building a context is expensive."""
+    if verify not in SSL_CONTEXTS:
+        if verify:
+            SSL_CONTEXTS[verify] = ssl.create_default_context()
+        else:
+            SSL_CONTEXTS[verify] = ssl._create_unverified_context()
+    return SSL_CONTEXTS[verify]
+
+
+class HTTPResponse(object):
+    """Fully read response, looks like the object returned by urllib's urlopen."""
+
+    def __init__(self, url, status, reason, headers, content):
+        self.url = url
+        self.status = status
+        self.code = status
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.fp = BytesIO(content)
+
+    def read(self, size=-1):
+        return self.fp.read(size)
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def is_stale_connection_error(error, sent, method):
+    """
+    True if a request which failed on a reused (idle) connection can be sent again on a new
+    one: the server closed the connection before the request was sent, or without sending
+    any response. Other errors (e.g. timeouts) are only retried for idempotent methods, as
+    the server may have processed the request (no duplicated comments or ES documents).
+    """
+    if isinstance(error, socket.timeout):
+        return False
+    if isinstance(error, RemoteDisconnected):
+        return True
+    if not sent:
+        if isinstance(error, STALE_SEND_ERRORS):
+            return True
+        if getattr(error, "errno", None) in [errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED]:
+            return True
+    return method in HTTP_IDEMPOTENT_METHODS
+
+
+class HTTPConnectionPool(object):
+    def __init__(self, scheme, host, port, context=None, size=HTTP_POOL_SIZE, timeout=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.context = context
+        self.size = size
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+        self.stats = {"connections": 0, "requests": 0, "reused": 0, "tls_time": 0.0}
+
+    def _new_connection(self):
+        kwargs = {}
+        if self.timeout:
+            kwargs["timeout"] = self.timeout
+        if self.scheme == "https":
+            conn = HTTPSConnection(self.host, self.port, context=self.context, **kwargs)
+        else:
+            conn = HTTPConnection(self.host, self.port, **kwargs)
+        stime = time()
+        conn.connect()
+        with self.lock:
+            self.stats["connections"] += 1
+            self.stats["tls_time"] += time() - stime
+        return conn
+
+    def _get_connection(self):
+        with self.lock:
+            if self.idle:
+                self.stats["reused"] += 1
+                return self.idle.pop(), True
+        return self._new_connection(), False
+
+    def _put_connection(self, conn):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, conn, method, path, body, headers):
+        """Returns (response, content, error, sent), error is None if the request succeeded"""
+        sent = False
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            sent = True
+            response = conn.getresponse()
+            return response, response.read(), None, sent
+        except (HTTPException, socket.error) as e:
+            conn.close()
+            return None, None, e, sent
+        except Exception:
+            conn.close()
+            raise
+
+    def request(self, method, path, body=None, headers=None):
+        conn, reused = self._get_connection()
+        with self.lock:
+            self.stats["requests"] += 1
+        response, content, error, sent = self._send(conn, method, path, body, headers)
+        if error is not None:
+            if not (reused and is_stale_connection_error(error, sent, method)):
+                raise error
+            # Server has closed the idle keep-alive connection, retry with a new one
+            conn = self._new_connection()
+            response, content, error, sent = self._send(conn, method, path, body, headers)
+            if error is not None:
+                raise error
+        if response.will_close:
+            conn.close()
+        else:
+            self._put_connection(conn)
+        return response.status, response.reason, response.msg, content
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+def get_pool(scheme, host, port, context=None):
+    key = (scheme, host, port, id(context))
+    with HTTP_POOLS_LOCK:
+        if key not in HTTP_POOLS:
+            HTTP_POOLS[key] = HTTPConnectionPool(
+                scheme, host, port, context, timeout=HTTP_POOL_TIMEOUT or None
+            )
+        return HTTP_POOLS[key]
+
+
+def _use_proxy(host):
+    proxies = getproxies()
+    return ("https" in proxies or "http" in proxies) and not proxy_bypass(host)
+
+
+def urlopen(request, data=None, context=None):
+    """
+    Drop-in replacement of urllib's urlopen() for urllib Request objects and plain urls,
+    which sends the request over a pooled keep-alive connection. Like urlopen(), it raises
+    HTTPError for non 2XX responses and follows redirects.
+    """
+    if not hasattr(request, "get_method"):
+        from _py2with3compatibility import Request
+
+        request = Request(request, data)
+    url = request.get_full_url()
+    purl = urlparse(url)
+    if (
+        (not HTTP_POOL_ENABLED)
+        or (purl.scheme not in ["http", "https"])
+        or _use_proxy(purl.hostname)
+    ):
+        if context is not None:
+            return urllib_urlopen(request, context=context)
+        return urllib_urlopen(request)
+    method = request.get_method()
+    body = request.get_data() if hasattr(request, "get_data") else request.data
+    headers = dict(request.header_items())
+    if "User-agent" not in headers:
+        headers["User-agent"] = "Python-urllib/%s.%s" % version_info[:2]
+    if (body is not None) and ("Content-type" not in headers):
+        headers["Content-type"] = "application/x-www-form-urlencoded"
+    if purl.scheme == "https" and context is None:
+        context = get_ssl_context()
+    for _ in range(HTTP_MAX_REDIRECTS + 1):
+        port = purl.port or (443 if purl.scheme == "https" else 80)
+        pool = get_pool(purl.scheme, purl.hostname, port, context)
+        path = purl.path or "/"
+        if purl.query:
+            path = path + "?" + purl.query
+        status, reason, resp_headers, content = pool.request(method, path, body, headers)
+        location = resp_headers.get("Location")
+        if (status in [301, 302, 303, 307, 308]) and location:
+            url = (
+                location
+                if "://" in location
+                else "%s://%s%s" % (purl.scheme, purl.netloc, location)
+            )
+            purl = urlparse(url)
+            if status == 303 or (status in [301, 302] and method not in ["GET", "HEAD"]):
+                method, body = "GET", None
+            continue
+        break
+    if not (200 <= status < 300):
+        raise HTTPError(url, status, reason, resp_headers, BytesIO(content))
+    return HTTPResponse(url, status, reason, resp_headers, content)
+
+
+def get_http_pool_stats():
+    stats = {}
+    with HTTP_POOLS_LOCK:
+        pools = list(HTTP_POOLS.values())
+    for pool in pools:
+        host = pool.host
+        if host not in stats:
+            stats[host] = {"connections": 0, "requests": 0, "reused": 0, "tls_time": 0.0}
+        for k in pool.stats:
+            stats[host][k] += pool.stats[k]
+    for host in stats:
+        req = stats[host]["requests"]
+        stats[host]["reuse_ratio"] = (float(stats[host]["reused"]) / req) if req else 0.0
+    return stats
+
+
+def print_http_pool_stats(prefix=""):
+    stats = get_http_pool_stats()
+    for host in sorted(stats):
+        s = stats[host]
+        print(
+            "%sHTTP pool %s: %s requests, %s connections, reuse ratio %.2f, connect/TLS time %.2fs"
+            % (prefix, host, s["requests"], s["connections"], s["reuse_ratio"], s["tls_time"])
+        )
+
+
+def close_http_pools():
+    with HTTP_POOLS_LOCK:
+        pools = list(HTTP_POOLS.values())
+    for pool in pools:
+        pool.close()
@@ -10,9 +10,12 @@ from __future__ import print_function
 from operator import itemgetter
 from time import sleep, time
 from copy import deepcopy
-import threading, json, os
+from heapq import heappush, heappop
+from collections import deque
+import threading, json, os, select, signal, socket, fcntl
 from optparse import OptionParser
 from subprocess import Popen
+from tempfile import gettempdir
 from os.path import abspath, dirname
 import sys
 import re
@@ -22,6 +25,13 @@ from cmsutils import MachineCPUCount, MachineMemoryGB, gpuList
 
 global simulation_time
 global simulation
+SORT_KEYS = ["rss", "cpu", "time"]
+LOOKAHEAD = 8
+TELEMETRY_WARMUP = int(os.environ.get("CMS_JOBSCHEDULER_TELEMETRY_WARMUP", "60"))
+TELEMETRY_WINDOW = int(os.environ.get("CMS_JOBSCHEDULER_TELEMETRY_WINDOW", "60"))
+TELEMETRY_MARGIN = float(os.environ.get("CMS_JOBSCHEDULER_TELEMETRY_MARGIN", "1.25"))
+TELEMETRY_PAUSE = float(os.environ.get("CMS_JOBSCHEDULER_TELEMETRY_PAUSE", "0.9"))
+TELEMETRY_STALE = int(os.environ.get("CMS_JOBSCHEDULER_TELEMETRY_STALE", "30"))
 
 
 def gettime(addtime=0):
@@ -63,6 +73,30 @@ def format(s, **kwds):
     return s % kwds
 
 
+def jobCommand(job):
+    cmd = job["command"]
+    if job.get("gpu") is not None:
+        maker, idx = job["gpu"].split(":", 1)
+        # Remove assignment of GPUs if it exists
+        cmd = re.sub(r"HIP_VISIBLE_DEVICES=\S* ", " ", cmd)
+        cmd = re.sub(r"CUDA_VISIBLE_DEVICES=\S* ", " ", cmd)
+
+        if maker == "cuda":
+            cmd = cmd.replace(
+                "cmsDriver.py",
+                "CUDA_VISIBLE_DEVICES=%s HIP_VISIBLE_DEVICES= cmsDriver.py" % idx,
+            )
+        elif maker == "rocm":
+            cmd = cmd.replace(
+                "cmsDriver.py",
+                "HIP_VISIBLE_DEVICES=%s CUDA_VISIBLE_DEVICES= cmsDriver.py" % idx,
+            )
+
+        job["command"] = cmd
+        print("Running command:", cmd)
+    return cmd
+
+
 def runJob(job):
     if simulation:
         while not os.path.exists(job["jobid"]):
@@ -70,27 +104,7 @@ def runJob(job):
         os.remove(job["jobid"])
         job["exit_code"] = 0
     else:
-        cmd = job["command"]
-        if job.get("gpu") is not None:
-            maker, idx = job["gpu"].split(":", 1)
-            # Remove assignment of GPUs if it exists
-            cmd = re.sub(r"HIP_VISIBLE_DEVICES=\S* ", " ", cmd)
-            cmd = re.sub(r"CUDA_VISIBLE_DEVICES=\S* ", " ", cmd)
-
-            if maker == "cuda":
-                cmd = cmd.replace(
-                    "cmsDriver.py",
-                    "CUDA_VISIBLE_DEVICES=%s HIP_VISIBLE_DEVICES= cmsDriver.py" % idx,
-                )
-            elif maker == "rocm":
-                cmd = cmd.replace(
-                    "cmsDriver.py",
-                    "HIP_VISIBLE_DEVICES=%s CUDA_VISIBLE_DEVICES= cmsDriver.py" % idx,
-                )
-
-            job["command"] = cmd
-            print("Running command:", cmd)
-        p = Popen(cmd, shell=True)
+        p = Popen(jobCommand(job), shell=True)
         job["exit_code"] = os.waitpid(p.pid, 0)[1]
 
 
@@ -112,6 +126,25 @@ def getFinalCommand(group, jobs, resources):
     return job
 
 
+def canRun(job, resources):
+    return (
+        (job["rss"] <= resources["available"]["rss"])
+        and (job["cpu"] <= resources["available"]["cpu"])
+        and ((not "gpu" in job) or resources["available"]["gpu"])
+    )
+
+
+def getSortKey(resources, order):
+    if order != "dynamic":
+        return order
+    rss_v = 100.0 * resources["available"]["rss"] / resources["total"]["rss"]
+    cpu_v = 100.0 * resources["available"]["cpu"] / resources["total"]["cpu"]
+    sort_by = "rss" if rss_v > cpu_v else "cpu"
+    if not simulation:
+        print("Sort by ", sort_by, rss_v, "vs", cpu_v)
+    return sort_by
+
+
 def getJob(jobs, resources, order):
     pending_jobs = []
     pending_groups = [g for g in jobs["jobs"] if g["state"] == "Pending"]
@@ -122,40 +155,28 @@ def getJob(jobs, resources, order):
             return True, getFinalCommand(group, jobs, resources)
         for job in group["commands"]:
             if job["state"] == "Pending":
-                if (
-                    (job["rss"] <= resources["available"]["rss"])
-                    and (job["cpu"] <= resources["available"]["cpu"])
-                    and ((not "gpu" in job) or resources["available"]["gpu"])
-                ):
+                if canRun(job, resources):
                     pending_jobs.append(job)
                 break
             if job["exit_code"] != 0:
                 return True, getFinalCommand(group, jobs, resources)
     if not pending_jobs:
         return len(pending_groups) > 0, {}
-    sort_by = order
-    if order == "dynamic":
-        rss_v = 100.0 * resources["available"]["rss"] / resources["total"]["rss"]
-        cpu_v = 100.0 * resources["available"]["cpu"] / resources["total"]["cpu"]
-        sort_by = "rss" if rss_v > cpu_v else "cpu"
-        if not simulation:
-            print("Sort by ", sort_by, rss_v, "vs", cpu_v)
+    sort_by = getSortKey(resources, order)
     return True, sorted(pending_jobs, key=itemgetter(sort_by), reverse=True)[0]
 
 
-def startJob(job, resources, thrds):
+def reserveJob(job, resources, running):
     job["state"] = "Running"
     job["start_time"] = gettime()
     for pram in ["rss", "cpu"]:
         resources["available"][pram] = resources["available"][pram] - job[pram]
     if "gpu" in job:
         job["gpu"] = resources["available"]["gpu"].pop(0)
-    t = threading.Thread(target=runJob, args=(job,))
-    thrds[t] = job
     if not simulation:
         print(
             "Run",
-            len(thrds),
+            running,
             job["jobid"],
             job["rss"],
             job["cpu"],
@@ -163,54 +184,560 @@ def startJob(job, resources, thrds):
             resources["available"],
             "GPU: %s" % (job["gpu"] if "gpu" in job else "-"),
         )
+
+
+def startJob(job, resources, thrds):
+    t = threading.Thread(target=runJob, args=(job,))
+    thrds[t] = job
+    reserveJob(job, resources, len(thrds))
     t.start()
 
 
+def releaseJob(job, resources, running):
+    job["state"] = "Done"
+    job["exec_time"] = job["end_time"] - job["start_time"]
+    if not simulation:
+        dtime = job["exec_time"] - job["origtime"]
+        if dtime > 60:
+            print(
+                "===> SLOW JOB:",
+                job["exec_time"],
+                "secs vs ",
+                job["origtime"],
+                "secs. Diff:",
+                dtime,
+            )
+    resources["done_jobs"] = resources["done_jobs"] + 1
+    for pram in ["rss", "cpu"]:
+        resources["available"][pram] = resources["available"][pram] + job[pram]
+    if job.get("gpu") is not None:
+        resources["available"]["gpu"].append(job["gpu"])
+    if not simulation:
+        print(
+            "Done",
+            running,
+            job["jobid"],
+            job["exec_time"],
+            job["exit_code"],
+            resources["available"],
+            "JOBS:",
+            resources["done_jobs"],
+            "/",
+            resources["total_jobs"],
+            "GROUPS:",
+            resources["done_groups"],
+            "/",
+            resources["total_groups"],
+        )
+
+
 def checkJobs(thrds, resources):
     done_thrds = []
     if simulation:
         done_thrds = simulate_done_job(thrds, resources)
+        # jobs done at the same time move the simulated clock only once
+        if done_thrds:
+            gettime(thrds[done_thrds[0]]["time2finish"])
     while not done_thrds:
         sleep(1)
         done_thrds = [t for t in thrds if not t.is_alive()]
     for t in done_thrds:
         job = thrds.pop(t)
-        job["end_time"] = gettime(0 if not simulation else job["time2finish"])
-        job["state"] = "Done"
-        job["exec_time"] = job["end_time"] - job["start_time"]
-        if not simulation:
-            dtime = job["exec_time"] - job["origtime"]
-            if dtime > 60:
-                print(
-                    "===> SLOW JOB:",
-                    job["exec_time"],
-                    "secs vs ",
-                    job["origtime"],
-                    "secs. Diff:",
-                    dtime,
-                )
-        resources["done_jobs"] = resources["done_jobs"] + 1
-        for pram in ["rss", "cpu"]:
-            resources["available"][pram] = resources["available"][pram] + job[pram]
-        if job.get("gpu") is not None:
-            resources["available"]["gpu"].append(job["gpu"])
-        if not simulation:
-            print(
-                "Done",
-                len(thrds),
-                job["jobid"],
-                job["exec_time"],
-                job["exit_code"],
-                resources["available"],
-                "JOBS:",
-                resources["done_jobs"],
-                "/",
-                resources["total_jobs"],
-                "GROUPS:",
-                resources["done_groups"],
-                "/",
-                resources["total_groups"],
-            )
+        job["end_time"] = gettime()
+        releaseJob(job, resources, len(thrds))
+
+
+def runPolling(jobs, resources, order, maxJobs):
+    """The original scheduler: a thread per job, polled every second"""
+    thrds = {}
+    wait_for_jobs = False
+    has_jobs = True
+    while has_jobs:
+        while wait_for_jobs or ((maxJobs > 0) and (len(thrds) >= maxJobs)):
+            wait_for_jobs = False
+            checkJobs(thrds, resources)
+        has_jobs, job = getJob(jobs, resources, order)
+        resources["decisions"] += 1
+        if job:
+            startJob(job, resources, thrds)
+        else:
+            wait_for_jobs = True
+    while len(thrds):
+        checkJobs(thrds, resources)
+
+
+class ReadyJobs(object):
+    """
+    The runnable jobs, i.e. the next pending command of each group without running job, in
+    one heap per sort key (largest first, then in group order). Started jobs are dropped
+    lazily from the other heaps.
+    """
+
+    def __init__(self):
+        self.heaps = dict([(k, []) for k in SORT_KEYS])
+        self.count = 0
+
+    def push(self, job, gidx):
+        self.count += 1
+        for k in SORT_KEYS:
+            heappush(self.heaps[k], (-job[k], gidx, self.count, job))
+
+    def head(self, sort_by):
+        """Returns the largest sort_by job, or None"""
+        heap = self.heaps[sort_by]
+        while heap and heap[0][-1]["state"] != "Pending":
+            heappop(heap)
+        return heap[0][-1] if heap else None
+
+    def select(self, sort_by, score, limit=1):
+        """
+        Removes the best of the first limit (in sort_by order) jobs for which score(job)
+        is not None, the first one with the highest score. Returns (group index, job).
+        """
+        heap = self.heaps[sort_by]
+        seen = []
+        best = None
+        while heap and limit > 0:
+            entry = heappop(heap)
+            if entry[-1]["state"] != "Pending":
+                continue
+            seen.append(entry)
+            value = score(entry[-1])
+            if value is None:
+                continue
+            limit -= 1
+            if (best is None) or (value > best[0]):
+                best = (value, entry)
+        for entry in seen:
+            if (best is None) or (entry is not best[1]):
+                heappush(heap, entry)
+        if best is None:
+            return None, None
+        return best[1][1], best[1][-1]
+
+    def pop(self, sort_by, resources):
+        """Removes the largest sort_by job which can run now, returns (group index, job)"""
+        return self.select(sort_by, lambda job: 0 if canRun(job, resources) else None)
+
+
+def jobNeeds(job):
+    return {"cpu": job["cpu"], "rss": job["rss"], "gpu": 1 if "gpu" in job else 0}
+
+
+def freeResources(resources):
+    avail = resources["available"]
+    return {"cpu": avail["cpu"], "rss": avail["rss"], "gpu": len(avail["gpu"])}
+
+
+def fitsIn(job, free):
+    needs = jobNeeds(job)
+    return all([needs[k] <= free[k] for k in needs])
+
+
+def criticalPathJob(scheduler, lookahead=1, score=None):
+    """
+    Longest remaining group time first: the job with the largest (cumulative) time starts
+    as soon as it fits. Until then, it gets a reservation at the expected end of the
+    running jobs and only the jobs which fit now and either end before the reservation or
+    fit next to it (backfilling) can start, the first of them in time order or, with
+    score, the best of the first lookahead ones.
+    """
+    resources = scheduler.resources
+    head = scheduler.ready.head("time")
+    if head is None:
+        return None, None
+    if canRun(head, resources):
+        return scheduler.ready.pop("time", resources)
+    start, spare = scheduler.reservation(head)
+    now = gettime()
+
+    def backfill(job):
+        if not canRun(job, resources):
+            return None
+        if (now + job["origtime"] > start) and (not fitsIn(job, spare)):
+            return None
+        return score(job, resources) if score else 0
+
+    return scheduler.ready.select("time", backfill, lookahead)
+
+
+def packingScore(job, resources):
+    """Alignment of the job needs with the free cpu/rss/gpu (both relative to the totals)"""
+    needs = jobNeeds(job)
+    free = freeResources(resources)
+    total = {"cpu": resources["total"]["cpu"], "rss": resources["total"]["rss"]}
+    total["gpu"] = len(resources["total"]["gpu"])
+    return sum([1.0 * needs[k] * free[k] / (total[k] * total[k]) for k in needs if total[k] > 0])
+
+
+def binPackingJob(scheduler):
+    """criticalPathJob, backfilling the job which packs best among the first LOOKAHEAD ones"""
+    return criticalPathJob(scheduler, LOOKAHEAD, packingScore)
+
+
+PLACEMENT_POLICIES = {"critical": criticalPathJob, "pack": binPackingJob}
+
+
+def setNonBlocking(fd):
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+
+def nodeMemoryUsed():
+    """Fraction of the memory of the node in use (i.e. not MemAvailable), 0 if unknown"""
+    meminfo = {}
+    try:
+        with open("/proc/meminfo") as ref:
+            for line in ref:
+                items = line.split()
+                meminfo[items[0]] = int(items[1])
+        return 1.0 - 1.0 * meminfo["MemAvailable:"] / meminfo["MemTotal:"]
+    except Exception:
+        return 0
+
+
+class JobTelemetry(object):
+    """
+    Live rss/cpu of the running jobs, sent every sample by monitor_workflow.py to a unix
+    datagram socket (CMS_MONITOR_SOCKET) with the id of its job (CMS_JOBSCHEDULER_JOBID).
+
+    Once a job ran for TELEMETRY_WARMUP secs, the part of its reservation above
+    TELEMETRY_MARGIN times its peak rss and its average cpu (over the last
+    TELEMETRY_WINDOW secs) is given to the other jobs, and taken back if its usage grows.
+    No new job starts while the rss of the jobs or the memory used on the node is above
+    TELEMETRY_PAUSE of the total.
+
+    Each step of a job has its own monitor: the usage of a job is the sum of the last
+    samples of its monitors, a monitor being dropped when it sends its "done" message or
+    after TELEMETRY_STALE secs without samples.
+    """
+
+    def __init__(self, path, resources, env):
+        if os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.resources = resources
+        self.env = env
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        self.sock.setblocking(False)
+        # SIGCHLD wakes up the select of wait()
+        self.wakeup, wfd = os.pipe()
+        for fd in [self.wakeup, wfd]:
+            setNonBlocking(fd)
+        self.wakeupWrite = wfd
+        self.oldWakeup = signal.set_wakeup_fd(wfd)
+        self.oldHandler = signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        self.jobs = {}
+        self.pause = False
+
+    def close(self):
+        signal.signal(signal.SIGCHLD, self.oldHandler)
+        signal.set_wakeup_fd(self.oldWakeup)
+        for fd in [self.wakeup, self.wakeupWrite]:
+            os.close(fd)
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def jobEnv(self, job):
+        env = dict(os.environ)
+        env.update(self.env)
+        env["CMS_MONITOR_SOCKET"] = self.path
+        env["CMS_JOBSCHEDULER_JOBID"] = job["jobid"]
+        return env
+
+    def start(self, job):
+        self.jobs[job["jobid"]] = {
+            "start": time(),
+            "pids": {},
+            "history": deque(),
+            "peak": 0,
+            "reclaimed": {"rss": 0, "cpu": 0},
+        }
+
+    def release(self, job):
+        """Takes back what was given from the reservation of a job which is done"""
+        data = self.jobs.pop(job["jobid"], None)
+        if data:
+            for k, v in data["reclaimed"].items():
+                self.resources["available"][k] -= v
+
+    def wait(self, timeout):
+        """Waits for a SIGCHLD or samples, at most timeout secs"""
+        try:
+            select.select([self.sock, self.wakeup], [], [], timeout)
+        except (select.error, OSError):
+            pass
+        try:
+            while os.read(self.wakeup, 1024):
+                pass
+        except OSError:
+            pass
+
+    def read(self):
+        """Reads the pending samples, returns the number of samples of running jobs"""
+        updated = set()
+        now = time()
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (socket.error, OSError):
+                break
+            try:
+                sample = json.loads(data.decode())
+                job = self.jobs[sample["jobid"]]
+                if sample.get("done"):
+                    job["pids"].pop(sample["pid"], None)
+                else:
+                    job["pids"][sample["pid"]] = (int(sample["rss"]), int(sample["cpu"]), now)
+                updated.add(sample["jobid"])
+            except Exception:
+                continue
+        samples = len(updated)
+        for jobid, job in self.jobs.items():
+            stale = [p for p, u in job["pids"].items() if u[2] < now - TELEMETRY_STALE]
+            for pid in stale:
+                del job["pids"][pid]
+            if stale:
+                updated.add(jobid)
+        for jobid in updated:
+            job = self.jobs[jobid]
+            rss = sum([u[0] for u in job["pids"].values()])
+            cpu = sum([u[1] for u in job["pids"].values()])
+            job["peak"] = max(job["peak"], rss)
+            job["history"].append((now, rss, cpu))
+            while job["history"][0][0] < now - TELEMETRY_WINDOW:
+                job["history"].popleft()
+        return samples
+
+    def adjust(self, running):
+        """Updates the resources given from the reservations of the running jobs"""
+        available = self.resources["available"]
+        now = time()
+        used = 0
+        for job in running:
+            data = self.jobs.get(job["jobid"])
+            if not data or not data["history"]:
+                continue
+            used += data["history"][-1][1]
+            if now - data["start"] < TELEMETRY_WARMUP:
+                continue
+            cpu = sum([h[2] for h in data["history"]]) / len(data["history"])
+            needs = {"rss": data["peak"], "cpu": cpu}
+            for k in needs:
+                reclaimed = max(0, job[k] - int(needs[k] * TELEMETRY_MARGIN))
+                available[k] += reclaimed - data["reclaimed"][k]
+                data["reclaimed"][k] = reclaimed
+        pause = (used >= TELEMETRY_PAUSE * self.resources["total"]["rss"]) or (
+            nodeMemoryUsed() >= TELEMETRY_PAUSE
+        )
+        if pause != self.pause:
+            print("Telemetry:", "pausing" if pause else "resuming", "new jobs, jobs rss:", used)
+        self.pause = pause
+
+
+class EventScheduler(object):
+    """
+    Starts the jobs as soon as a job is done: the jobs are run with Popen and reaped with
+    os.waitpid(-1) (which returns when any of them exits), and the next job is picked
+    from the ReadyJobs heaps instead of scanning all the groups. In simulation, the jobs
+    are done in the order of their simulated end time.
+    """
+
+    def __init__(self, jobs, resources, order, maxJobs, telemetry=None):
+        self.jobs = jobs
+        self.telemetry = telemetry
+        self.resources = resources
+        self.order = order
+        self.maxJobs = maxJobs
+        self.groups = jobs["jobs"]
+        self.nextCommand = [0] * len(self.groups)
+        self.pendingGroups = len(self.groups)
+        self.ready = ReadyJobs()
+        self.finals = []
+        self.running = {}
+        self.endTimes = []
+        self.count = 0
+        for gidx in range(len(self.groups)):
+            self.advance(gidx)
+
+    def advance(self, gidx):
+        """Queues the next command (or the final command) of a group with no running job"""
+        commands = self.groups[gidx]["commands"]
+        idx = self.nextCommand[gidx]
+        if (idx == len(commands)) or (idx > 0 and commands[idx - 1]["exit_code"] != 0):
+            heappush(self.finals, gidx)
+            return
+        self.nextCommand[gidx] = idx + 1
+        self.ready.push(commands[idx], gidx)
+
+    def getJob(self):
+        """
+        Returns (group index, job) of the job to start: no group index for the final command
+        of a group, no job if none can run now.
+        """
+        self.resources["decisions"] += 1
+        if self.finals:
+            gidx = heappop(self.finals)
+            self.pendingGroups -= 1
+            return None, getFinalCommand(self.groups[gidx], self.jobs, self.resources)
+        if self.telemetry and self.telemetry.pause and self.running:
+            return None, None
+        if self.order in PLACEMENT_POLICIES:
+            return PLACEMENT_POLICIES[self.order](self)
+        return self.ready.pop(getSortKey(self.resources, self.order), self.resources)
+
+    def reservation(self, job):
+        """
+        Returns (time, spare resources) at which job could start, based on the expected end
+        (start time + estimated time) of the running jobs.
+        """
+        now = gettime()
+        free = freeResources(self.resources)
+        start = now
+        running = [r[0] for r in self.running.values()]
+        ends = sorted(
+            [(max(now, r["start_time"] + r["origtime"]), r) for r in running], key=itemgetter(0)
+        )
+        for end, rjob in ends:
+            if fitsIn(job, free):
+                break
+            start = end
+            for k, v in jobNeeds(rjob).items():
+                free[k] = free[k] + v
+        needs = jobNeeds(job)
+        return start, dict([(k, free[k] - needs[k]) for k in free])
+
+    def startJob(self, gidx, job):
+        self.count += 1
+        reserveJob(job, self.resources, len(self.running) + 1)
+        if simulation:
+            self.running[self.count] = (job, gidx)
+            heappush(self.endTimes, (job["start_time"] + job["time2finish"], self.count))
+            return
+        env = None
+        if self.telemetry:
+            self.telemetry.start(job)
+            env = self.telemetry.jobEnv(job)
+        p = Popen(jobCommand(job), shell=True, env=env)
+        self.running[p.pid] = (job, gidx, p)
+
+    def waitJobs(self):
+        """
+        Blocks until at least one job is done (with telemetry, until samples are read too),
+        returns the (job, group index) done
+        """
+        global simulation_time
+        if simulation:
+            done = []
+            simulation_time = self.endTimes[0][0]
+            while self.endTimes and self.endTimes[0][0] == simulation_time:
+                job, gidx = self.running.pop(heappop(self.endTimes)[1])
+                job["exit_code"] = 0
+                done.append((job, gidx))
+            return done
+        if not self.telemetry:
+            return self.reapJobs(0)
+        # wake up on SIGCHLD or samples, and in any case every few secs
+        done = self.reapJobs(os.WNOHANG)
+        if not done:
+            self.telemetry.wait(5)
+            if self.telemetry.read():
+                self.telemetry.adjust([r[0] for r in self.running.values()])
+            done = self.reapJobs(os.WNOHANG)
+        return done
+
+    def reapJobs(self, flags):
+        """Reaps the jobs which are done, the first waitpid with flags"""
+        done = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, flags)
+            except OSError:
+                break
+            if pid == 0:
+                break
+            flags = os.WNOHANG
+            if pid not in self.running:
+                continue
+            job, gidx, p = self.running.pop(pid)
+            p.returncode = status
+            job["exit_code"] = status
+            done.append((job, gidx))
+        return done
+
+    def run(self):
+        while self.pendingGroups or self.running:
+            while (self.maxJobs <= 0) or (len(self.running) < self.maxJobs):
+                gidx, job = self.getJob()
+                if not job:
+                    break
+                self.startJob(gidx, job)
+            if not self.running:
+                if self.pendingGroups:
+                    print("ERROR: Unable to run the pending jobs with", self.resources)
+                break
+            for job, gidx in self.waitJobs():
+                job["end_time"] = gettime()
+                if self.telemetry:
+                    self.telemetry.release(job)
+                releaseJob(job, self.resources, len(self.running))
+                if gidx is not None:
+                    self.advance(gidx)
+
+
+def makespanReport(jobs, resources):
+    """
+    Prints the makespan of the (non final) jobs, its lower bounds (longest group and
+    reserved cpu/rss time over the total cpu/rss) and the average cpu/rss reserved. With
+    --telemetry, the jobs can run beyond the cpu/rss bounds, as they do not account for
+    the reservations given back.
+    """
+    times = []
+    longest = 0
+    usage = {"cpu": 0, "rss": 0}
+    for group in jobs["jobs"]:
+        gtime = 0
+        for job in group["commands"]:
+            if job["state"] != "Done":
+                continue
+            times += [job["start_time"], job["end_time"]]
+            gtime += job["exec_time"]
+            for k in usage:
+                usage[k] += 1.0 * job[k] * job["exec_time"]
+        longest = max(longest, gtime)
+    if not times:
+        return
+    makespan = max(times) - min(times)
+    bounds = dict([(k, int(usage[k] / resources["total"][k])) for k in usage])
+    print(
+        "Makespan: %s secs, lower bound: %s secs (longest group: %s, cpu: %s, rss: %s)"
+        % (makespan, max([longest] + list(bounds.values())), longest, bounds["cpu"], bounds["rss"])
+    )
+    if makespan > 0:
+        print(
+            "Reserved: cpu %.1f%%, rss %.1f%%"
+            % tuple([100.0 * bounds[k] / makespan for k in ["cpu", "rss"]])
+        )
+
+
+def setSimulatedTimes(jobs, statsFile):
+    """
+    Simulates the jobs with the times of the es_workflow_stats of the ES hits in statsFile
+    (e.g. the all.json of another create-relval-jobs.py run) instead of their estimates.
+    The N-th command of a workflow is its stepN.
+    """
+    from es_utils import es_workflow_stats
+
+    wf_stats = es_workflow_stats(json.load(open(statsFile)))
+    found = 0
+    for group in jobs["jobs"]:
+        for i, job in enumerate(group["commands"]):
+            step = "step%s" % (i + 1)
+            if (group["name"] in wf_stats) and (step in wf_stats[group["name"]]):
+                job["time2finish"] = wf_stats[group["name"]][step]["time"]
+                found += 1
+    print("Simulated times from %s: %s jobs" % (statsFile, found))
 
 
 def initJobs(jobs, resources, otype):
@@ -320,7 +847,7 @@ if __name__ == "__main__":
         "--order",
         dest="order",
         default="dynamic",
-        help="Order the jobs based on selected criteria. Valid values are time|rss|cpu|dynamic. Default value dynamic",
+        help="Order the jobs based on selected criteria. Valid values are time|rss|cpu|dynamic|critical|pack (critical: longest remaining group time first, backfilling the free resources, pack: critical with bin-packing of the backfilled jobs, needs the event scheduler). Default value dynamic",
     )
     parser.add_option(
         "-t",
@@ -345,6 +872,37 @@ if __name__ == "__main__":
         help="Do not run the jobs but simulate the timings.",
         default=False,
     )
+    parser.add_option(
+        "-S",
+        "--scheduler",
+        dest="scheduler",
+        default="event",
+        help="Scheduler to use. Valid values are event|polling (the old thread per job one, e.g. to compare both with --simulate). Default value event",
+    )
+    parser.add_option(
+        "-l",
+        "--lookahead",
+        dest="lookahead",
+        default=LOOKAHEAD,
+        type="int",
+        help="Number of jobs compared to fill the free resources with -o pack. Default is %s"
+        % LOOKAHEAD,
+    )
+    parser.add_option(
+        "-T",
+        "--telemetry",
+        dest="telemetry",
+        action="store_true",
+        default=False,
+        help="Adjust the reserved rss/cpu of the running jobs to their usage published by monitor_workflow.py, and pause new jobs when the memory is nearly used. Needs the event scheduler.",
+    )
+    parser.add_option(
+        "-H",
+        "--history",
+        dest="history",
+        default="",
+        help="With --simulate, ES relvals stats json file (e.g. all.json of create-relval-jobs.py) to take the simulated times of the jobs from.",
+    )
     opts, args = parser.parse_args()
     simulation_time = 0
     simulation = opts.simulate
@@ -354,8 +912,15 @@ if __name__ == "__main__":
         opts.cpu = 300
     if not opts.type in ["", "avg", "max"]:
         parser.error("Invalid -t|--type value '%s' provided." % opts.type)
-    if not opts.order in ["dynamic", "time", "rss", "cpu"]:
+    if not opts.order in ["dynamic", "time", "rss", "cpu"] + list(PLACEMENT_POLICIES):
         parser.error("Invalid -o|--order value '%s' provided." % opts.order)
+    if not opts.scheduler in ["event", "polling"]:
+        parser.error("Invalid -S|--scheduler value '%s' provided." % opts.scheduler)
+    if (opts.scheduler == "polling") and (opts.order in PLACEMENT_POLICIES):
+        parser.error("-o|--order '%s' needs the event scheduler." % opts.order)
+    if (opts.scheduler == "polling") and opts.telemetry:
+        parser.error("-T|--telemetry needs the event scheduler.")
+    LOOKAHEAD = max(1, opts.lookahead)
     if opts.maxJobs <= 0:
         opts.maxJobs = MachineCPUCount
 
@@ -373,26 +938,43 @@ if __name__ == "__main__":
         "total_jobs": 0,
         "done_groups": 0,
         "done_jobs": 0,
+        "decisions": 0,
     }
     print(MachineCPUCount, MachineMemoryGB, resources)
     jobs = initJobs(json.load(open(opts.jobs)), resources, opts.type)
+    if simulation and opts.history:
+        setSimulatedTimes(jobs, opts.history)
 
     needGPU = any(c.get("gpu") for j in jobs["jobs"] for c in j["commands"])
 
     if needGPU and not resources["total"]["gpu"]:
         raise RuntimeError("One or more jobs require GPU, but no usable GPUs found")
-    thrds = {}
-    wait_for_jobs = False
-    has_jobs = True
-    while has_jobs:
-        while wait_for_jobs or ((opts.maxJobs > 0) and (len(thrds) >= opts.maxJobs)):
-            wait_for_jobs = False
-            checkJobs(thrds, resources)
-        has_jobs, job = getJob(jobs, resources, opts.order)
-        if job:
-            startJob(job, resources, thrds)
-        else:
-            wait_for_jobs = True
-    while len(thrds):
-        checkJobs(thrds, resources)
+    stime = time()
+    if opts.scheduler == "polling":
+        runPolling(jobs, resources, opts.order, opts.maxJobs)
+    else:
+        telemetry = None
+        if opts.telemetry and not simulation:
+            telemetry = JobTelemetry(
+                os.path.join(gettempdir(), "jobscheduler-%s.sock" % os.getpid()),
+                resources,
+                jobs["env"],
+            )
+        try:
+            EventScheduler(jobs, resources, opts.order, opts.maxJobs, telemetry).run()
+        finally:
+            if telemetry:
+                telemetry.close()
+    if simulation:
+        print(
+            "Simulated %s scheduler: makespan %s secs, %s jobs, %s scheduling decisions in %.3f secs"
+            % (
+                opts.scheduler,
+                gettime(),
+                resources["done_jobs"],
+                resources["decisions"],
+                time() - stime,
+            )
+        )
+    makespanReport(jobs, resources)
     os.system(jobs["final"])
@@ -6,23 +6,9 @@ import os
 import re
 import sys
 import json
-import subprocess as sub
 
-Log_Lines_Filter = [
-    ("Memory Report: "),
-    ("This TensorFlow binary is optimized with"),
-    ("[PostMaster", "[Error"),
-    ("from active sources because its quality"),
-    ("Initiating request to open file", "root://"),
-    ("Successfully opened file", "root://"),
-    ("Closed file", "root://"),
-]
-
-
-def openfile(filename):
-    if sys.version_info[0] == 2:
-        return open(filename)
-    return open(filename, encoding="utf8", errors="ignore")
+from logRootQAUtils import compareCommonLogs, checkLines, getRelevantDiff, runCommand
+from logRootQAUtils import getEventContents, getDQMMemoryStats
 
 
 def getFiles(d, pattern):
@@ -57,128 +43,23 @@ def getWorkflow(f):
     return m.group().replace("/", "").replace("_", "")
 
 
-def checkLines(l1, l2):
-    filt1 = filteredLines(l1)
-    filt2 = filteredLines(l2)
-    lines = len(filt2) - len(filt1)
-    if lines > 0:
-        print("You added " + str(lines) + " to " + l2)
-    if lines < 0:
-        print("You removed " + str(-1 * lines) + " from " + l2)
-
-    return (lines, filt1, filt2)
-
-
-def filteredLines(f):
-    retval = {}
-    for l in openfile(f):
-        # look for and remove timestamps
-        l = re.sub("20\\d\\d-\\d\\d-\\d\\d \\d\\d:\\d\\d:\\d\\d(\\.\\d+|)", "DATETIME", l)
-        l = re.sub(
-            "\\d\\d-(\\d\\d|[A-ZA-z]{3})-20\\d\\d \\d\\d:\\d\\d:\\d\\d(\\.\\d+|)", "DATETIME", l
-        )
-        if "Begin processing the" in l:
-            l = re.sub(" on stream \\d", " on stream N", l)
-        sl = l.strip()
-        skip = False
-        for data in Log_Lines_Filter:
-            skip = True
-            for s in data:
-                if not s in sl:
-                    skip = False
-                    break
-            if not skip:
-                continue
-            break
-        if skip:
-            continue
-        if "P       Y      T    H   H  III  A   A" in l:
-            continue
-        retval[sl] = 1
-    return retval
-
-
-def getRelevantDiff(filt1, filt2, l1, l2, maxInFile=20):
-    nPrintTot = 0
-
-    keys1 = filt1.keys()
-    keys2 = filt2.keys()
-    newIn1 = []
-    newIn2 = []
-    for k in keys1:
-        if k not in filt2:
-            newIn1.append(k)
-    for k in keys2:
-        if k not in filt1:
-            newIn2.append(k)
-
-    if len(newIn1) > 0 or len(newIn2) > 0:
-        print("")
-        print(len(newIn1), "Lines only in", l1)
-        nPrint = 0
-        for l in newIn1:
-            nPrint = nPrint + 1
-            if nPrint > maxInFile:
-                break
-            print("  ", l)
-        nPrintTot = nPrint
-        print(len(newIn2), "Lines only in", l2)
-        nPrint = 0
-        for l in newIn2:
-            nPrint = nPrint + 1
-            if nPrint > maxInFile:
-                break
-            print("  ", l)
-        nPrintTot = nPrintTot + nPrint
-    return nPrintTot
-
-
-def runCommand(c):
-    p = sub.Popen(c, stdout=sub.PIPE, stderr=sub.PIPE, universal_newlines=True)
-    output = p.communicate()
-    return output
-
-
-def checkEventContent(r1, r2):
+def checkEventContent(r1, r2, s1, s2, content1, content2):
     retVal = True
 
-    output1 = runCommand(["ls", "-l", r1])
-    output2 = runCommand(["ls", "-l", r2])
-    s1 = output1[0].split()[4]
-    s2 = output2[0].split()[4]
     if abs(float(s2) - float(s1)) > 0.1 * float(s1):
         print("Big output file size change? in ", r1, s1, s2)
         retVal = False
 
-    cmd1 = ["edmEventSize", "-v", r1]
-    cmd2 = ["edmEventSize", "-v", r2]
-    if os.path.exists(r1 + ".edmEventSize"):
-        cmd1 = ["cat", r1 + ".edmEventSize"]
-    if os.path.exists(r2 + ".edmEventSize"):
-        cmd2 = ["cat", r2 + ".edmEventSize"]
-    output1 = runCommand(cmd1)
-    output2 = runCommand(cmd2)
-
-    if "contains no" in output1[1] and "contains no" in output2[1]:
+    if content1["no_events"] and content2["no_events"]:
         w = 1
     else:
-        sp = output1[0].split("\n")
-        p1 = []
-        for p in sp:
-            if len(p.split()) > 0:
-                p1.append(p.split()[0])
-        sp = output2[0].split("\n")
-        p2 = []
-        for p in sp:
-            if len(p.split()) > 0:
-                p2.append(p.split()[0])
-
-        common = []
-        for p in p1:
-            if p in p2:
-                common.append(p)
+        p1 = content1["products"]
+        p2 = content2["products"]
+        products2 = set(p2)
+        common = [p for p in p1 if p in products2]
         if len(common) != len(p1) or len(common) != len(p2):
             print("Change in products found in", r1)
+            common = set(common)
             for p in p1:
                 if p not in common:
                     print("    Product missing " + p)
@@ -189,35 +70,11 @@ def checkEventContent(r1, r2):
     return retVal
 
 
-def checkDQMSize(r1, r2, diff, wfs):
-    haveDQMChecker = False
-    for path in os.environ["PATH"].split(os.pathsep):
-        path = path.strip('"')
-        #        print(path)
-        exe_file = os.path.join(path, "dqmMemoryStats.py")
-        if os.path.isfile(exe_file) and os.access(exe_file, os.X_OK):
-            haveDQMChecker = True
-            break
-    if not haveDQMChecker:
+def checkDQMSize(r1, output, diff, wfs):
+    if output is None:
         print("Missing dqmMemoryStats in this release")
         return -1
 
-    output, error = runCommand(
-        [
-            "dqmMemoryStats.py",
-            "-x",
-            "-u",
-            "KiB",
-            "-p3",
-            "-c0",
-            "-d2",
-            "--summary",
-            "-r",
-            r1,
-            "-i",
-            r2,
-        ]
-    )
     lines = output.splitlines()
     total = re.search("-?\\d+\\.\\d+", lines[-1])
     if not total:
@@ -360,11 +217,12 @@ nDQM = 0
 diff, wfs = [], []
 if run in ["all", "events"]:
     if not os.path.exists("comparison-events.json"):
-        for l in getCommonFiles(baseDir, testDir, "step*.log"):
-            lCount, filt1, filt2 = checkLines(baseDir + l, testDir + l)
+        commonLogs = getCommonFiles(baseDir, testDir, "step*.log")
+        for l, result in zip(commonLogs, compareCommonLogs(baseDir, testDir, commonLogs)):
+            lCount = checkLines(result, testDir + l)
             lines = lines + lCount
             if nPrintTot < 1000:
-                nprint = getRelevantDiff(filt1, filt2, baseDir + l, testDir + l)
+                nprint = getRelevantDiff(result, baseDir + l, testDir + l)
                 nPrintTot = nPrintTot + nprint
             else:
                 if stopPrint == 0:
@@ -374,13 +232,16 @@ if run in ["all", "events"]:
         if lines > 0:
             lChanges = True
         #### compare edmEventSize on each to look for new missing candidates
-        for r in getCommonFiles(baseDir, testDir, "step*.root"):
-            if "inDQM.root" not in r:
-                checkResult = checkEventContent(baseDir + r, testDir + r)
-                sameEvts = sameEvts and checkResult
-                nRoot = nRoot + 1
-        for r in getCommonFiles(baseDir, testDir, "DQM*.root"):
-            t = checkDQMSize(baseDir + r, testDir + r, diff, wfs)
+        rootFiles = [
+            r for r in getCommonFiles(baseDir, testDir, "step*.root") if "inDQM.root" not in r
+        ]
+        for r, result in zip(rootFiles, getEventContents(baseDir, testDir, rootFiles)):
+            checkResult = checkEventContent(baseDir + r, testDir + r, *result)
+            sameEvts = sameEvts and checkResult
+            nRoot = nRoot + 1
+        dqmFiles = getCommonFiles(baseDir, testDir, "DQM*.root")
+        for r, output in zip(dqmFiles, getDQMMemoryStats(baseDir, testDir, dqmFiles)):
+            t = checkDQMSize(baseDir + r, output, diff, wfs)
             print(r, t)
             newDQM = newDQM + t
             nDQM = nDQM + 1
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+"""
+Comparison of the step logs and output files of the baseline and PR relvals for logRootQA.py.
+
+The logs are streamed: each filtered line is only kept as its (64 bits) hash, and the
+text of the lines only in one of the logs is read back in a second pass, just for the
+few lines which are reported. The pairs of logs are compared by a pool of processes.
+
+The edmEventSize/dqmMemoryStats.py commands of the pairs of root files are run by a pool
+of threads. The parsed edmEventSize output of the baseline files can be cached in
+CMS_EDM_EVENT_SIZE_CACHE_DIR (keyed by real file path, mtime and size, as the baseline
+files are symlinks from the workspace of each PR test), so that it is only computed once
+per IB and not for every PR test.
+"""
+
+from __future__ import print_function
+from hashlib import sha1
+import json
+import os
+import re
+import subprocess as sub
+import sys
+
+Log_Lines_Filter = [
+    ("Memory Report: "),
+    ("This TensorFlow binary is optimized with"),
+    ("[PostMaster", "[Error"),
+    ("from active sources because its quality"),
+    ("Initiating request to open file", "root://"),
+    ("Successfully opened file", "root://"),
+    ("Closed file", "root://"),
+]
+LOGROOTQA_JOBS = int(os.environ.get("CMS_LOGROOTQA_JOBS", "4"))
+DATETIME_RE = re.compile(
+    "20\\d\\d-\\d\\d-\\d\\d \\d\\d:\\d\\d:\\d\\d(\\.\\d+|)"
+    + "|\\d\\d-(\\d\\d|[A-ZA-z]{3})-20\\d\\d \\d\\d:\\d\\d:\\d\\d(\\.\\d+|)"
+)
+STREAM_RE = re.compile(" on stream \\d")
+PYTHIA_BANNER = "P       Y      T    H   H  III  A   A"
+EDM_EVENT_SIZE_CACHE_DIR = os.environ.get("CMS_EDM_EVENT_SIZE_CACHE_DIR", "")
+DQM_MEMORY_STATS = {}
+
+
+def openfile(filename):
+    if sys.version_info[0] == 2:
+        return open(filename)
+    return open(filename, encoding="utf8", errors="ignore")
+
+
+def runCommand(c):
+    p = sub.Popen(c, stdout=sub.PIPE, stderr=sub.PIPE, universal_newlines=True)
+    output = p.communicate()
+    return output
+
+
+def compileLinesFilter(linesFilter):
+    """
+    Returns the filters as tuples of strings which must all be in a line to skip it. As for
+    the original loop, a filter which is a plain string (and not a tuple) is iterated over,
+    i.e. all its characters must be in the line.
+    """
+    # upper case characters first, as they are less likely to be in a line
+    return [
+        (
+            tuple(sorted(set(data), key=lambda c: (not c.isupper(), c)))
+            if isinstance(data, str)
+            else data
+        )
+        for data in linesFilter
+    ]
+
+
+LINES_FILTER = compileLinesFilter(Log_Lines_Filter)
+
+
+def filterLine(l):
+    """Returns the stripped line without its timestamps or None if it is to be ignored"""
+    # look for and remove timestamps
+    if ":" in l and "20" in l:
+        l = DATETIME_RE.sub("DATETIME", l)
+    if "Begin processing the" in l:
+        l = STREAM_RE.sub(" on stream N", l)
+    sl = l.strip()
+    for data in LINES_FILTER:
+        for s in data:
+            if s not in sl:
+                break
+        else:
+            return None
+    if PYTHIA_BANNER in l:
+        return None
+    return sl
+
+
+def filteredLineHashes(logFile):
+    """Returns the set of the hashes of the filtered lines of a log"""
+    hashes = set()
+    with openfile(logFile) as ref:
+        for l in ref:
+            sl = filterLine(l)
+            if sl is not None:
+                hashes.add(hash(sl))
+    return hashes
+
+
+def filteredLinesSample(logFile, hashes, maxLines):
+    """Returns (in order) the first maxLines distinct filtered lines with a hash in hashes"""
+    sample = []
+    seen = set()
+    if not hashes:
+        return sample
+    with openfile(logFile) as ref:
+        for l in ref:
+            sl = filterLine(l)
+            if sl is None:
+                continue
+            h = hash(sl)
+            if (h in hashes) and (h not in seen):
+                seen.add(h)
+                sample.append(sl)
+                if len(sample) >= maxLines:
+                    break
+    return sample
+
+
+def compareLogs(log1, log2, maxInFile=20):
+    """
+    Returns (lines1, lines2, onlyIn1, onlyIn2, sample1, sample2): the number of distinct
+    filtered lines of each log, the number of them which are only in one log and the
+    first maxInFile of those.
+    """
+    hashes1 = filteredLineHashes(log1)
+    hashes2 = filteredLineHashes(log2)
+    newIn1 = hashes1 - hashes2
+    newIn2 = hashes2 - hashes1
+    return (
+        len(hashes1),
+        len(hashes2),
+        len(newIn1),
+        len(newIn2),
+        filteredLinesSample(log1, newIn1, maxInFile),
+        filteredLinesSample(log2, newIn2, maxInFile),
+    )
+
+
+def compareLogsJob(args):
+    return compareLogs(*args)
+
+
+def getPool(jobs):
+    from multiprocessing import get_context
+
+    return get_context("fork").Pool(jobs)
+
+
+def compareCommonLogs(baseDir, testDir, logs, jobs=None, maxInFile=20):
+    """Yields, in order, the compareLogs results of the baseDir/testDir pairs of logs"""
+    if jobs is None:
+        jobs = LOGROOTQA_JOBS
+    args = [(baseDir + l, testDir + l, maxInFile) for l in logs]
+    if jobs <= 1 or len(args) <= 1:
+        for arg in args:
+            yield compareLogsJob(arg)
+        return
+    pool = getPool(min(jobs, len(args)))
+    try:
+        for result in pool.imap(compareLogsJob, args, chunksize=4):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def checkLines(result, l2):
+    lines = result[1] - result[0]
+    if lines > 0:
+        print("You added " + str(lines) + " to " + l2)
+    if lines < 0:
+        print("You removed " + str(-1 * lines) + " from " + l2)
+    return lines
+
+
+def getRelevantDiff(result, l1, l2, maxInFile=20):
+    nPrintTot = 0
+    lines1, lines2, newIn1, newIn2, sample1, sample2 = result
+    if newIn1 > 0 or newIn2 > 0:
+        print("")
+        print(newIn1, "Lines only in", l1)
+        for l in sample1[:maxInFile]:
+            print("  ", l)
+        nPrintTot = min(newIn1, maxInFile + 1)
+        print(newIn2, "Lines only in", l2)
+        for l in sample2[:maxInFile]:
+            print("  ", l)
+        nPrintTot = nPrintTot + min(newIn2, maxInFile + 1)
+    return nPrintTot
+
+
+def parseEdmEventSize(output):
+    """Returns the event content of an edmEventSize -v (stdout, stderr) output"""
+    products = []
+    for p in output[0].split("\n"):
+        items = p.split()
+        if len(items) > 0:
+            products.append(items[0])
+    return {"no_events": "contains no" in output[1], "products": products}
+
+
+def edmEventSizeCacheFile(rootFile):
+    st = os.stat(rootFile)
+    key = "%s:%s:%s" % (os.path.realpath(rootFile), st.st_mtime, st.st_size)
+    key = sha1(key.encode()).hexdigest()
+    return os.path.join(EDM_EVENT_SIZE_CACHE_DIR, key[0:2], key + ".json")
+
+
+def getEventContent(rootFile, useCache=False):
+    """
+    Returns the (parsed) edmEventSize -v output of a root file, from its .edmEventSize
+    sidecar if there is one. With useCache, it is read from/written to the cache.
+    """
+    cache_file = None
+    if useCache and EDM_EVENT_SIZE_CACHE_DIR:
+        cache_file = edmEventSizeCacheFile(rootFile)
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file) as ref:
+                    return json.load(ref)
+            except Exception as e:
+                print("Unable to read", cache_file, e)
+    if os.path.exists(rootFile + ".edmEventSize"):
+        with openfile(rootFile + ".edmEventSize") as ref:
+            content = parseEdmEventSize((ref.read(), ""))
+    else:
+        content = parseEdmEventSize(runCommand(["edmEventSize", "-v", rootFile]))
+    if cache_file:
+        try:
+            if not os.path.exists(os.path.dirname(cache_file)):
+                os.makedirs(os.path.dirname(cache_file))
+            with open(cache_file + ".%s" % os.getpid(), "w") as ref:
+                json.dump(content, ref)
+            os.rename(cache_file + ".%s" % os.getpid(), cache_file)
+        except Exception as e:
+            print("Unable to write", cache_file, e)
+    return content
+
+
+def getEventContentJob(args):
+    """(r1, r2) -> sizes and event contents of the baseline (cached) and PR root files"""
+    r1, r2 = args
+    return (
+        os.stat(r1).st_size,
+        os.stat(r2).st_size,
+        getEventContent(r1, True),
+        getEventContent(r2),
+    )
+
+
+def haveDQMMemoryStats():
+    if "found" not in DQM_MEMORY_STATS:
+        DQM_MEMORY_STATS["found"] = False
+        for path in os.environ["PATH"].split(os.pathsep):
+            path = path.strip('"')
+            exe_file = os.path.join(path, "dqmMemoryStats.py")
+            if os.path.isfile(exe_file) and os.access(exe_file, os.X_OK):
+                DQM_MEMORY_STATS["found"] = True
+                break
+    return DQM_MEMORY_STATS["found"]
+
+
+def getDQMMemoryStatsJob(args):
+    """(r1, r2) -> dqmMemoryStats.py output or None if it is not available"""
+    r1, r2 = args
+    if not haveDQMMemoryStats():
+        return None
+    output, error = runCommand(
+        [
+            "dqmMemoryStats.py",
+            "-x",
+            "-u",
+            "KiB",
+            "-p3",
+            "-c0",
+            "-d2",
+            "--summary",
+            "-r",
+            r1,
+            "-i",
+            r2,
+        ]
+    )
+    return output
+
+
+def imapThreads(func, args, jobs=None):
+    """Yields, in order, func(arg) for all args, run by (at most) jobs threads"""
+    if jobs is None:
+        jobs = LOGROOTQA_JOBS
+    if jobs <= 1 or len(args) <= 1:
+        for arg in args:
+            yield func(arg)
+        return
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(min(jobs, len(args)))
+    try:
+        for result in pool.imap(func, args):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def getEventContents(baseDir, testDir, rootFiles, jobs=None):
+    """Yields, in order, the getEventContentJob results of the baseDir/testDir root files"""
+    args = [(baseDir + r, testDir + r) for r in rootFiles]
+    return imapThreads(getEventContentJob, args, jobs)
+
+
+def getDQMMemoryStats(baseDir, testDir, dqmFiles, jobs=None):
+    """Yields, in order, the dqmMemoryStats.py outputs of the baseDir/testDir DQM files"""
+    haveDQMMemoryStats()
+    args = [(baseDir + r, testDir + r) for r in dqmFiles]
+    return imapThreads(getDQMMemoryStatsJob, args, jobs)
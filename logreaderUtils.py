@@ -14,64 +14,138 @@ class ResultTypeEnum(object):
 all_controls = [ResultTypeEnum.ISSUE, ResultTypeEnum.TEST]
 
 
-def add_exception_to_config(line, index, config_list, custom_rule_list=None):
-    if custom_rule_list is None:
-        custom_rule_list = []
-    default_rules_list = [
-        {
-            # will ignore " IgnoreCompletely" messages
-            "str_to_match": "Begin(?! IgnoreCompletely)(.*Exception)",
-            "name": "{0}",
-            "control_type": ResultTypeEnum.ISSUE,
-        },
-        {
-            "str_to_match": "edm::service::InitRootHandlers",
-            "name": "Segmentation fault",
-            "control_type": ResultTypeEnum.ISSUE,
-        },
-        {
-            "str_to_match": "sig_dostack_then_abort",
-            "name": "sig_dostack_then_abort",
-            "control_type": ResultTypeEnum.ISSUE,
-        },
-        {
-            "str_to_match": ": runtime error:",
-            "name": "Runtime error",
-            "control_type": ResultTypeEnum.ISSUE,
-        },
-        {
-            "str_to_match": ": Assertion .* failed",
-            "name": "Assertion failure",
-            "control_type": ResultTypeEnum.ISSUE,
-        },
-        {
-            "str_to_match": "==ERROR: AddressSanitizer:",
-            "name": "Address Sanitizer error",
-            "control_type": ResultTypeEnum.ISSUE,
-        },
-        {
-            "str_to_match": "mount hook function failure",
-            "name": "Mount failure",
-            "control_type": ResultTypeEnum.ISSUE,
-        },
-    ]
-    line_nr = index + 1
+# "literal" is optional: a (case insensitive) string which must be in every line matched by
+# the rule. Lines without it are not searched with the rule regexp.
+DEFAULT_RULES_LIST = [
+    {
+        # will ignore " IgnoreCompletely" messages
+        "str_to_match": "Begin(?! IgnoreCompletely)(.*Exception)",
+        "name": "{0}",
+        "control_type": ResultTypeEnum.ISSUE,
+        "literal": "begin",
+    },
+    {
+        "str_to_match": "edm::service::InitRootHandlers",
+        "name": "Segmentation fault",
+        "control_type": ResultTypeEnum.ISSUE,
+        "literal": "edm::service::initroothandlers",
+    },
+    {
+        "str_to_match": "sig_dostack_then_abort",
+        "name": "sig_dostack_then_abort",
+        "control_type": ResultTypeEnum.ISSUE,
+        "literal": "sig_dostack_then_abort",
+    },
+    {
+        "str_to_match": ": runtime error:",
+        "name": "Runtime error",
+        "control_type": ResultTypeEnum.ISSUE,
+        "literal": ": runtime error:",
+    },
+    {
+        "str_to_match": ": Assertion .* failed",
+        "name": "Assertion failure",
+        "control_type": ResultTypeEnum.ISSUE,
+        "literal": ": assertion ",
+    },
+    {
+        "str_to_match": "==ERROR: AddressSanitizer:",
+        "name": "Address Sanitizer error",
+        "control_type": ResultTypeEnum.ISSUE,
+        "literal": "==error: addresssanitizer:",
+    },
+    {
+        "str_to_match": "mount hook function failure",
+        "name": "Mount failure",
+        "control_type": ResultTypeEnum.ISSUE,
+        "literal": "mount hook function failure",
+    },
+]
+EXCEPTION_RULE_SETS = {}
 
-    for rule in default_rules_list + custom_rule_list:
-        match = re.search(rule["str_to_match"], line, re.IGNORECASE)
-        if match:
-            try:
-                name = rule["name"].format(*match.groups())
-            except:
-                name = rule["name"]
-            new_exception_config = {
-                "lineStart": line_nr,
-                "lineEnd": line_nr,
-                "name": name + " at line #" + str(line_nr),
-                "control_type": rule["control_type"],
-            }
-            config_list.append(new_exception_config)
-            return config_list
+
+class ExceptionRuleSet(object):
+    """
+    The default rules (plus custom ones) compiled once. Rules are tried in order and the
+    first one matching a line wins. A line is only searched with the regexps of the rules
+    whose literal it contains (and of the rules without literal).
+    """
+
+    def __init__(self, custom_rule_list=None):
+        self.rules = []
+        always = False
+        for rule in DEFAULT_RULES_LIST + list(custom_rule_list or []):
+            literal = rule.get("literal")
+            if literal is None:
+                always = True
+            else:
+                literal = literal.lower()
+            self.rules.append(
+                (
+                    re.compile(rule["str_to_match"], re.IGNORECASE),
+                    literal,
+                    rule["name"],
+                    rule["control_type"],
+                )
+            )
+        self.prefilter = None
+        if not always:
+            literals = sorted(set(r[1] for r in self.rules))
+            self.prefilter = re.compile("|".join(re.escape(l) for l in literals), re.IGNORECASE)
+
+    def match(self, line, index):
+        """Returns the config of the first rule matching the line (index is 0-based) or None"""
+        if self.prefilter is not None and not self.prefilter.search(line):
+            return None
+        lower_line = line.lower()
+        for regexp, literal, name, control_type in self.rules:
+            if literal is not None and literal not in lower_line:
+                continue
+            match = regexp.search(line)
+            if match:
+                try:
+                    name = name.format(*match.groups())
+                except:
+                    pass
+                line_nr = index + 1
+                return {
+                    "lineStart": line_nr,
+                    "lineEnd": line_nr,
+                    "name": name + " at line #" + str(line_nr),
+                    "control_type": control_type,
+                }
+        return None
+
+    def scan(self, lines, config_list=None, start=0):
+        """Returns the configs of all the lines (e.g. an open file), numbered from start"""
+        if config_list is None:
+            config_list = []
+        for index, line in enumerate(lines, start):
+            config = self.match(line, index)
+            if config:
+                config_list.append(config)
+        return config_list
+
+    def scan_file(self, log_file, config_list=None):
+        with open(log_file, errors="ignore") as ref:
+            return self.scan(ref, config_list)
+
+
+def get_exception_rule_set(custom_rule_list=None):
+    """Returns the (cached) compiled rule set for these custom rules"""
+    key = tuple(
+        (r["str_to_match"], r["name"], r["control_type"], r.get("literal"))
+        for r in (custom_rule_list or [])
+    )
+    if key not in EXCEPTION_RULE_SETS:
+        EXCEPTION_RULE_SETS[key] = ExceptionRuleSet(custom_rule_list)
+    return EXCEPTION_RULE_SETS[key]
+
+
+def add_exception_to_config(line, index, config_list, custom_rule_list=None):
+    config = get_exception_rule_set(custom_rule_list).match(line, index)
+    if config:
+        config_list.append(config)
     return config_list
 
 
@@ -103,3 +177,85 @@ def transform_and_write_config_file(log_reader_config_path, config_list):
         log_reader_config_f.close()
     except:
         print("Error writing exception file.")
+
+
+def add_exception_to_config_regexp(line, index, config_list, custom_rule_list=None):
+    """Reference implementation: search every rule regexp in every line"""
+    line_nr = index + 1
+    for rule in DEFAULT_RULES_LIST + (custom_rule_list or []):
+        match = re.search(rule["str_to_match"], line, re.IGNORECASE)
+        if match:
+            try:
+                name = rule["name"].format(*match.groups())
+            except:
+                name = rule["name"]
+            config_list.append(
+                {
+                    "lineStart": line_nr,
+                    "lineEnd": line_nr,
+                    "name": name + " at line #" + str(line_nr),
+                    "control_type": rule["control_type"],
+                }
+            )
+            return config_list
+    return config_list
+
+
+def make_step_log(events=2000):
+    """A synthetic cmsRun step log, with a few exceptions"""
+    lines = []
+    for n in range(1, events + 1):
+        lines.append(
+            "Begin processing the %sth record. Run 1, Event %s, LumiSection 1 on stream 0 at "
+            "18-Oct-2026 10:00:00.000 CEST\n" % (n, n)
+        )
+        lines.append("%MSG-w TrackProducer:  TrackProducer:generalTracks  18-Oct-2026 10:00:00\n")
+        lines.append("Track extrapolation failed for candidate %s, skipping it\n" % n)
+        lines.append("%MSG\n")
+        if n % 500 == 0:
+            lines.append(
+                "----- Begin Fatal Exception 18-Oct-2026 10:00:00 CEST-----------------\n"
+            )
+            lines.append("An exception of category 'ProductNotFound' occurred while\n")
+            lines.append(": runtime error: signed integer overflow\n")
+    return lines
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+    from time import time
+
+    parser = OptionParser(usage="%prog [-n events] [-r repeat] [step.log ...]")
+    parser.add_option("-n", "--events", dest="events", type="int", default=20000)
+    parser.add_option("-r", "--repeat", dest="repeat", type="int", default=1)
+    opts, args = parser.parse_args()
+    logs = []
+    for log_file in args:
+        with open(log_file, errors="ignore") as ref:
+            logs.append(ref.readlines())
+    if not logs:
+        logs.append(make_step_log(opts.events))
+    print("Logs: %s, lines: %s" % (len(logs), sum(len(l) for l in logs)))
+
+    stime = time()
+    for _ in range(opts.repeat):
+        ref_configs = []
+        for lines in logs:
+            config_list = []
+            for index, line in enumerate(lines):
+                add_exception_to_config_regexp(line, index, config_list)
+            ref_configs.append(config_list)
+    ref_time = (time() - stime) / opts.repeat
+
+    stime = time()
+    for _ in range(opts.repeat):
+        configs = [get_exception_rule_set().scan(lines) for lines in logs]
+    rules_time = (time() - stime) / opts.repeat
+
+    print("Regexp per rule : %.3f sec, %s matches" % (ref_time, sum(len(c) for c in ref_configs)))
+    print("Rule set        : %.3f sec, %s matches" % (rules_time, sum(len(c) for c in configs)))
+    if configs != ref_configs:
+        print("ERROR: results differ")
+        exit(1)
+    if rules_time > 0:
+        print("Speedup: %.1fx" % (ref_time / rules_time))
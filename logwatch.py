@@ -1,5 +1,7 @@
 from __future__ import print_function
-from os.path import exists, join, basename, getmtime
+from os import getpid, makedirs, rename, stat
+from os.path import exists, join, getmtime
+from shutil import rmtree
 from sys import exit
 from _py2with3compatibility import getstatusoutput
 from hashlib import sha256
@@ -23,68 +25,180 @@ def run_cmd(cmd, exit_on_error=True):
 
 
 class logwatch(object):
+    """
+    Reads the new lines of a service's (rotated) logs. The position in the logs is kept in
+    <log_dir>/logwatch_<service>/info as "<first line hash> <line> <inode> <offset>": the
+    log it refers to is found by inode (or by the sha256 of its first line, if it was copied
+    while rotated) and read from the byte offset, without copying the log. Only complete
+    lines are read; the position is committed (atomically) every CHECKPOINT_LINES lines.
+    """
+
+    CHECKPOINT_LINES = 1000
+
     def __init__(self, service, log_dir="/var/log"):
         self.log_dir = join(log_dir, "logwatch_" + service)
+        self.info_file = join(self.log_dir, "info")
+        self.checkpoint = None
 
-    def process(self, logs, callback, **kwrds):
-        if not logs:
-            return True, 0
-        info_file = join(self.log_dir, "info")
-        if not exists("%s/logs" % self.log_dir):
-            run_cmd("mkdir -p %s/logs" % self.log_dir)
-        prev_lnum, prev_hash, count, data = 1, "", 0, []
-        if exists(info_file):
-            prev_hash, ln = run_cmd("head -1 %s" % info_file).strip().split(" ", 1)
-            prev_lnum = int(ln)
-            if prev_lnum < 1:
-                prev_lnum = 1
-        found = False
+    def read_checkpoint(self):
+        """Returns [hash, line, inode, offset] (inode/offset None for old info files) or None"""
+        if not exists(self.info_file):
+            return None
+        with open(self.info_file) as ref:
+            items = ref.readline().strip().split(" ")
+        if len(items) < 2:
+            return None
+        checkpoint = [items[0], max(int(items[1]), 1), None, None]
+        if len(items) >= 4:
+            checkpoint[2] = int(items[2])
+            checkpoint[3] = int(items[3])
+        return checkpoint
+
+    def write_checkpoint(self, item):
+        checkpoint = [item[1], item[4], item[2], item[3]]
+        if checkpoint == self.checkpoint:
+            return
+        if not exists(self.log_dir):
+            makedirs(self.log_dir)
+        tmp_file = "%s.%s" % (self.info_file, getpid())
+        with open(tmp_file, "w") as ref:
+            ref.write("%s %s %s %s\n" % tuple(checkpoint))
+        rename(tmp_file, self.info_file)
+        self.checkpoint = checkpoint
+
+    def logs_to_process(self, logs):
+        """
+        Returns the [log, hash, inode, offset, line] of the logs (oldest first) to read: the
+        one of the checkpoint from its offset and all newer ones from start. Returns None
+        if an older log was modified in the last 10 minutes (i.e. it is being rotated).
+        """
+        self.checkpoint = self.read_checkpoint()
+        prev = self.checkpoint
+        found = None
+        data = []
         for log in reversed(logs):
-            service_log = join(self.log_dir, "logs", basename(log))
             if (len(data) > 0) and ((time() - getmtime(log)) < 600):
-                return True, 0
-            if found:
-                if exists(service_log):
-                    run_cmd("rm -f %s" % service_log)
-                    continue
-                else:
+                return None
+            item = [log, first_line_hash(log), stat(log).st_ino, 0, 1]
+            data.insert(0, item)
+            if prev and (item[1] == prev[0]):
+                if prev[2] == item[2]:
+                    found = item
                     break
-            run_cmd("rsync -a %s %s" % (log, service_log))
-            cur_hash = sha256(run_cmd("head -1 %s" % service_log).encode()).hexdigest()
-            data.insert(0, [log, service_log, 1, cur_hash, False])
-            if cur_hash == prev_hash:
-                found = True
-                data[0][2] = prev_lnum
-        data[-1][4] = True
+                if not found:
+                    found = item
+        if found:
+            data = data[data.index(found) :]
+            if prev[3] is None:
+                # old info file: resume at its line number
+                found[3], found[4] = line_offset(found[0], prev[1]), prev[1]
+            elif prev[3] <= stat(found[0]).st_size:
+                found[3], found[4] = prev[3], prev[1]
+        return data
+
+    def process(self, logs, callback, **kwrds):
+        if not logs:
+            return True, 0
+        data = self.logs_to_process(logs)
+        if data is None:
+            return True, 0
+        legacy_copies = join(self.log_dir, "logs")
+        if exists(legacy_copies):
+            rmtree(legacy_copies, ignore_errors=True)
+        count = 0
         for item in data:
-            lnum, service_log = item[2], item[1]
-            get_lines_cmd = "tail -n +%s %s" % (str(lnum), service_log)
-            if lnum <= 1:
-                get_lines_cmd = "cat %s" % service_log
-            print("Processing %s:%s" % (item[0], str(lnum)))
-            lnum -= 1
+            print("Processing %s:%s" % (item[0], str(item[4])))
             xlines = 0
-            for line in run_cmd(get_lines_cmd).split("\n"):
+            for line, offset in read_lines(item[0], item[3]):
                 count += 1
-                lnum += 1
                 xlines += 1
                 try:
                     ok = callback(line, count, **kwrds)
                 except:
                     ok = False
                 if not ok:
-                    if (prev_lnum != lnum) or (prev_hash != item[3]):
-                        run_cmd("echo '%s %s' >  %s" % (item[3], str(lnum), info_file))
+                    self.write_checkpoint(item)
                     return ok, count
-                if (xlines % 1000) == 0:
-                    prev_lnum = lnum
-                    prev_hash = item[3]
-                    run_cmd("echo '%s %s' >  %s" % (item[3], str(lnum), info_file))
-            if (prev_lnum != lnum) or (prev_hash != item[3]):
-                prev_lnum = lnum
-                prev_hash = item[3]
-                cmd = "echo '%s %s' >  %s" % (item[3], str(lnum), info_file)
-                if not item[4]:
-                    cmd = cmd + " && rm -f %s" % service_log
-                run_cmd(cmd)
+                item[3] = offset
+                item[4] += 1
+                if (xlines % self.CHECKPOINT_LINES) == 0:
+                    self.write_checkpoint(item)
+            self.write_checkpoint(item)
         return True, count
+
+    def process_batches(self, logs, callback, batch_size=1000, **kwrds):
+        """
+        Like process but callback(lines, count) gets the new lines in batches (of at most
+        batch_size lines of one log). The checkpoint is committed after each successful
+        batch, so a failed batch is read again by the next run.
+        """
+        if not logs:
+            return True, 0
+        data = self.logs_to_process(logs)
+        if data is None:
+            return True, 0
+        legacy_copies = join(self.log_dir, "logs")
+        if exists(legacy_copies):
+            rmtree(legacy_copies, ignore_errors=True)
+        count = 0
+        for item in data:
+            print("Processing %s:%s" % (item[0], str(item[4])))
+            lines, offset = [], item[3]
+            for line, offset in read_lines(item[0], item[3]):
+                lines.append(line)
+                if len(lines) < batch_size:
+                    continue
+                if not self.commit_batch(item, lines, offset, callback, count, **kwrds):
+                    return False, count
+                count += len(lines)
+                lines = []
+            if lines:
+                if not self.commit_batch(item, lines, offset, callback, count, **kwrds):
+                    return False, count
+                count += len(lines)
+            self.write_checkpoint(item)
+        return True, count
+
+    def commit_batch(self, item, lines, offset, callback, count, **kwrds):
+        try:
+            ok = callback(lines, count + len(lines), **kwrds)
+        except Exception as e:
+            print("ERROR: %s" % e)
+            ok = False
+        if ok:
+            item[3] = offset
+            item[4] += len(lines)
+        self.write_checkpoint(item)
+        return ok
+
+
+def first_line_hash(log):
+    """sha256 of the first line (without newline) of a log"""
+    with open(log, "rb") as ref:
+        line = ref.readline()
+    if line.endswith(b"\n"):
+        line = line[:-1]
+    return sha256(line).hexdigest()
+
+
+def line_offset(log, lnum):
+    """Byte offset of the line number lnum (1 based) of a log"""
+    offset = 0
+    with open(log, "rb") as ref:
+        for n in range(1, lnum):
+            line = ref.readline()
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+    return offset
+
+
+def read_lines(log, offset=0):
+    """Yields (line, offset after it) of the complete lines of a log from offset"""
+    with open(log, "rb") as ref:
+        ref.seek(offset)
+        for line in ref:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            yield line[:-1].decode("utf-8", "replace"), offset
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""
+Low overhead sampling of the resources used by a process tree, for monitor_workflow.py.
+
+ProcSampler reads /proc/<pid>/stat, statm and smaps_rollup of the processes directly
+(instead of psutil's memory_full_info(), which parses the whole smaps). The process tree
+is cached between samples: it is followed through the children of the known processes
+and only rebuilt from all /proc/<pid>/stat every scan_interval secs.
+
+The samples are streamed to disk by ColumnWriter as blocks of columns, so that the memory
+used by the monitor does not depend on the length of the job, and AdaptiveInterval makes
+the sampling interval longer while the usage is stable.
+"""
+
+import json
+import os
+from time import time
+
+COLUMNS = [
+    "time",
+    "interval",
+    "rss",
+    "vms",
+    "shared",
+    "data",
+    "uss",
+    "pss",
+    "num_fds",
+    "num_threads",
+    "processes",
+    "cpu",
+]
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def read_file(path):
+    with open(path) as ref:
+        return ref.read()
+
+
+def boot_time():
+    for line in read_file("/proc/stat").split("\n"):
+        if line.startswith("btime "):
+            return int(line.split()[1])
+    return 0
+
+
+def parse_stat(data):
+    """(ppid, cpu ticks, threads, start ticks) of the content of /proc/<pid>/stat"""
+    items = data[data.rindex(")") + 2 :].split()
+    return int(items[1]), int(items[11]) + int(items[12]), int(items[17]), int(items[19])
+
+
+def parse_smaps_rollup(data):
+    """(pss, uss) in bytes of the content of /proc/<pid>/smaps_rollup"""
+    pss = 0
+    uss = 0
+    for line in data.split("\n"):
+        if line.startswith("Pss:"):
+            pss = int(line.split()[1]) * 1024
+        elif line.startswith("Private_Clean:") or line.startswith("Private_Dirty:"):
+            uss += int(line.split()[1]) * 1024
+    return pss, uss
+
+
+class ProcSampler(object):
+    """Resources used by the process pid and its descendants"""
+
+    def __init__(self, pid, scan_interval=30, max_tasks=16):
+        self.root = pid
+        self.scan_interval = scan_interval
+        self.max_tasks = max_tasks
+        self.last_scan = 0
+        self.pids = set([pid])
+        self.cpu = {}
+        self.boot_time = boot_time()
+        self.children_files = os.path.exists("/proc/%s/task/%s/children" % (pid, pid))
+        self.smaps_rollup = os.path.exists("/proc/%s/smaps_rollup" % pid)
+
+    def scan(self):
+        """Rebuilds the process tree from the parent pids of all the processes"""
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                ppid = parse_stat(read_file("/proc/%s/stat" % entry))[0]
+            except Exception:
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+        pids = set()
+        todo = [self.root]
+        while todo:
+            pid = todo.pop()
+            pids.add(pid)
+            todo += children.get(pid, [])
+        return pids
+
+    def children(self, pid):
+        """Children of the threads of a process (of its main thread only if it has many)"""
+        tasks = os.listdir("/proc/%s/task" % pid)
+        if len(tasks) > self.max_tasks:
+            tasks = [str(pid)]
+        children = []
+        for task in tasks:
+            try:
+                children += [
+                    int(c) for c in read_file("/proc/%s/task/%s/children" % (pid, task)).split()
+                ]
+            except Exception:
+                continue
+        return children
+
+    def tree(self, now):
+        """Returns the pids of the root process and of its descendants"""
+        if (not self.children_files) or (now - self.last_scan >= self.scan_interval):
+            self.last_scan = now
+            self.pids = self.scan()
+            return self.pids
+        pids = set()
+        todo = [self.root]
+        while todo:
+            pid = todo.pop()
+            pids.add(pid)
+            try:
+                todo += self.children(pid)
+            except Exception:
+                continue
+        # processes forked by the other threads of a process with many threads are only
+        # seen by scan(), keep the known ones
+        for pid in self.pids - pids:
+            if os.path.exists("/proc/%s" % pid):
+                pids.add(pid)
+        self.pids = pids
+        return pids
+
+    def sample(self):
+        """Returns the resources used by the tree, as monitor_workflow.update_stats"""
+        now = time()
+        stats = dict([(c, 0) for c in COLUMNS if c not in ["time", "interval"]])
+        cpu = {}
+        pids = self.tree(now)
+        for pid in pids:
+            try:
+                ppid, ticks, threads, start = parse_stat(read_file("/proc/%s/stat" % pid))
+                statm = [int(x) * PAGE_SIZE for x in read_file("/proc/%s/statm" % pid).split()]
+            except Exception:
+                continue
+            old_ticks, last_time = self.cpu.get(
+                pid, (0, self.boot_time + 1.0 * start / CLOCK_TICKS)
+            )
+            elapsed = now - last_time
+            if elapsed >= 0.1:
+                stats["cpu"] += int(100.0 * (ticks - old_ticks) / CLOCK_TICKS / elapsed)
+            cpu[pid] = (ticks, now)
+            stats["processes"] += 1
+            stats["num_threads"] += threads
+            stats["vms"] += statm[0]
+            stats["rss"] += statm[1]
+            stats["shared"] += statm[2]
+            stats["data"] += statm[5]
+            try:
+                stats["num_fds"] += len(os.listdir("/proc/%s/fd" % pid))
+                if self.smaps_rollup:
+                    pss, uss = parse_smaps_rollup(read_file("/proc/%s/smaps_rollup" % pid))
+                    stats["pss"] += pss
+                    stats["uss"] += uss
+            except Exception:
+                pass
+        self.cpu = cpu
+        # as for psutil's children(), the root process is not counted
+        stats["processes"] = max(0, stats["processes"] - 1)
+        return stats
+
+
+class AdaptiveInterval(object):
+    """
+    Sampling interval which grows (by factor, up to max_interval) while the rss and cpu of
+    the samples change by less than change (relative), and goes back to min_interval as
+    soon as they change more or the number of processes changes.
+    """
+
+    def __init__(self, min_interval=1.0, max_interval=10.0, factor=1.5, change=0.05):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.change = change
+        self.value = min_interval
+        self.last = None
+
+    def update(self, stats):
+        last = self.last
+        self.last = stats
+        stable = last is not None and last["processes"] == stats["processes"]
+        for k in ["rss", "cpu"]:
+            if stable and abs(stats[k] - last[k]) > self.change * max(last[k], 1):
+                stable = False
+        if stable:
+            self.value = min(self.max_interval, self.value * self.factor)
+        else:
+            self.value = self.min_interval
+        return self.value
+
+
+class ColumnWriter(object):
+    """Streams samples to a file, as one json object of COLUMNS lists per block of samples"""
+
+    def __init__(self, path, block_size=60):
+        self.path = path
+        self.block_size = block_size
+        self.block = []
+        self.ref = open(path, "w")
+
+    def add(self, stats):
+        self.block.append(stats)
+        if len(self.block) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.block:
+            columns = dict([(c, [s.get(c, 0) for s in self.block]) for c in COLUMNS])
+            self.ref.write(json.dumps(columns, separators=(",", ":")) + "\n")
+            self.ref.flush()
+            self.block = []
+
+    def close(self):
+        self.flush()
+        self.ref.close()
+
+
+def read_columns(path):
+    """Yields the samples (dicts) of a ColumnWriter file"""
+    with open(path) as ref:
+        for line in ref:
+            columns = json.loads(line)
+            names = [c for c in COLUMNS if c in columns]
+            for values in zip(*[columns[c] for c in names]):
+                yield dict(zip(names, values))
+
+
+def columns_to_json(path, json_file):
+    """Writes the samples of a ColumnWriter file as a json list, one sample at a time"""
+    with open(json_file, "w") as ref:
+        ref.write("[")
+        sep = ""
+        for stats in read_columns(path):
+            ref.write(sep + json.dumps(stats))
+            sep = ", "
+        ref.write("]")
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
-from os import system, getpid
+from os import system, getpid, getppid, environ, remove
 from sys import argv, exit
-import psutil
-from threading import Thread
+from threading import Thread, Event
 import subprocess
-from json import dump
+import socket
+from json import dump, dumps
 from time import sleep, time
+from monitor_sampler import ProcSampler, AdaptiveInterval, ColumnWriter, columns_to_json
+from stats_utils import WorkflowSummary
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
 try:
     from time import monotonic
@@ -21,6 +28,50 @@ def run_job(job):
 
 # Sampling interval in seconds
 SAMPLE_INTERVAL = 1.0
+# psutil or proc (monitor_sampler.ProcSampler, with an adaptive sampling interval)
+SAMPLER = environ.get("CMS_MONITOR_SAMPLER", "psutil")
+MAX_SAMPLE_INTERVAL = float(environ.get("CMS_MONITOR_MAX_INTERVAL", "10"))
+# Only write the summary sketches (stats_utils.WorkflowSummary) of the samples
+SUMMARY_ONLY = environ.get("CMS_MONITOR_SUMMARY_ONLY", "") == "1"
+# Unix datagram socket of jobs/jobscheduler.py --telemetry and the id of the job
+MONITOR_SOCKET = environ.get("CMS_MONITOR_SOCKET", "")
+MONITOR_JOBID = environ.get("CMS_JOBSCHEDULER_JOBID", "")
+
+
+def open_publisher():
+    if not (MONITOR_SOCKET and MONITOR_JOBID):
+        return None
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        return sock
+    except Exception:
+        return None
+
+
+def publish_stats(sock, stats):
+    """Sends the rss/cpu of a sample to the job scheduler, errors are ignored"""
+    if not sock:
+        return
+    sample = {"jobid": MONITOR_JOBID, "pid": getpid()}
+    for k in ["rss", "cpu", "time"]:
+        sample[k] = stats[k]
+    try:
+        sock.sendto(dumps(sample).encode(), MONITOR_SOCKET)
+    except Exception:
+        pass
+
+
+def publish_done(sock):
+    """Tells the job scheduler that this monitor (i.e. step of the job) is done"""
+    if not sock:
+        return
+    try:
+        sock.sendto(
+            dumps({"jobid": MONITOR_JOBID, "pid": getpid(), "done": True}).encode(), MONITOR_SOCKET
+        )
+    except Exception:
+        pass
 
 
 def update_stats(proc, cpu_times, commands=False):
@@ -99,10 +150,17 @@ def update_stats(proc, cpu_times, commands=False):
     return stats, new_cpu_times
 
 
+def parent_cmdline():
+    if psutil and SAMPLER != "proc":
+        return " ".join(psutil.Process(getpid()).parent().cmdline())
+    with open("/proc/%s/cmdline" % getppid()) as ref:
+        return " ".join(ref.read().split("\0")).strip()
+
+
 def monitor(stop):
+    """Samples the job until stop (an Event) is set or it has no more processes"""
     stime = int(time())
-    p = psutil.Process(getpid())
-    cmdline = " ".join(p.parent().cmdline())
+    cmdline = parent_cmdline()
     if "cmsDriver.py " in cmdline:
         cmdargs = cmdline.split("cmsDriver.py ", 1)[1].strip()
         step = None
@@ -120,34 +178,68 @@ def monitor(stop):
             step = "step1"
     else:
         step = stime
-    data = []
-    cpu_times = {}
-    while not stop():
-        try:
-            stats, cpu_times = update_stats(p, cpu_times)
-            if not stats:
-                sleep(SAMPLE_INTERVAL)
-                continue
-            if stats["processes"] == 0:
-                break
-            stats["time"] = int(time() - stime)
-            data.append(stats)
-        except:
-            pass
-    stat_file = open("wf_stats-%s.json" % step, "w")
-    dump(data, stat_file)
-    stat_file.close()
+    # samples are streamed to disk and only written as json at the end
+    columns_file = "wf_stats-%s.columns" % step
+    if SUMMARY_ONLY:
+        writer = WorkflowSummary()
+    else:
+        writer = ColumnWriter(columns_file)
+    publisher = open_publisher()
+    if SAMPLER == "proc":
+        sampler = ProcSampler(getpid())
+        interval = AdaptiveInterval(SAMPLE_INTERVAL, MAX_SAMPLE_INTERVAL)
+        sampler.sample()
+        while not stop.wait(interval.value):
+            try:
+                stats = sampler.sample()
+                if stats["processes"] == 0:
+                    break
+                stats["time"] = int(time() - stime)
+                stats["interval"] = interval.value
+                writer.add(stats)
+                publish_stats(publisher, stats)
+                interval.update(stats)
+            except:
+                pass
+    else:
+        p = psutil.Process(getpid())
+        cpu_times = {}
+        while not stop.is_set():
+            try:
+                stats, cpu_times = update_stats(p, cpu_times)
+                if not stats:
+                    sleep(SAMPLE_INTERVAL)
+                    continue
+                if stats["processes"] == 0:
+                    break
+                stats["time"] = int(time() - stime)
+                stats["interval"] = SAMPLE_INTERVAL
+                writer.add(stats)
+                publish_stats(publisher, stats)
+            except:
+                pass
+    if publisher:
+        publish_done(publisher)
+        publisher.close()
+    if SUMMARY_ONLY:
+        with open("wf_stats-%s.json" % step, "w") as ref:
+            dump(writer.to_dict(), ref)
+        return
+    writer.close()
+    columns_to_json(columns_file, "wf_stats-%s.json" % step)
+    remove(columns_file)
     return
 
 
-stop_monitoring = False
-job["command"] = argv[1:]
-job_thd = Thread(target=run_job, args=(job,))
-mon_thd = Thread(target=monitor, args=(lambda: stop_monitoring,))
-job_thd.start()
-sleep(1)
-mon_thd.start()
-job_thd.join()
-stop_monitoring = True
-mon_thd.join()
-exit(job["exit_code"])
+if __name__ == "__main__":
+    stop_monitoring = Event()
+    job["command"] = argv[1:]
+    job_thd = Thread(target=run_job, args=(job,))
+    mon_thd = Thread(target=monitor, args=(stop_monitoring,))
+    job_thd.start()
+    sleep(1)
+    mon_thd.start()
+    job_thd.join()
+    stop_monitoring.set()
+    mon_thd.join()
+    exit(job["exit_code"])
@@ -3,15 +3,12 @@ import sys
 from argparse import ArgumentParser
 from collections import defaultdict
 import repo_config
-import datetime
 from categories_map import CMSSW_CATEGORIES
+from categories_index import get_categories_index, get_legacy_categories, load_categories_index
 
 # LEGACY_CATEGORIES is a mapping from name to datetime (when the category becomes legacy)
-# Extract categories that are legacy at the moment of issue creation
-legacy_cats = getattr(repo_config, "LEGACY_CATEGORIES", {})
-now = datetime.datetime.now(tz=datetime.timezone.utc)
-for lc in (cat for cat, ts in legacy_cats.items() if now > ts):
-    del CMSSW_CATEGORIES[lc]
+# Ignore categories that are legacy now
+legacy_cats = get_legacy_categories(getattr(repo_config, "LEGACY_CATEGORIES", {}))
 
 
 def package2category(filename):
@@ -19,8 +16,8 @@ def package2category(filename):
         return
     file_pack = "/".join(filename.split("/")[:2])
     cat = "unknown"
-    if file_pack in pack2cat:
-        cat = "-".join(sorted(pack2cat[file_pack]))
+    if index.has_package(file_pack):
+        cat = "-".join(sorted(index.get_package_categories(file_pack)))
     if cat in ["alca", "db"]:
         cat = "alca-db"
     files[cat].add(filename)
@@ -29,13 +26,18 @@ def package2category(filename):
 
 parser = ArgumentParser()
 parser.add_argument("-i", "--stdin", action="store_true", help="Also read file name(s) from stdin")
+parser.add_argument(
+    "-x",
+    "--index",
+    help="Use package to categories index file generated by generate-categories-json.py",
+)
 parser.add_argument("files", nargs="*", help="File name(s)")
 args = parser.parse_args()
 
-pack2cat = defaultdict(list)
-for cat in CMSSW_CATEGORIES:
-    for pack in CMSSW_CATEGORIES[cat]:
-        pack2cat[pack].append(cat)
+if args.index:
+    index = load_categories_index(args.index).without(legacy_cats)
+else:
+    index = get_categories_index(CMSSW_CATEGORIES, legacy_cats)
 
 cats = defaultdict(set)
 files = defaultdict(set)
@@ -3,8 +3,9 @@ from hashlib import sha1
 import os, re, sys, json, datetime, time, functools
 import xml.etree.ElementTree as ET
 import subprocess
-from es_utils import send_payload, get_payload, resend_payload, get_payload_wscroll
+from es_utils import send_payload, get_payload, resend_payload, get_payload_wscroll, BulkSender
 from cmsutils import epoch2week
+from http_utils import print_http_pool_stats
 import json
 
 JENKINS_PREFIX = "jenkins"
@@ -229,33 +230,34 @@ queue_index = "cmssdt-jenkins-queue-" + epoch2week(current_time / 1000)
 queue_document = "queue-data"
 
 # Update information in elastic search
-new_inqueue = [x for x in jenkins_queue.keys() if x not in es_queue.keys()]
-print("[INFO] Pushing new Jenkins builds in queue ...")
-for build_id in new_inqueue:
-    id, payload = update_payload_timestamp(build_id, jenkins_queue)
-    display_build_info(id, payload)
-    send_payload(queue_index, queue_document, id, json.dumps(payload))
-
-still_inqueue = [x for x in jenkins_queue.keys() if x in es_queue.keys()]
-print("[INFO] Updating waiting time for build that are still in queue ...")
-for build_id in still_inqueue:
-    id, payload = update_payload_timestamp(build_id, jenkins_queue)
-    payload["wait_time"] = current_time - payload["in_queue_since"]
-    display_build_info(id, payload)
-    send_payload(es_indexes[id], queue_document, id, json.dumps(payload))
-
-no_inqueue = [str(y) for y in es_queue.keys() if y not in jenkins_queue.keys()]
-print("[INFO] Updating builds that are no longer in queue ...")
-for build_id in no_inqueue:
-    id, payload = update_payload_timestamp(build_id, es_queue)
-    payload["in_queue"] = 0
-    print(
-        "==> Cleaning up ",
-        es_indexes[id],
-        "/",
-        str(id) + " " + str(payload["job_name"]) + " #" + str(payload["queue_id"]),
-    )
-    send_payload(es_indexes[id], queue_document, id, json.dumps(payload))
+with BulkSender():
+    new_inqueue = [x for x in jenkins_queue.keys() if x not in es_queue.keys()]
+    print("[INFO] Pushing new Jenkins builds in queue ...")
+    for build_id in new_inqueue:
+        id, payload = update_payload_timestamp(build_id, jenkins_queue)
+        display_build_info(id, payload)
+        send_payload(queue_index, queue_document, id, json.dumps(payload))
+
+    still_inqueue = [x for x in jenkins_queue.keys() if x in es_queue.keys()]
+    print("[INFO] Updating waiting time for build that are still in queue ...")
+    for build_id in still_inqueue:
+        id, payload = update_payload_timestamp(build_id, jenkins_queue)
+        payload["wait_time"] = current_time - payload["in_queue_since"]
+        display_build_info(id, payload)
+        send_payload(es_indexes[id], queue_document, id, json.dumps(payload))
+
+    no_inqueue = [str(y) for y in es_queue.keys() if y not in jenkins_queue.keys()]
+    print("[INFO] Updating builds that are no longer in queue ...")
+    for build_id in no_inqueue:
+        id, payload = update_payload_timestamp(build_id, es_queue)
+        payload["in_queue"] = 0
+        print(
+            "==> Cleaning up ",
+            es_indexes[id],
+            "/",
+            str(id) + " " + str(payload["job_name"]) + " #" + str(payload["queue_id"]),
+        )
+        send_payload(es_indexes[id], queue_document, id, json.dumps(payload))
 
 time.sleep(10)
 
@@ -408,3 +410,4 @@ for build in running_builds_elastic:
         hit["_source"]["job_status"] = "Failed"
         resend_payload(hit)
         print("job status marked as Failed")
+print_http_pool_stats()
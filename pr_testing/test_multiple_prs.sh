@@ -169,6 +169,8 @@ CMS_BOT_DIR=$(dirname ${SCRIPTPATH})  # To get CMS_BOT dir path
 echo LD_LIBRARY_PATH=${LD_LIBRARY_PATH} || true
 ls ${LD_LIBRARY_PATH} || true
 export SCRAM_PREFIX_PATH=${CMS_BOT_DIR}/das-utils
+# On-disk cache of the GitHub api GET responses (see github_utils.py), shared by the jobs on this node
+if [ -z "${CMS_GH_API_CACHE_DIR+x}" ] ; then export CMS_GH_API_CACHE_DIR=$HOME/.cache/cms-bot/github-api ; fi
 source ${CMS_BOT_DIR}/ci-cd_config.sh
 CACHED=${WORKSPACE}/CACHED            # Where cached PR metada etc are kept
 PR_TESTING_DIR=${CMS_BOT_DIR}/pr_testing
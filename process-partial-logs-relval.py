@@ -1,9 +1,23 @@
 #!/usr/bin/env python3
 from __future__ import print_function
 import os, sys
-from runPyRelValThread import PyRelValsThread
+from optparse import OptionParser
+from runPyRelValThread import PyRelValsThread, LOG_PARSE_JOBS
 
-path = sys.argv[1]
+parser = OptionParser(usage="%prog [-j jobs] <pyRelValPartialLogs dir>")
+parser.add_option(
+    "-j",
+    "--jobs",
+    dest="jobs",
+    type="int",
+    default=LOG_PARSE_JOBS,
+    help="Number of processes parsing the step logs. Default is %s" % LOG_PARSE_JOBS,
+)
+opts, args = parser.parse_args()
+if len(args) != 1:
+    parser.error("Missing pyRelValPartialLogs directory")
+
+path = args[0]
 newloc = os.path.dirname(path) + "/pyRelValMatrixLogs/run"
 os.system("mkdir -p " + newloc)
 ProcessLogs = PyRelValsThread(1, path, "1of1", newloc)
@@ -12,5 +26,5 @@ ProcessLogs.update_runall()
 print("Generating relval time info")
 ProcessLogs.update_wftime()
 print("Parsing logs for workflows/steps")
-ProcessLogs.parseLog()
+ProcessLogs.parseLog(opts.jobs)
 print("Done")
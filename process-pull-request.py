@@ -12,8 +12,12 @@ from github_utils import (
     get_pr_latest_commit,
     get_gh_token,
     enable_github_loggin,
+    print_github_api_cache_stats,
+    set_default_github_api_cache,
 )
 
+from http_utils import print_http_pool_stats
+
 setdefaulttimeout(120)
 import sys
 
@@ -70,6 +74,7 @@ if __name__ == "__main__":
         default=False,
     )
     opts, args = parser.parse_args()
+    set_default_github_api_cache()
     if opts.debug:
         enable_github_loggin()
 
@@ -101,3 +106,5 @@ if __name__ == "__main__":
 
         process_pr(repo_config, gh, repo, repo.get_issue(prId), opts.dryRun, force=opts.force)
         api_rate_limits(gh)
+        print_github_api_cache_stats()
+        print_http_pool_stats()
@@ -31,7 +31,7 @@ from repo_config import GH_REPO_ORGANIZATION
 import forward_ports_map
 import re, time
 from collections import defaultdict
-import zlib, base64
+import zlib, base64, hashlib
 from datetime import datetime, timezone, timedelta
 from os.path import join, exists, dirname
 from github_utils import (
@@ -41,6 +41,11 @@ from github_utils import (
     get_combined_statuses,
 )
 from github_utils import set_gh_user, get_gh_user
+from github_graphql import load_pr_snapshot
+from watchers_index import WatchersIndex
+from categories_index import CategoriesIndex, get_categories_index, get_legacy_categories
+from bot_cache_codec import decode_bot_cache, encode_bot_cache, is_bot_cache_v2
+from diff_files import fetch_diff_files
 from socket import setdefaulttimeout
 from _py2with3compatibility import run_cmd
 from json import dumps, load, loads
@@ -50,6 +55,7 @@ import sys
 import os
 
 CMSSW_CATEGORIES = {}
+CATEGORIES_INDEX = CategoriesIndex(CMSSW_CATEGORIES)
 import itertools
 from dataclasses import dataclass, field
 from typing import List, Optional, Union
@@ -217,6 +223,8 @@ MULTILINE_COMMENTS_MAP = {
 }
 
 BOT_CACHE_CHUNK_SIZE = 55000
+# Set to "v2" to write the bot cache in the compact, delta updated format of bot_cache_codec
+BOT_CACHE_ENCODING = os.getenv("CMS_BOT_CACHE_ENCODING", "json")
 TOO_MANY_COMMITS_WARN_THRESHOLD = 150
 TOO_MANY_COMMITS_FAIL_THRESHOLD = 240
 TOO_MANY_FILES_WARN_THRESHOLD = 1500
@@ -388,9 +396,13 @@ def extract_bot_cache(comment_msgs):
     return {}
 
 
-def prepare_bot_cache(bot_cache):
+def prepare_bot_cache(bot_cache, old_data=""):
     res = []
-    data = dumps_maybe_compress(bot_cache)
+    if BOT_CACHE_ENCODING == "v2":
+        # Changes are appended to the old data, so only the last chunk(s) are updated
+        data = encode_bot_cache(bot_cache, old_data)
+    else:
+        data = dumps_maybe_compress(bot_cache)
     while data:
         # The limit is 65535 chars, and minimal bot cache comment is
         # `cms-bot internal usage<!-- bot cache:  -->`, 42 characters.
@@ -405,7 +417,12 @@ def prepare_bot_cache(bot_cache):
 
 def write_bot_cache(bot_cache, cache_comments, issue, dryRun):
     logger.trace("Save bot cache: %s", dumps(bot_cache))
-    data = prepare_bot_cache(bot_cache)
+    old_data = ""
+    for cache_comment in cache_comments or []:
+        m = REGEX_COMMITS_CACHE.search(cache_comment.body or "")
+        if m:
+            old_data += m[1]
+    data = prepare_bot_cache(bot_cache, old_data)
     for i, part in enumerate(data):
         try:
             cache_comment = cache_comments[i]
@@ -454,11 +471,7 @@ def get_commenter_categories(commenter, comment_date):
 
 
 def get_package_categories(package):
-    cats = []
-    for cat, packages in list(CMSSW_CATEGORIES.items()):
-        if package in packages:
-            cats.append(cat)
-    return cats
+    return CATEGORIES_INDEX.get_package_categories(package)
 
 
 # Read a yaml file
@@ -477,6 +490,21 @@ def read_repo_file(repo_config, repo_file, default=None, is_yaml=True):
     return contents
 
 
+# Compiled watchers.yaml index, cached per file and re-created only if the file changes
+WATCHERS_INDEX = {}
+
+
+def get_watchers_index(repo_config, repo_file="watchers.yaml"):
+    file_path = join(repo_config.CONFIG_DIR, repo_file)
+    mtime = os.path.getmtime(file_path) if exists(file_path) else 0
+    if (file_path not in WATCHERS_INDEX) or (WATCHERS_INDEX[file_path][0] != mtime):
+        WATCHERS_INDEX[file_path] = (
+            mtime,
+            WatchersIndex(read_repo_file(repo_config, repo_file, {})),
+        )
+    return WATCHERS_INDEX[file_path][1]
+
+
 #
 # creates a properties file to trigger the test of the pull request
 #
@@ -578,6 +606,11 @@ def has_user_emoji(bot_cache, comment, repository, emoji, user):
     comment_id = str(comment.id)
     if (comment_id in bot_cache["emoji"]) and (comment.reactions[emoji] > 0):
         e = bot_cache["emoji"][comment_id]
+    elif getattr(comment, "viewer", None) == user:
+        # Reactions of the bot user were already loaded along with the comment (GraphQL)
+        if comment.viewer_reactions:
+            e = emoji if emoji in comment.viewer_reactions else comment.viewer_reactions[0]
+            bot_cache["emoji"][comment_id] = e
     else:
         # github_utils.get_issue_emojis -> https://github.com/PyGithub/PyGithub/blob/v1.56/github/Issue.py#L556
         # github_utils.get_comment_emojis -> https://github.com/PyGithub/PyGithub/blob/v1.56/github/IssueComment.py#L135
@@ -998,21 +1031,8 @@ def multiline_check_function(first_line, comment_lines, repository):
 
 
 # Hooked by test code
-def fetch_diff(diff_url):
-    cmd = (
-        "curl -s -L %s | grep '^diff --git ' | sed 's|.* a/||;s|  *b/| |' | tr ' ' '\n' | sort | uniq"
-        % diff_url
-    )
-    e, o = run_cmd(cmd)
-    if e:
-        logger.error("Request to %s failed", diff_url)
-        logger.error(e)
-        exit(1)
-    if o:
-        return o.split("\n")
-    else:
-        logger.error("Request to %s did not return any changes, is the PR too big?", diff_url)
-        exit(1)
+def fetch_diff(diff_url, head_sha=None):
+    return fetch_diff_files(diff_url, head_sha=head_sha)
 
 
 def get_changed_files(repo, pr, use_gh_patch=False):
@@ -1031,8 +1051,7 @@ def get_changed_files(repo, pr, use_gh_patch=False):
         repo.full_name, pr.number
     )
 
-    o = fetch_diff(diff_url)
-    return o
+    return fetch_diff(diff_url, head_sha=pr.head.sha)
 
 
 def get_backported_pr(msg):
@@ -1085,6 +1104,8 @@ def dumps_maybe_compress(value):
 
 
 def loads_maybe_decompress(data):
+    if is_bot_cache_v2(data):
+        return decode_bot_cache(data)
     if data.startswith("b64:"):
         data = zlib.decompress(base64.decodebytes(data[4:].encode())).decode()
 
@@ -1146,6 +1167,156 @@ def currenttz():
     return timezone(timedelta(seconds=tm.tm_gmtoff), tm.tm_zone)
 
 
+def use_graphql_loader(repo_config):
+    return getattr(repo_config, "USE_GRAPHQL", False) or (
+        os.getenv("CMS_BOT_USE_GRAPHQL", "false").lower() == "true"
+    )
+
+
+def use_comments_checkpoint(repo_config):
+    return getattr(repo_config, "USE_COMMENTS_CHECKPOINT", False) or (
+        os.getenv("CMS_BOT_COMMENTS_CHECKPOINT", "false").lower() == "true"
+    )
+
+
+# Version of the comments checkpoint, saved in bot cache so that next time only the newer
+# comments need to be processed (see comments_state() in process_pr)
+COMMENTS_CHECKPOINT_VERSION = 2
+BOT_CODE_VERSION = None
+
+
+def get_bot_code_version():
+    # Any change in the bot code or configuration invalidates the checkpoints
+    global BOT_CODE_VERSION
+    if BOT_CODE_VERSION is None:
+        h = hashlib.sha1()
+        for mod in ["process_pr", "categories", "categories_map", "releases", "repo_config"]:
+            mod_file = getattr(sys.modules.get(mod), "__file__", None)
+            if mod_file and exists(mod_file):
+                with open(mod_file, "rb") as ref:
+                    h.update(ref.read())
+        BOT_CODE_VERSION = h.hexdigest()
+    return BOT_CODE_VERSION
+
+
+def dump_checkpoint_value(value):
+    if (value is None) or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, set):
+        return {"set": sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [dump_checkpoint_value(v) for v in value]
+    if isinstance(value, dict):
+        # e.g. events, which are indexed by comment creation time
+        return {
+            "items": [
+                [dump_checkpoint_value(k), dump_checkpoint_value(v)] for k, v in value.items()
+            ]
+        }
+    # IssueComment (or the Issue itself)
+    return {"comment": value.id}
+
+
+def load_checkpoint_value(value, comments):
+    if isinstance(value, list):
+        return [load_checkpoint_value(v, comments) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "datetime" in value:
+        return datetime.fromisoformat(value["datetime"])
+    if "set" in value:
+        return set(value["set"])
+    if "comment" in value:
+        return comments[value["comment"]]
+    return dict(
+        (load_checkpoint_value(k, comments), load_checkpoint_value(v, comments))
+        for k, v in value["items"]
+    )
+
+
+def get_comments_checkpoint_key(state, inputs):
+    data = [COMMENTS_CHECKPOINT_VERSION, get_bot_code_version(), state, inputs]
+    return hashlib.sha1(dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def has_bot_emoji(bot_cache, comment, repository, user, emoji_deps):
+    # Comments processing depends on the bot reactions, remember them to validate the checkpoint
+    res = has_user_emoji(bot_cache, comment, repository, "+1", user)
+    emoji_deps[str(comment.id)] = bool(res)
+    return res
+
+
+def get_processed_comments(all_comments, technical_comments):
+    # The bot cache (technical) comments are edited, added and deleted by the bot on every run,
+    # they are not part of the state of the comments checkpoint
+    technical_ids = set(c.id for c in technical_comments)
+    return [c for c in all_comments[1:] if c.id not in technical_ids]
+
+
+def get_comments_checkpoint(bot_cache, key, all_comments, technical_comments, repository, user):
+    """
+    Returns (new comments, checkpoint) if the comments checkpoint in bot cache can be used i.e.
+    none of the inputs changed and no processed comment was edited or deleted since then.
+    Otherwise returns (all comments, None) for a full replay.
+    """
+    checkpoint = bot_cache.get("checkpoint")
+    if not checkpoint:
+        return all_comments, None
+    if checkpoint["key"] != key:
+        logger.info("Comments checkpoint: inputs changed, processing all comments")
+        return all_comments, None
+    old_comments = [
+        c
+        for c in get_processed_comments(all_comments, technical_comments)
+        if c.id <= checkpoint["last_id"]
+    ]
+    if len(old_comments) != checkpoint["count"]:
+        logger.info("Comments checkpoint: comment(s) deleted, processing all comments")
+        return all_comments, None
+    updated = datetime.fromisoformat(checkpoint["updated"]) if checkpoint["updated"] else None
+    if updated and any(c.updated_at > updated for c in old_comments):
+        logger.info("Comments checkpoint: comment(s) edited, processing all comments")
+        return all_comments, None
+    comments = dict((c.id, c) for c in all_comments)
+    for comment_id, emoji in checkpoint["emoji"].items():
+        comment = comments.get(int(comment_id))
+        if (not comment) or (
+            bool(has_user_emoji(bot_cache, comment, repository, "+1", user)) != emoji
+        ):
+            logger.info("Comments checkpoint: bot reactions changed, processing all comments")
+            return all_comments, None
+    try:
+        state = dict(
+            (k, load_checkpoint_value(v, comments)) for k, v in checkpoint["state"].items()
+        )
+    except Exception as e:
+        logger.warning("Comments checkpoint: unable to load state, processing all comments: %s", e)
+        return all_comments, None
+    new_comments = [c for c in all_comments[1:] if c.id > checkpoint["last_id"]]
+    logger.info(
+        "Comments checkpoint: %s comments already processed, %s new comments",
+        len(old_comments),
+        len(new_comments),
+    )
+    checkpoint["state"] = state
+    return new_comments, checkpoint
+
+
+def set_comments_checkpoint(bot_cache, key, all_comments, technical_comments, state, emoji_deps):
+    processed = get_processed_comments(all_comments, technical_comments)
+    updated = max([c.updated_at for c in processed]) if processed else None
+    bot_cache["checkpoint"] = {
+        "key": key,
+        "last_id": processed[-1].id if processed else 0,
+        "count": len(processed),
+        "updated": updated.isoformat() if updated else "",
+        "emoji": emoji_deps,
+        "state": dict((k, dump_checkpoint_value(v)) for k, v in state.items()),
+    }
+
+
 # Will be replaced with PyGithub version during tests
 def get_combined_status_list(gh, last_commit, repository):
     return [
@@ -1176,8 +1347,8 @@ def process_pr(
     repo_org, repo_name = repository.split("/", 1)
     auto_test_repo = AUTO_TEST_REPOS
 
-    global CMSSW_CATEGORIES
-    CMSSW_CATEGORIES = copy.deepcopy(default_CMSSW_CATEGORIES)
+    global CMSSW_CATEGORIES, CATEGORIES_INDEX, BOT_CACHE_ENCODING
+    BOT_CACHE_ENCODING = getattr(repo_config, "BOT_CACHE_ENCODING", BOT_CACHE_ENCODING)
 
     # LEGACY_CATEGORIES is a mapping from name to datetime (when the category becomes legacy)
     # Extract categories that are legacy at the moment of issue creation
@@ -1186,9 +1357,11 @@ def process_pr(
     if issue_created_at.tzinfo is None:
         issue_created_at = issue_created_at.replace(tzinfo=timezone.utc)
 
-    for lc in (cat for cat, ts in legacy_cats.items() if issue_created_at > ts):
+    legacy_cats = get_legacy_categories(legacy_cats, issue_created_at)
+    for lc in legacy_cats:
         logger.info("Removing legacy category %s from CMSSW_CATEGORIES", lc)
-        del CMSSW_CATEGORIES[lc]
+    CATEGORIES_INDEX = get_categories_index(default_CMSSW_CATEGORIES, legacy_cats)
+    CMSSW_CATEGORIES = CATEGORIES_INDEX.categories
 
     try:
         if repo_config.AUTO_TEST_REPOS:
@@ -1267,6 +1440,7 @@ def process_pr(
     warned_too_many_files = False
     is_draft_pr = False
     build_comment = None
+    pr_snapshot = None
 
     # Retrigger the job if PR is for cms-bot repo and author is heterogeneous, core or externals l2
     if (
@@ -1384,35 +1558,18 @@ def process_pr(
 
         if cmssw_repo:
             # If there is a new package, add also a dummy "new" category.
-            all_packages = [
-                package
-                for category_packages in list(CMSSW_CATEGORIES.values())
-                for package in category_packages
-            ]
-            has_category = all([package in all_packages for package in packages])
-            if not has_category:
+            new_packages = [p for p in packages if not CATEGORIES_INDEX.has_package(p)]
+            if new_packages:
                 new_package_message = "\nThe following packages do not have a category, yet:\n\n"
-                new_package_message += (
-                    "\n".join([package for package in packages if not package in all_packages])
-                    + "\n"
-                )
+                new_package_message += "\n".join(new_packages) + "\n"
                 new_package_message += "Please create a PR for https://github.com/cms-sw/cms-bot/blob/master/categories_map.py to assign category\n"
                 logger.debug(new_package_message)
                 signing_categories.add("new-package")
 
-        # Add watchers.yaml information to the WATCHERS dict.
-        WATCHERS = read_repo_file(repo_config, "watchers.yaml", {})
         # Given the files modified by the PR, check if there are additional developers watching one or more.
         author = pr.user.login
-        watchers = set(
-            [
-                user
-                for chg_file in chg_files
-                for user, watched_regexp in list(WATCHERS.items())
-                for regexp in watched_regexp
-                if re.match("^" + regexp + ".*", chg_file) and user != author
-            ]
-        )
+        watchers = get_watchers_index(repo_config).get_watchers(chg_files)
+        watchers.discard(author)
         # Handle category watchers
 
         catWatchers = read_repo_file(repo_config, "category-watchers.yaml", {})
@@ -1433,7 +1590,22 @@ def process_pr(
         watchers = set([gh_user_char + u for u in watchers])
         logger.info("Watchers: %s", ", ".join(watchers))
 
-        all_commits = get_pr_commits_reversed(pr)
+        if use_graphql_loader(repo_config):
+            try:
+                pr_snapshot = load_pr_snapshot(gh, repository, prId)
+                logger.info(
+                    "Loaded PR state via GraphQL: %s comments, %s statuses",
+                    len(pr_snapshot.comments),
+                    len(pr_snapshot.statuses),
+                )
+            except Exception as e:
+                logger.warning("Unable to load PR state via GraphQL, using REST api: %s", e)
+                pr_snapshot = None
+
+        if pr_snapshot and (pr_snapshot.commits is not None):
+            all_commits = pr_snapshot.commits
+        else:
+            all_commits = get_pr_commits_reversed(pr)
         all_commit_shas = {commit.sha for commit in all_commits}
 
         if all_commits:
@@ -1442,7 +1614,9 @@ def process_pr(
             return
 
         last_commit = last_commit_obj.commit
-        commit_statuses = get_combined_status_list(gh, last_commit_obj, repository)
+        commit_statuses = pr_snapshot.get_statuses(last_commit_obj.sha) if pr_snapshot else None
+        if commit_statuses is None:
+            commit_statuses = get_combined_status_list(gh, last_commit_obj, repository)
         bot_status = get_status(bot_status_name, commit_statuses)
         if not bot_status:
             bot_status_name = "bot/%s/jenkins" % prId
@@ -1545,7 +1719,7 @@ def process_pr(
 
     # start of parsing comments to find the bot_cache
     # to use information during the actual comment loop
-    for comment in issue.get_comments():
+    for comment in pr_snapshot.comments if pr_snapshot else issue.get_comments():
         all_comments.append(comment)
         if ensure_ascii(comment.user.login) != cmsbuild_user:
             continue
@@ -1568,7 +1742,135 @@ def process_pr(
         if k not in bot_cache:
             bot_cache[k] = copy.deepcopy(v)
 
-    for comment in all_comments:
+    comments_to_process = all_comments
+    checkpoint_key = None
+    emoji_deps = {}
+
+    def comments_state():
+        # State derived from the comments, saved in the comments checkpoint
+        return {
+            "already_seen": already_seen,
+            "backport_pr_num": backport_pr_num,
+            "pull_request_updated": pull_request_updated,
+            "hold": hold,
+            "assign_cats": assign_cats,
+            "signing_categories": signing_categories,
+            "signatures": signatures,
+            "extra_labels": extra_labels,
+            "state_labels": state_labels,
+            "ignore_tests": ignore_tests,
+            "enable_tests": enable_tests,
+            "extra_testers": extra_testers,
+            "mustClose": mustClose,
+            "reOpen": reOpen,
+            "mustMerge": mustMerge,
+            "ok_too_many_commits": ok_too_many_commits,
+            "ok_too_many_files": ok_too_many_files,
+            "warned_too_many_commits": warned_too_many_commits,
+            "warned_too_many_files": warned_too_many_files,
+            "test_params_msg": test_params_msg,
+            "test_params_comment": test_params_comment,
+            "global_test_params": global_test_params,
+            "code_check_apply_patch": code_check_apply_patch,
+            "code_checks_tools": code_checks_tools,
+            "events": events,
+            "extra_pre_checks": extra_pre_checks,
+            "pre_checks_state": pre_checks_state,
+            "pre_checks_url": pre_checks_url,
+            "comparison_done": comparison_done,
+            "comparison_notrun": comparison_notrun,
+            "comp_warnings": comp_warnings,
+            "last_test_start_time": last_test_start_time,
+            "need_external": need_external,
+            "abort_test": abort_test,
+            "build_comment": build_comment,
+            "test_comment": test_comment,
+            "cmssw_prs": cmssw_prs,
+            "extra_wfs": extra_wfs,
+            "release_queue": release_queue,
+            "release_arch": release_arch,
+            "override_tests_failure": override_tests_failure,
+        }
+
+    if use_comments_checkpoint(repo_config):
+        checkpoint_inputs = {
+            "repository": repository,
+            "issue": [issue.body, issue.state, issue.closed_at, requestor],
+            "pull_request": bool(issue.pull_request),
+            "push_test_issue": push_test_issue,
+            "cmsbuild_user": cmsbuild_user,
+            "users": [
+                sorted(TRIGGER_PR_TESTS),
+                sorted(releaseManagers),
+                sorted(CMSSW_ISSUES_TRACKERS),
+                sorted(PR_HOLD_MANAGERS),
+                L2_DATA,
+            ],
+        }
+        if issue.pull_request:
+            checkpoint_inputs["pr"] = [
+                last_commit.sha,
+                last_commit_date,
+                pr.commits,
+                pr.changed_files,
+                [s.updated_at for s in code_checks_status],
+            ]
+        checkpoint_key = get_comments_checkpoint_key(
+            dict((k, dump_checkpoint_value(v)) for k, v in comments_state().items()),
+            checkpoint_inputs,
+        )
+        comments_to_process, checkpoint = get_comments_checkpoint(
+            bot_cache, checkpoint_key, all_comments, technical_comments, repository, cmsbuild_user
+        )
+        if checkpoint:
+            emoji_deps = checkpoint["emoji"]
+            state = checkpoint["state"]
+            already_seen = state["already_seen"]
+            backport_pr_num = state["backport_pr_num"]
+            pull_request_updated = state["pull_request_updated"]
+            hold = state["hold"]
+            assign_cats = state["assign_cats"]
+            signing_categories = state["signing_categories"]
+            signatures = state["signatures"]
+            extra_labels = state["extra_labels"]
+            state_labels = state["state_labels"]
+            ignore_tests = state["ignore_tests"]
+            enable_tests = state["enable_tests"]
+            extra_testers = state["extra_testers"]
+            mustClose = state["mustClose"]
+            reOpen = state["reOpen"]
+            mustMerge = state["mustMerge"]
+            ok_too_many_commits = state["ok_too_many_commits"]
+            ok_too_many_files = state["ok_too_many_files"]
+            warned_too_many_commits = state["warned_too_many_commits"]
+            warned_too_many_files = state["warned_too_many_files"]
+            test_params_msg = state["test_params_msg"]
+            test_params_comment = state["test_params_comment"]
+            global_test_params = state["global_test_params"]
+            code_check_apply_patch = state["code_check_apply_patch"]
+            code_checks_tools = state["code_checks_tools"]
+            events = defaultdict(list, state["events"])
+            extra_pre_checks = state["extra_pre_checks"]
+            pre_checks_state = state["pre_checks_state"]
+            pre_checks_url = state["pre_checks_url"]
+            comparison_done = state["comparison_done"]
+            comparison_notrun = state["comparison_notrun"]
+            comp_warnings = state["comp_warnings"]
+            last_test_start_time = state["last_test_start_time"]
+            need_external = state["need_external"]
+            abort_test = state["abort_test"]
+            build_comment = state["build_comment"]
+            test_comment = state["test_comment"]
+            cmssw_prs = state["cmssw_prs"]
+            extra_wfs = state["extra_wfs"]
+            release_queue = state["release_queue"]
+            release_arch = state["release_arch"]
+            override_tests_failure = state["override_tests_failure"]
+            for tester in extra_testers:
+                if not tester in TRIGGER_PR_TESTS:
+                    TRIGGER_PR_TESTS.append(tester)
+
+    for comment in comments_to_process:
         commenter = ensure_ascii(comment.user.login)
         commenter_categories = get_commenter_categories(
             commenter, int(comment.created_at.strftime("%s"))
@@ -1891,11 +2193,13 @@ def process_pr(
                     if ok:
                         build_comment = None
                         if v5:
-                            if has_user_emoji(bot_cache, comment, repository, "+1", cmsbuild_user):
+                            if has_bot_emoji(
+                                bot_cache, comment, repository, cmsbuild_user, emoji_deps
+                            ):
                                 continue
                             if test_comment and (
-                                not has_user_emoji(
-                                    bot_cache, test_comment, repository, "+1", cmsbuild_user
+                                not has_bot_emoji(
+                                    bot_cache, test_comment, repository, cmsbuild_user, emoji_deps
                                 )
                             ):
                                 continue
@@ -1943,6 +2247,15 @@ def process_pr(
                         set_comment_emoji_cache(dryRun, bot_cache, comment, repository)
 
     # end of parsing comments section
+    if checkpoint_key:
+        set_comments_checkpoint(
+            bot_cache,
+            checkpoint_key,
+            all_comments,
+            technical_comments,
+            comments_state(),
+            emoji_deps,
+        )
 
     # Check if it needs to be automatically closed.
     if mustClose:
@@ -5,40 +5,128 @@ from os.path import expanduser, dirname, abspath, join, exists
 from optparse import OptionParser
 from datetime import datetime, timedelta
 from socket import setdefaulttimeout
-from github_utils import api_rate_limits
+from multiprocessing import get_context
+from io import StringIO
+from time import time, sleep
+from github_utils import (
+    api_rate_limits,
+    add_github_api_cache_stats,
+    get_github_api_cache_stats,
+    print_github_api_cache_stats,
+    reset_github_api_cache_stats,
+    set_default_github_api_cache,
+)
 from github_hooks_config import get_repository_hooks
-import sys
+import sys, traceback
 
 setdefaulttimeout(None)
 SCRIPT_DIR = dirname(abspath(sys.argv[0]))
 
 
-def check_prs(gh, repo, since, process_issue, dryRun):
+def process_issue_worker(repo_name, issue_number, dryRun):
+    """
+    Worker for --jobs mode. Each issue is processed in its own forked process
+    (maxtasksperchild=1), so the module level state of process_pr (CMSSW_CATEGORIES,
+    L2_DATA, create_status, ...) can not leak between PRs processed concurrently.
+    Output is captured and returned, so that logs of different PRs are not interleaved,
+    with the GitHub api cache stats of the worker, which are added up by the parent.
+    """
+    import http_utils
+
+    # Do not share the keep-alive connections nor count the cache stats of the parent process
+    http_utils.HTTP_POOLS = {}
+    reset_github_api_cache_stats()
+    out = StringIO()
+    stdout = sys.stdout
+    sys.stdout = out
+    stime = time()
+    error = ""
+    try:
+        gh = Github(login_or_token=open(expanduser(repo_config.GH_TOKEN)).read().strip())
+        repo = gh.get_repo(repo_name)
+        process_pr(repo_config, gh, repo, repo.get_issue(issue_number), dryRun)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        sys.stdout = stdout
+    return (
+        repo_name,
+        issue_number,
+        time() - stime,
+        out.getvalue(),
+        error,
+        get_github_api_cache_stats(),
+    )
+
+
+def report_issue(stats, repo_name, issue_number, dtime, output, error, cache_stats=None):
+    if cache_stats:
+        add_github_api_cache_stats(cache_stats)
+    if output:
+        print("=" * 20, "%s#%s" % (repo_name, issue_number), "=" * 20)
+        print(output.rstrip("\n"))
+    stats["count"] += 1
+    stats["time"] += dtime
+    if error:
+        stats["failed"].append("%s#%s" % (repo_name, issue_number))
+        print("ERROR: Failed to process", repo_name, issue_number)
+        print(error)
+        print("Failed %s#%s in %.1f sec" % (repo_name, issue_number, dtime))
+        return 1
+    print("Processed %s#%s in %.1f sec" % (repo_name, issue_number, dtime))
+    return 0
+
+
+def wait_for_jobs(jobs, max_jobs, stats):
+    err = 0
+    while len(jobs) >= max_jobs:
+        for job in [j for j in jobs if j.ready()]:
+            jobs.remove(job)
+            err += report_issue(stats, *job.get())
+        if len(jobs) >= max_jobs:
+            sleep(0.1)
+    return err
+
+
+def check_prs(gh, repo, since, process_issue, dryRun, pool=None, jobs=1, stats=None):
     # if repo.full_name in ["cms-sw/cmsdist", "cms-sw/cmssw"]: return
     if not get_repository_hooks(repo.full_name, "Jenkins_Github_Hook"):
-        return
+        return 0
+    if stats is None:
+        stats = {"count": 0, "time": 0.0, "failed": []}
     print("Working on Repository: ", repo.full_name)
     if since:
         issues = repo.get_issues(state="open", sort="updated", since=since)
     else:
         issues = repo.get_issues(state="open", sort="updated")
     err = 0
+    running = []
     for issue in issues:
         if not process_issue and not issue.pull_request:
             print("Only processing PRs, skipped issue: ", issue.number)
             continue
+        if pool:
+            err += wait_for_jobs(running, jobs, stats)
+            # All workers use the same token: only start a new one if the rate limit allows it
+            api_rate_limits(gh, msg=False)
+            running.append(
+                pool.apply_async(process_issue_worker, (repo.full_name, issue.number, dryRun))
+            )
+            continue
+        stime = time()
+        error = ""
         try:
             process_pr(repo_config, gh, repo, issue, dryRun)
-        except Exception as e:
-            print("ERROR: Failed to process", repo.full_name, issue.number)
-            print(e)
-            err = 1
-    return err
+        except Exception:
+            error = traceback.format_exc()
+        err += report_issue(stats, repo.full_name, issue.number, time() - stime, "", error)
+    err += wait_for_jobs(running, 1, stats)
+    return 1 if err else 0
 
 
 if __name__ == "__main__":
     parser = OptionParser(
-        usage="%prog [-r|--repository <repo: default is cms-sw/cmssw>] [-i|--issue] [-s|--since <sec default is 3600>] [-n|--dry-run]"
+        usage="%prog [-r|--repository <repo: default is cms-sw/cmssw>] [-i|--issue] [-s|--since <sec default is 3600>] [-n|--dry-run] [-j|--jobs <n>]"
     )
     parser.add_option(
         "-n",
@@ -72,7 +160,16 @@ if __name__ == "__main__":
         help="Process github issues",
         default=False,
     )
+    parser.add_option(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        help="Number of PRs/issues to process in parallel, default is 1 i.e. serial",
+        type="int",
+        default=1,
+    )
     opts, args = parser.parse_args()
+    set_default_github_api_cache()
 
     since = None
     if opts.since > 0:
@@ -92,12 +189,29 @@ if __name__ == "__main__":
         repos.append(opts.repository)
     else:
         repos = EXTERNAL_REPOS
+    pool = None
+    if opts.jobs > 1:
+        pool = get_context("fork").Pool(opts.jobs, maxtasksperchild=1)
+    stats = {"count": 0, "time": 0.0, "failed": []}
     err = 0
+    stime = time()
     for repo_name in repos:
         if not "/" in repo_name:
             user = gh.get_user(repo_name)
             for repo in user.get_repos():
-                err += check_prs(gh, repo, since, opts.issue, opts.dryRun)
+                err += check_prs(gh, repo, since, opts.issue, opts.dryRun, pool, opts.jobs, stats)
         else:
-            err += check_prs(gh, gh.get_repo(repo_name), since, opts.issue, opts.dryRun)
+            err += check_prs(
+                gh, gh.get_repo(repo_name), since, opts.issue, opts.dryRun, pool, opts.jobs, stats
+            )
+    if pool:
+        pool.close()
+        pool.join()
+    print(
+        "Processed %s PRs/issues with %s jobs in %.1f sec (%.1f sec of processing), %s failed"
+        % (stats["count"], opts.jobs, time() - stime, stats["time"], len(stats["failed"]))
+    )
+    for failed in stats["failed"]:
+        print("  Failed:", failed)
+    print_github_api_cache_stats()
     sys.exit(err)
@@ -9,7 +9,8 @@ import re
 from cms_static import GH_CMSSW_REPO, GH_CMSDIST_REPO, GH_CMSSW_ORGANIZATION
 from github_utils import prs2relnotes, get_merge_prs, get_release_by_tag
 from socket import setdefaulttimeout
-from categories import get_dpg_pog
+from categories import get_dpg_pog, CMSSW_CATEGORIES
+from categories_index import get_categories_index
 
 setdefaulttimeout(120)
 CMSDIST_REPO_NAME = join(GH_CMSSW_ORGANIZATION, GH_CMSDIST_REPO)
@@ -28,17 +29,30 @@ def format(s, **kwds):
 #
 # defines the categories for each pr in the release notes
 #
+def get_label_category(label, index, dpg_pog_labels):
+    if (
+        re.match("^[a-zA-Z0-9]+[-](approved|pending|hold|rejected)$", label)
+        and not re.match("^(tests|orp)-", label)
+    ) or label in dpg_pog_labels:
+        return label.split("-")[0]
+    # Signature labels of categories with "-" in their name e.g. jetmet-pog-approved
+    cat, _, state = label.rpartition("-")
+    if state in ["approved", "pending", "hold", "rejected"] and index.has_category(cat):
+        return cat
+    return None
+
+
 def add_categories_notes(notes, cache):
     dpg_pog_labels = get_dpg_pog()
+    index = get_categories_index(CMSSW_CATEGORIES)
     for pr_number in notes:
         categories = [
-            l.split("-")[0]
-            for l in cache[pr_number]["pr"]["labels"]
-            if (
-                re.match("^[a-zA-Z0-9]+[-](approved|pending|hold|rejected)$", l)
-                and not re.match("^(tests|orp)-", l)
-            )
-            or l in dpg_pog_labels
+            c
+            for c in [
+                get_label_category(l, index, dpg_pog_labels)
+                for l in cache[pr_number]["pr"]["labels"]
+            ]
+            if c
         ]
         if len(categories) == 0:
             print("no categories for:", pr_number)
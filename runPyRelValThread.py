@@ -6,7 +6,10 @@ from es_relval_log import es_parse_log
 from RelValArgs import FixWFArgs, GetWFThreads
 from _py2with3compatibility import run_cmd
 import json
-from logreaderUtils import transform_and_write_config_file, add_exception_to_config
+from logreaderUtils import transform_and_write_config_file, get_exception_rule_set
+
+LOG_PARSE_JOBS = int(os.environ.get("CMS_RELVAL_LOG_JOBS", "4"))
+STEP_LOG_RE = re.compile("^.*/([1-9][0-9]*(\\.[0-9]+|))_[^/]+/step([1-9])_.*\\.log$")
 
 
 def runStep1Only(basedir, workflow, args=""):
@@ -142,6 +145,68 @@ def splitWorkflows(workflows, max_wf_pre_set):
     return merged
 
 
+def getPool(jobs):
+    from multiprocessing import get_context
+
+    return get_context("fork").Pool(jobs)
+
+
+def readStepLogCache(logFile, step):
+    """Returns the cached [events, warnings, errors] of a step log or None if not up to date"""
+    json_cache = os.path.dirname(logFile) + "/logcache_" + str(step) + ".json"
+    if (os.path.exists(json_cache)) and (
+        os.path.getmtime(logFile) <= os.path.getmtime(json_cache)
+    ):
+        try:
+            jfile = open(json_cache, "r")
+            data = json.load(jfile)
+            jfile.close()
+            return data
+        except:
+            os.remove(json_cache)
+    return None
+
+
+def parseStepLog(logFile, step):
+    """
+    Sends a step log to elasticsearch, writes its logreader config and returns (and caches
+    in logcache_<step>.json) its [events, warnings, errors] counts
+    """
+    data = [0, 0, 0]
+    config_list = []
+    try:
+        es_parse_log(logFile)
+    except Exception as e:
+        print("Sending log information to elasticsearch failed:", logFile, str(e))
+    rule_set = get_exception_rule_set()
+    inFile = open(logFile)
+    for line_nr, line in enumerate(inFile):
+        config = rule_set.match(line, line_nr)
+        if config:
+            config_list.append(config)
+        if "%MSG-w" in line:
+            data[1] = data[1] + 1
+        if "%MSG-e" in line:
+            data[2] = data[2] + 1
+        if "Begin processing the " in line:
+            data[0] = data[0] + 1
+    inFile.close()
+    jfile = open(os.path.dirname(logFile) + "/logcache_" + str(step) + ".json", "w")
+    json.dump(data, jfile)
+    jfile.close()
+    transform_and_write_config_file(logFile + "-read_config", config_list)
+    return data
+
+
+def parseStepLogJob(args):
+    """(logFile, step) -> (logFile, data), for the process pools"""
+    logFile, step = args
+    data = readStepLogCache(logFile, step)
+    if data is None:
+        data = parseStepLog(logFile, step)
+    return (logFile, data)
+
+
 class PyRelValsThread(object):
     def __init__(self, jobs, basedir, jobid="1of1", outdir=None):
         if not outdir:
@@ -333,12 +398,17 @@ class PyRelValsThread(object):
         json.dump(time_info, outFile)
         outFile.close()
 
-    def parseLog(self):
+    def parseLog(self, jobs=None):
+        """
+        Summarizes the step logs of all workflows in runTheMatrixMsgs.pkl. Logs without an
+        up to date logcache_<step>.json are parsed by a pool of jobs processes.
+        """
+        if jobs is None:
+            jobs = LOG_PARSE_JOBS
         logData = {}
-        logRE = re.compile("^.*/([1-9][0-9]*(\\.[0-9]+|))_[^/]+/step([1-9])_.*\\.log$")
         max_steps = 0
         for logFile in glob.glob(self.basedir + "/[1-9]*/step[0-9]*.log"):
-            m = logRE.match(logFile)
+            m = STEP_LOG_RE.match(logFile)
             if not m:
                 continue
             wf = m.group(1)
@@ -350,7 +420,31 @@ class PyRelValsThread(object):
             if step not in logData[wf]["steps"]:
                 logData[wf]["steps"][step] = logFile
         cache_read = 0
-        log_processed = 0
+        stepData = {}
+        uncached = []
+        for wf in logData:
+            for step in logData[wf]["steps"]:
+                logFile = logData[wf]["steps"][step]
+                data = readStepLogCache(logFile, step)
+                if data is None:
+                    uncached.append((logFile, step))
+                else:
+                    stepData[logFile] = data
+                    cache_read += 1
+        if jobs > 1 and len(uncached) > 1:
+            pool = getPool(min(jobs, len(uncached)))
+            try:
+                for logFile, data in pool.imap_unordered(parseStepLogJob, uncached):
+                    stepData[logFile] = data
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for args in uncached:
+                logFile, data = parseStepLogJob(args)
+                stepData[logFile] = data
+        log_processed = len(uncached)
+
         for wf in logData:
             for k in logData[wf]:
                 if k == "steps":
@@ -359,43 +453,7 @@ class PyRelValsThread(object):
                     logData[wf][k].append(-1)
             index = 0
             for step in sorted(logData[wf]["steps"]):
-                data = [0, 0, 0]
-                logFile = logData[wf]["steps"][step]
-                json_cache = os.path.dirname(logFile) + "/logcache_" + str(step) + ".json"
-                log_reader_config_path = logFile + "-read_config"
-                config_list = []
-                cache_ok = False
-                if (os.path.exists(json_cache)) and (
-                    os.path.getmtime(logFile) <= os.path.getmtime(json_cache)
-                ):
-                    try:
-                        jfile = open(json_cache, "r")
-                        data = json.load(jfile)
-                        jfile.close()
-                        cache_read += 1
-                        cache_ok = True
-                    except:
-                        os.remove(json_cache)
-                if not cache_ok:
-                    try:
-                        es_parse_log(logFile)
-                    except Exception as e:
-                        print("Sending log information to elasticsearch failed:", logFile, str(e))
-                    inFile = open(logFile)
-                    for line_nr, line in enumerate(inFile):
-                        config_list = add_exception_to_config(line, line_nr, config_list)
-                        if "%MSG-w" in line:
-                            data[1] = data[1] + 1
-                        if "%MSG-e" in line:
-                            data[2] = data[2] + 1
-                        if "Begin processing the " in line:
-                            data[0] = data[0] + 1
-                    inFile.close()
-                    jfile = open(json_cache, "w")
-                    json.dump(data, jfile)
-                    jfile.close()
-                    transform_and_write_config_file(log_reader_config_path, config_list)
-                    log_processed += 1
+                data = stepData[logData[wf]["steps"][step]]
                 logData[wf]["events"][index] = data[0]
                 logData[wf]["failed"][index] = data[2]
                 logData[wf]["warning"][index] = data[1]
@@ -72,40 +72,28 @@ class UnitTester(IBThreadBase):
 
     # --------------------------------------------------------------------------------
     def checkTestLogs(self):
+        # check and split the log in a single pass, both summaries go to the same file
+        import checkTestLog, splitUnitTestLog
+        from unitTestLogParser import parseUnitTestLog
+
+        print("unitTest>Going to check and split log file from unit-tests in ", self.startDir)
         # noinspection PyBroadException
         try:
-            self.checkUnitTestLog()
+            runCmd("rm -rf " + self.startDir + "/unitTestLogs")
         except Exception:
             pass
         try:
-            self.splitUnitTestLogs()
+            summary = open(self.startDir + "/unitTests-summary.log", "w")
+            try:
+                tlc = checkTestLog.TestLogChecker(summary, True)
+                tls = splitUnitTestLog.LogSplitter(summary, True)
+                parseUnitTestLog(self.startDir + "/unitTests.log", [tlc, tls])
+            finally:
+                summary.close()
+            runCmd("cd " + self.startDir + "; zip -r unitTestLogs.zip unitTestLogs")
         except Exception as e:
             traceback.print_exc()
-            print("ERROR splitting unit test logs :", str(e))
-        return
-
-    # --------------------------------------------------------------------------------
-    def checkUnitTestLog(self):
-        import checkTestLog
-
-        print("unitTest>Going to check log file from unit-tests in ", self.startDir)
-        # noinspection PyBroadException
-        try:
-            runCmd("rm -rf " + self.startDir + "/unitTestLogs")
-        except Exception:
-            pass
-        tlc = checkTestLog.TestLogChecker(self.startDir + "/unitTests-summary.log", True)
-        tlc.check(self.startDir + "/unitTests.log")
-        return
-
-    # --------------------------------------------------------------------------------
-    def splitUnitTestLogs(self):
-        import splitUnitTestLog
-
-        print("unitTest>Going to split log file from unit-tests in ", self.startDir)
-        tls = splitUnitTestLog.LogSplitter(self.startDir + "/unitTests-summary.log", True)
-        tls.split(self.startDir + "/unitTests.log")
-        runCmd("cd " + self.startDir + "; zip -r unitTestLogs.zip unitTestLogs")
+            print("ERROR checking/splitting unit test logs :", str(e))
         return
 
     # --------------------------------------------------------------------------------
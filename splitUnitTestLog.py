@@ -3,15 +3,17 @@
 from __future__ import print_function
 
 import os
-import re
 import sys
 import time
+from unitTestLogParser import UnitTestLogConsumer, parseUnitTestLog
 
 
-class LogSplitter(object):
+class LogSplitter(UnitTestLogConsumer):
     def __init__(self, outFileIn=None, verbIn=False):
         self.outFile = sys.stdout
-        if outFileIn:
+        if hasattr(outFileIn, "write"):
+            self.outFile = outFileIn
+        elif outFileIn:
             print("Summary file:", outFileIn)
             self.outFile = open(outFileIn, "w")
 
@@ -30,130 +32,95 @@ class LogSplitter(object):
     # --------------------------------------------------------------------------------
 
     def split(self, logFile):
-        self.outFile.write("going to check " + logFile + "\n")
+        parseUnitTestLog(logFile, [self])
 
-        subsysRe = re.compile("^>> Tests for package ([A-Z].*/[A-Z].*) ran.")
-
-        pkgTestStartRe = re.compile('^===== Test "(.*)" ====')
-        pkgTestEndRe = re.compile(r"^\^\^\^\^ End Test (.*) \^\^\^\^")
-        pkgTestResultRe = re.compile(".*---> test ([^ ]+) (had ERRORS|succeeded)")
-
-        pkgStartRe = re.compile("^>> Entering Package (.*)")
-        # pkgEndRe   = re.compile("^>> Leaving Package (.*)")
-        pkgEndRe = re.compile("^>> Tests for package (.*) ran.")
-
-        pkgSubsysMap = {}
-        subsysPkgMap = {}
-
-        baseDir = os.path.split(logFile)[0]
-        logDirs = os.path.join(baseDir, "unitTestLogs")
-        print("logDirs ", logDirs)
-        if not os.path.exists(logDirs):
-            os.makedirs(logDirs)
-
-        lf = open(logFile, "rb")
-        lines = lf
-
-        startTime = time.time()
-        nLines = 0
-        testNames = {}
-        testLines = {}
-        pkgLines = {}
-        results = {}
-        pkgTests = {}
-
-        actPkg = "None"
-        actTest = "None"
-        actTstLines = 0
-        actPkgLines = 0
-
-        actLogLines = []
-        startFound = False
-        for line in lines:
-            if sys.version_info[0] == 2:
-                line = line.decode("ascii", "ignore")
-            else:
-                line = line.decode("ascii", errors="ignore")
-            # write out log to individual log file ...
-            if startFound and ">> Leaving Package " not in line:
-                actLogLines.append(line)
-
-            nLines += 1
-            actTstLines += 1
-            actPkgLines += 1
-            subsysMatch = subsysRe.match(line)
-            if subsysMatch:
-                subsys, pkg = subsysMatch.group(1).split("/")
-                if pkg not in pkgSubsysMap:
-                    pkgSubsysMap[pkg] = subsys
-                if subsys in subsysPkgMap:
-                    subsysPkgMap[subsys].append(pkg)
-                else:
-                    subsysPkgMap[subsys] = [pkg]
-
-            pkgStartMatch = pkgStartRe.match(line)
-            if pkgStartMatch:
-                pkg = pkgStartMatch.group(1)
-                actPkg = pkg
-                pkgTests[pkg] = 0
-                actPkgLines = 0
-                startFound = True
-
-            pkgEndMatch = pkgEndRe.match(line)
-            if pkgEndMatch:
-                pkg = pkgEndMatch.group(1)
-                if actPkg != pkg:
-                    self.outFile.write(
-                        "pkgEndMatch> package mismatch: pkg found "
-                        + pkg
-                        + " actPkg="
-                        + actPkg
-                        + "\n"
-                    )
-                pkgLines[pkg] = actPkgLines
-
-                if len(actLogLines) > 2:
-                    actLogDir = os.path.join(logDirs, pkg)
-                    os.makedirs(actLogDir)
-                    actLogFile = open(os.path.join(actLogDir, "unitTest.log"), "w")
-                    actLogFile.write("".join(actLogLines))
-                    actLogFile.close()
-                    actLogLines = []
-                startFound = False
-
-            pkgTestResultMatch = pkgTestResultRe.match(line)
-            if pkgTestResultMatch:  # this seems to only appear if there is an ERROR
-                tstName = pkgTestResultMatch.group(1)
-                results[tstName] = pkgTestResultMatch.group(2)
-
-            pkgTestStartMatch = pkgTestStartRe.match(line)
-            if pkgTestStartMatch:
-                tst = pkgTestStartMatch.group(1)
-                actTest = tst
-                actTstLines = 0
-                pkgTests[actPkg] += 1
-                if actPkg in testNames:
-                    testNames[actPkg].append(actTest)
-                else:
-                    testNames[actPkg] = [actTest]
-                if actTest not in results:
-                    results[actTest] = "succeeded"  # set the default, no error seen yet
-
-            pkgTestEndMatch = pkgTestEndRe.match(line)
-            if pkgTestEndMatch:
-                tst = pkgTestEndMatch.group(1)
-                if actTest != tst:
-                    self.outFile.write(
-                        "pkgTestEndMatch> test mismatch: tst found "
-                        + tst
-                        + " actTest="
-                        + actTest
-                        + "\n"
-                    )
-                testLines[tst] = actTstLines
+    # UnitTestLogConsumer events, see unitTestLogParser.py
+
+    def startLog(self, logFile):
+        self.outFile.write("going to check " + logFile + "\n")
 
+        self.baseDir = os.path.split(logFile)[0]
+        self.logDirs = os.path.join(self.baseDir, "unitTestLogs")
+        print("logDirs ", self.logDirs)
+        if not os.path.exists(self.logDirs):
+            os.makedirs(self.logDirs)
+
+        self.startTime = time.time()
+        self.testNames = {}
+        self.testLines = {}
+        self.pkgLines = {}
+        self.results = {}
+        self.pkgTests = {}
+
+        self.actPkg = "None"
+        self.actTest = "None"
+        self.actTstStart = -1
+        self.actPkgStart = -1
+
+        self.actLogLines = []
+        self.startFound = False
+
+    def line(self, line, lineNo, isTestMarker):
+        # write out log to individual log file ...
+        if self.startFound and ">> Leaving Package " not in line:
+            self.actLogLines.append(line)
+
+    def packageStart(self, pkg, lineNo):
+        self.actPkg = pkg
+        self.pkgTests[pkg] = 0
+        self.actPkgStart = lineNo
+        self.startFound = True
+
+    def packageTestsRan(self, pkg, lineNo):
+        if self.actPkg != pkg:
+            self.outFile.write(
+                "pkgEndMatch> package mismatch: pkg found " + pkg + " actPkg=" + self.actPkg + "\n"
+            )
+        self.pkgLines[pkg] = lineNo - self.actPkgStart
+
+        if len(self.actLogLines) > 2:
+            actLogDir = os.path.join(self.logDirs, pkg)
+            os.makedirs(actLogDir)
+            actLogFile = open(os.path.join(actLogDir, "unitTest.log"), "w")
+            actLogFile.write("".join(self.actLogLines))
+            actLogFile.close()
+            self.actLogLines = []
+        self.startFound = False
+
+    def testResult(self, test, result, lineNo):
+        # this seems to only appear if there is an ERROR
+        self.results[test] = result
+
+    def testStart(self, test, lineNo):
+        self.actTest = test
+        self.actTstStart = lineNo
+        self.pkgTests[self.actPkg] += 1
+        if self.actPkg in self.testNames:
+            self.testNames[self.actPkg].append(test)
+        else:
+            self.testNames[self.actPkg] = [test]
+        if test not in self.results:
+            self.results[test] = "succeeded"  # set the default, no error seen yet
+
+    def testEnd(self, test, lineNo):
+        if self.actTest != test:
+            self.outFile.write(
+                "pkgTestEndMatch> test mismatch: tst found "
+                + test
+                + " actTest="
+                + self.actTest
+                + "\n"
+            )
+        self.testLines[test] = lineNo - self.actTstStart
+
+    def endLog(self, nLines):
         stopTime = time.time()
-        lf.close()
+        startTime = self.startTime
+        baseDir = self.baseDir
+        testNames = self.testNames
+        testLines = self.testLines
+        results = self.results
+        pkgTests = self.pkgTests
 
         self.outFile.write("found a total of " + str(nLines) + " lines in logfile.\n")
         self.outFile.write("analysis took " + str(stopTime - startTime) + " sec.\n")
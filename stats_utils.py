@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+"""
+Summary statistics of the resources used by the workflows (min, max, avg, median and
+percentiles of the samples of monitor_workflow.py), as stored in elasticsearch by es_utils.
+
+summary_stats() computes the summary of all the metrics in one pass over the sorted
+columns of the samples, with numpy when it is available (same results as the pure python
+version). StatsSketch is a mergeable t-digest like sketch which gives the summary of a
+stream of samples without keeping them, monitor_workflow.py uses it (WorkflowSummary) to
+write only the summary of a job.
+"""
+
+from math import asin, pi, sin
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# metrics summarized by their max only, and by min, max, avg, median and PERCENTILES
+MAX_STATS = ["time", "num_threads", "processes", "num_fds"]
+SUMMARY_STATS = ["rss", "vms", "pss", "uss", "shared", "data", "cpu"]
+PERCENTILES = [25, 75, 90]
+
+
+def rows_to_columns(rows):
+    """Dict of the list of values of each metric of a list of samples (dicts)"""
+    columns = {}
+    for row in rows:
+        for item in row:
+            try:
+                columns[item].append(row[item])
+            except KeyError:
+                columns[item] = [row[item]]
+    return columns
+
+
+def percentile_index(percentage, dlen):
+    """Index and fraction (in %) of the sorted data used by cmsutils.percentile"""
+    R = (dlen + 1) * percentage / 100.0
+    IR = int(R)
+    if IR >= dlen:
+        return dlen - 1, 0
+    elif IR == 0:
+        return 0, 0
+    return IR - 1, int((R - IR) * 100)
+
+
+def sorted_summary(at, dlen, avg, trunc=int):
+    """
+    Summary of sorted data of length dlen: at(i) returns its i-th value (or the i-th values
+    of several columns, as a numpy array) and trunc() converts to integers.
+    """
+    res = {"min": at(0), "max": at(dlen - 1)}
+    if dlen == 1:
+        for t in ["avg", "median"] + [str(p) for p in PERCENTILES]:
+            res[t] = at(0)
+        return res
+    dlen2 = int(dlen / 2)
+    if (dlen % 2) == 0:
+        res["median"] = trunc((at(dlen2 - 1) + at(dlen2)) / 2)
+    else:
+        res["median"] = at(dlen2)
+    res["avg"] = trunc(avg)
+    for p in PERCENTILES:
+        idx, frac = percentile_index(p, dlen)
+        val = at(idx)
+        if frac > 0:
+            val = (frac / 100.0) * (at(idx + 1) - val) + val
+        res[str(p)] = trunc(val)
+    return res
+
+
+def _python_summary(data, weights, sdata):
+    for x in data:
+        values = data[x]
+        dlen = len(values)
+        if weights and len(weights) == dlen:
+            avg = sum([v * w for v, w in zip(values, weights)]) / sum(weights)
+        else:
+            avg = sum(values) / dlen
+        values = sorted(values)
+        for t, v in sorted_summary(lambda i: values[i], dlen, avg).items():
+            sdata[x + "_" + t] = v
+
+
+def _numpy_trunc(values):
+    return numpy.trunc(values).astype(numpy.int64)
+
+
+def _numpy_summary(data, weights, sdata):
+    # columns of the same length and type are sorted and summarized together
+    groups = {}
+    for x in data:
+        values = numpy.asarray(data[x])
+        groups.setdefault((len(values), values.dtype.str), []).append((x, values))
+    if weights:
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+    for (dlen, dtype), items in groups.items():
+        matrix = numpy.array([values for x, values in items])
+        if (weights is not None) and (len(weights) == dlen):
+            avg = matrix.dot(weights) / weights.sum()
+        else:
+            avg = matrix.sum(axis=1) / dlen
+        matrix.sort(axis=1)
+        res = sorted_summary(lambda i: matrix[:, i], dlen, avg, _numpy_trunc)
+        for t in res:
+            for idx, value in enumerate(res[t].tolist()):
+                sdata[items[idx][0] + "_" + t] = value
+
+
+def summary_stats(columns, cpu_normalize=1):
+    """
+    Summary of the samples of a workflow step, columns being the lists of values of each
+    metric (see rows_to_columns). The avg is weighted by the sampling intervals when they
+    are not all the same.
+    """
+    sdata = {}
+    for x in MAX_STATS:
+        if columns.get(x):
+            sdata[x] = max(columns[x])
+    weights = columns.get("interval")
+    if weights and min(weights) == max(weights):
+        weights = None
+    data = {}
+    for x in SUMMARY_STATS:
+        if x not in columns:
+            continue
+        if not columns[x]:
+            for t in ["min", "max", "avg", "median"] + [str(p) for p in PERCENTILES]:
+                sdata[x + "_" + t] = 0
+            continue
+        data[x] = columns[x]
+        if (x == "cpu") and (cpu_normalize > 1) and (max(data[x]) > 100):
+            data[x] = [d / cpu_normalize for d in data[x]]
+    if numpy:
+        _numpy_summary(data, weights, sdata)
+    else:
+        _python_summary(data, weights, sdata)
+    return sdata
+
+
+def group_means(groups, rows):
+    """
+    Means of the columns of the rows (lists of numbers) of each group: groups[i] is the
+    group of rows[i]. Returns a dict of group: list of means.
+    """
+    if not rows:
+        return {}
+    if numpy:
+        keys = {}
+        gidx = numpy.array([keys.setdefault(g, len(keys)) for g in groups])
+        matrix = numpy.asarray(rows, dtype=numpy.float64)
+        counts = numpy.bincount(gidx)
+        means = [numpy.bincount(gidx, weights=matrix[:, c]) / counts for c in range(len(rows[0]))]
+        means = numpy.array(means).T.tolist()
+        return dict([(g, means[keys[g]]) for g in keys])
+    sums = {}
+    for g, row in zip(groups, rows):
+        if g not in sums:
+            sums[g] = [0] * (len(row) + 1)
+        gsum = sums[g]
+        gsum[-1] += 1
+        for c, v in enumerate(row):
+            gsum[c] += v
+    return dict([(g, [v / float(s[-1]) for v in s[:-1]]) for g, s in sums.items()])
+
+
+class StatsSketch(object):
+    """
+    Mergeable sketch of the distribution of a metric (a merging t-digest): the weighted
+    samples are merged into less than compression centroids, smaller at the tails, which
+    give its quantiles. The count, sum, min and max are exact.
+    """
+
+    def __init__(self, compression=100, buffer_size=500):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.centroids = []
+        self.buffer = []
+        self.count = 0
+        self.weight = 0.0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1.0):
+        if weight <= 0:
+            return
+        self.buffer.append([value, weight])
+        self.count += 1
+        self.weight += weight
+        self.sum += value * weight
+        if (self.min is None) or (value < self.min):
+            self.min = value
+        if (self.max is None) or (value > self.max):
+            self.max = value
+        if len(self.buffer) >= self.buffer_size:
+            self.compress()
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self.buffer += [list(c) for c in other.centroids + other.buffer]
+        self.count += other.count
+        self.weight += other.weight
+        self.sum += other.sum
+        if (self.min is None) or (other.min < self.min):
+            self.min = other.min
+        if (self.max is None) or (other.max > self.max):
+            self.max = other.max
+        self.compress()
+
+    def limit(self, q):
+        """Max quantile of a centroid starting at quantile q (k1 scale function)"""
+        k = self.compression / (2 * pi) * asin(2 * q - 1) + 1
+        if k >= self.compression / 4.0:
+            return 1.0
+        return (sin(2 * pi * k / self.compression) + 1) / 2
+
+    def compress(self):
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+        total = sum([w for m, w in points])
+        centroids = []
+        mean, weight = points[0]
+        cum = 0.0
+        limit = self.limit(0.0)
+        for m, w in points[1:]:
+            if (cum + weight + w) / total <= limit:
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                centroids.append([mean, weight])
+                cum += weight
+                limit = self.limit(cum / total)
+                mean, weight = m, w
+        centroids.append([mean, weight])
+        self.centroids = centroids
+
+    def quantile(self, q):
+        """Value at quantile q (0-1), interpolated between the centroids, min and max"""
+        self.compress()
+        if not self.centroids:
+            return 0
+        target = q * self.weight
+        cum = 0.0
+        prev_pos, prev_mean = 0.0, self.min
+        for mean, w in self.centroids:
+            pos = cum + w / 2.0
+            if target < pos:
+                if pos == prev_pos:
+                    return mean
+                return prev_mean + (mean - prev_mean) * (target - prev_pos) / (pos - prev_pos)
+            prev_pos, prev_mean = pos, mean
+            cum += w
+        if cum <= prev_pos:
+            return self.max
+        return prev_mean + (self.max - prev_mean) * min(1, (target - prev_pos) / (cum - prev_pos))
+
+    def summary(self, scale=1):
+        """Same keys as sorted_summary, with the values divided by scale"""
+        if not self.count:
+            return dict([(t, 0) for t in ["min", "max", "avg", "median", "25", "75", "90"]])
+        res = {"min": self.min / scale if scale > 1 else self.min}
+        res["max"] = self.max / scale if scale > 1 else self.max
+        res["avg"] = int(self.sum / self.weight / scale)
+        res["median"] = int(self.quantile(0.5) / scale)
+        for p in PERCENTILES:
+            res[str(p)] = int(self.quantile(p / 100.0) / scale)
+        return res
+
+    def to_dict(self):
+        self.compress()
+        return {
+            "compression": self.compression,
+            "count": self.count,
+            "weight": self.weight,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "centroids": self.centroids,
+        }
+
+
+def load_sketch(data):
+    sketch = StatsSketch(data["compression"])
+    for k in ["count", "weight", "sum", "min", "max", "centroids"]:
+        setattr(sketch, k, data[k])
+    return sketch
+
+
+class WorkflowSummary(object):
+    """Sketches of SUMMARY_STATS and max of MAX_STATS of the samples of a workflow step"""
+
+    def __init__(self, compression=100):
+        self.sketches = dict([(x, StatsSketch(compression)) for x in SUMMARY_STATS])
+        self.max = {}
+
+    def add(self, stats, weight=None):
+        """Adds a sample, weighted by its sampling interval by default"""
+        if weight is None:
+            weight = stats.get("interval", 1.0)
+        for x in MAX_STATS:
+            if (x in stats) and ((x not in self.max) or (stats[x] > self.max[x])):
+                self.max[x] = stats[x]
+        for x in SUMMARY_STATS:
+            if x in stats:
+                self.sketches[x].add(stats[x], weight)
+
+    def merge(self, other):
+        for x in other.max:
+            if (x not in self.max) or (other.max[x] > self.max[x]):
+                self.max[x] = other.max[x]
+        for x in SUMMARY_STATS:
+            self.sketches[x].merge(other.sketches[x])
+
+    def summary(self, cpu_normalize=1):
+        """Same summary as summary_stats() (approximate median and percentiles)"""
+        sdata = dict(self.max.items())
+        for x in SUMMARY_STATS:
+            sketch = self.sketches[x]
+            if not sketch.count:
+                continue
+            scale = 1
+            if (x == "cpu") and (cpu_normalize > 1) and (sketch.max > 100):
+                scale = cpu_normalize
+            for t, v in sketch.summary(scale).items():
+                sdata[x + "_" + t] = v
+        return sdata
+
+    def to_dict(self):
+        return {
+            "max": self.max,
+            "sketches": dict([(x, s.to_dict()) for x, s in self.sketches.items()]),
+        }
+
+
+def load_summary(data):
+    wf_summary = WorkflowSummary()
+    wf_summary.max = data["max"]
+    for x in data["sketches"]:
+        wf_summary.sketches[x] = load_sketch(data["sketches"][x])
+    return wf_summary
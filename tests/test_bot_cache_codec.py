@@ -0,0 +1,77 @@
+import copy
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import bot_cache_codec
+from bot_cache_codec import decode_bot_cache, encode_bot_cache
+
+
+def sha(n):
+    return hashlib.sha1(str(n).encode()).hexdigest()
+
+
+def make_cache(commits=50):
+    return {
+        "emoji": dict((str(1000000000 + n), "+1" if n % 3 else "-1") for n in range(200)),
+        "signatures": {"tests": "approved", "core": "pending"},
+        "commits": dict(
+            (
+                sha(n),
+                {
+                    "time": 1700000000 + n,
+                    "files": [
+                        "Pkg%s/Sub%s/src/file%s.cc" % (n % 5, n % 3, f) for f in range(n % 7)
+                    ],
+                    "squashed": n % 2 == 0,
+                },
+            )
+            for n in range(commits)
+        ),
+        "last_seen_sha": sha(commits - 1),
+        "misc": [0, -1, 2**40, 1.5, None, True, "", "/a//b/", "0123", "x" * 300],
+    }
+
+
+def test_roundtrip():
+    cache = make_cache()
+    data = encode_bot_cache(cache)
+    assert data.startswith("v2:")
+    assert "-->" not in data
+    assert decode_bot_cache(data) == cache
+
+
+def test_delta_is_appended():
+    cache = make_cache()
+    data = encode_bot_cache(cache)
+    assert encode_bot_cache(cache, data) == data
+
+    new_cache = copy.deepcopy(cache)
+    new_cache["emoji"]["2000000000"] = "+1"
+    new_cache["commits"][sha(1)]["squashed"] = True
+    new_cache["last_seen_sha"] = sha(100)
+    del new_cache["signatures"]["core"]
+    new_data = encode_bot_cache(new_cache, data)
+
+    assert new_data.startswith(data + ";")
+    assert len(new_data) - len(data) < 200
+    assert decode_bot_cache(new_data) == new_cache
+
+
+def test_deltas_are_compacted(monkeypatch):
+    monkeypatch.setattr(bot_cache_codec, "BOT_CACHE_MAX_DELTAS", 3)
+    cache = make_cache()
+    data = encode_bot_cache(cache)
+    for n in range(5):
+        cache["emoji"][str(3000000000 + n)] = "+1"
+        data = encode_bot_cache(cache, data)
+        assert decode_bot_cache(data) == cache
+    assert data.count(";") < 3
+
+
+def test_legacy_data_is_rewritten():
+    cache = make_cache()
+    data = encode_bot_cache(cache, "b64:eJyrVkrOz0nNTSxKUbKqViotTi1SqgUATy4HRQ==")
+    assert ";" not in data
+    assert decode_bot_cache(data) == cache
@@ -0,0 +1,38 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from buildLogAnalyzer import LogFileAnalyzer
+from buildLogRules import makeSyntheticLogTree
+
+
+def run_analyzer(topDir, jobs):
+    srcDir = os.path.join(topDir, "src")
+    makeSyntheticLogTree(srcDir, 40, 120, "CMSSW_X_Y_Z")
+    lfa = LogFileAnalyzer(srcDir, "", -1, os.path.join(srcDir, "x"), "CMSSW_X_Y_Z", [], jobs)
+    lfa.analyze()
+    lfa.report()
+    htmlDir = os.path.join(topDir, "html")
+    pages = {}
+    for root, dirs, files in os.walk(htmlDir):
+        for name in files:
+            with open(os.path.join(root, name), "rb") as ref:
+                pages[os.path.relpath(os.path.join(root, name), htmlDir)] = ref.read()
+    # Skip the timings
+    with open(os.path.join(htmlDir, "logAnalysis.pkl"), "rb") as ref:
+        pickle.Unpickler(ref).load()
+        pages["logAnalysis.pkl"] = ref.read()
+    pages["index.html"] = b"".join(
+        l for l in pages["index.html"].splitlines(True) if not l.startswith(b"analyzed ")
+    )
+    return pages
+
+
+def test_jobs_output_is_identical(tmp_path, monkeypatch):
+    monkeypatch.setenv("SCRAM_ARCH", "el9_amd64_gcc12")
+    monkeypatch.chdir(str(tmp_path))
+    serial = run_analyzer(str(tmp_path / "serial"), 1)
+    parallel = run_analyzer(str(tmp_path / "parallel"), 3)
+    assert len(serial) == 42
+    assert serial == parallel
@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from buildLogRules import BuildLogRules, analyzeLinesRegexp, makeSyntheticLogTree
+
+RELEASE = "CMSSW_16_0_X_2025-01-01-2300"
+LINES = [
+    "/usr/bin/ld: cannot find -lfoo\n",
+    "gmake: *** [tmp/el9/src/Sub/Pkg/src/SubPkg/classes_rflx.cpp] Error 1\n",
+    "gmake: *** [tmp/el9/src/Sub/Pkg/src/SubPkg/libSubPkg.so] Error 1\n",
+    "gmake: *** [tmp/el9/src/Sub/Pkg/bin/myExe/main.o] Error 1\n",
+    "gmake: *** [tmp/el9/src/Sub/Pkg/plugins/SubPkgPlugins/lib.so] Error 1\n",
+    "gmake: *** [tmp/el9/src/Other/Pkg/src/OtherPkg/a.o] Error 1\n",
+    "gmake: *** [tmp/el9/src/Other/Pkg/libOtherPkg.so] Error 1\n",
+    "ImportError: No module named foo\n",
+    "/build/%s/src/Sub/Pkg/src/a.cc:10:3: warning: unused variable [-Wunused]\n" % RELEASE,
+    "src/Other/Pkg/src/a.cc:10:3: warning: ignored one\n",
+    "/usr/include/foo.h:1: warning: from external\n",
+    "/build/%s/src/Sub/Pkg/src/a.cc:11:3: error: 'x' was not declared\n" % RELEASE,
+    "tmp/el9/src/Sub/Pkg/src/SubPkg/libSubPkg.so: undefined reference to `foo()'\n",
+    "a.o: more undefined references to `bar()' follow\n",
+    "Warning: something\n",
+    "  >> Compiling src/Sub/Pkg/src/a.cc\n",
+]
+
+
+def test_rules_match_reference(tmp_path):
+    for gcc46 in [False, True]:
+        rules = BuildLogRules(RELEASE, gcc46=gcc46)
+        for ignore in [None, ["ignored"]]:
+            assert rules.analyzeLines(LINES, "Sub", "Pkg", ignore) == analyzeLinesRegexp(
+                LINES, "Sub", "Pkg", RELEASE, gcc46=gcc46, ignoreWarnings=ignore
+            )
+
+    rules = BuildLogRules(RELEASE)
+    for subsys, pkg in makeSyntheticLogTree(str(tmp_path), 30, 100, RELEASE):
+        with open(os.path.join(str(tmp_path), subsys, pkg, "build.log")) as ref:
+            lines = ref.readlines()
+        assert rules.analyzeLines(lines, subsys, pkg) == analyzeLinesRegexp(
+            lines, subsys, pkg, RELEASE
+        )
@@ -0,0 +1,46 @@
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from categories_map import CMSSW_CATEGORIES
+from categories_index import (
+    get_categories_index,
+    get_legacy_categories,
+    load_categories_index,
+)
+
+
+def scan_package_categories(categories, package):
+    return [cat for cat, packages in categories.items() if package in packages]
+
+
+def test_index_matches_scan():
+    index = get_categories_index(CMSSW_CATEGORIES)
+    assert get_categories_index(CMSSW_CATEGORIES) is index
+    for package in set(p for v in CMSSW_CATEGORIES.values() for p in v):
+        assert index.get_package_categories(package) == scan_package_categories(
+            CMSSW_CATEGORIES, package
+        )
+    assert index.get_package_categories("Foo/Bar") == []
+    assert not index.has_package("Foo/Bar")
+
+
+def test_legacy_categories(tmp_path):
+    categories = {"alca": ["A/B", "C/D"], "db": ["C/D"], "upgrade": ["E/F", "A/B"]}
+    utc = datetime.timezone.utc
+    legacy = {"upgrade": datetime.datetime(2025, 10, 10, tzinfo=utc)}
+    assert get_legacy_categories(legacy, datetime.datetime(2025, 1, 1, tzinfo=utc)) == []
+    assert get_legacy_categories(legacy, datetime.datetime(2026, 1, 1, tzinfo=utc)) == ["upgrade"]
+
+    index = get_categories_index(categories, ["upgrade"])
+    assert index.get_package_categories("A/B") == ["alca"]
+    assert index.get_package_categories("C/D") == ["alca", "db"]
+    assert not index.has_package("E/F")
+    assert not index.has_category("upgrade")
+    assert get_categories_index(categories).get_package_categories("A/B") == ["alca", "upgrade"]
+
+    index_file = str(tmp_path / "package2category.json")
+    get_categories_index(categories).dump(index_file)
+    loaded = load_categories_index(index_file).without(["upgrade"])
+    assert loaded.packages == index.packages
@@ -0,0 +1,143 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import process_pr
+from process_pr import (
+    CMSBOT_TECHNICAL_MSG,
+    dump_checkpoint_value,
+    extract_bot_cache,
+    get_comments_checkpoint,
+    get_comments_checkpoint_key,
+    set_comments_checkpoint,
+    write_bot_cache,
+)
+
+BOT = "cmsbuild"
+START = datetime(2024, 1, 1)
+process_pr.setup_logging("INFO")
+
+
+class FakeComment(object):
+    def __init__(self, id, body="", user="someone"):
+        self.id = id
+        self.body = body
+        self.created_at = self.updated_at = START + timedelta(minutes=id)
+        self.viewer = BOT
+        self.viewer_reactions = ["+1"] if body.startswith("+1") else []
+        self.reactions = {"+1": len(self.viewer_reactions)}
+        self.edits = 0
+
+    def edit(self, body):
+        self.body = body
+        self.updated_at += timedelta(days=1)
+        self.edits += 1
+
+    def delete(self):
+        pass
+
+
+class FakeIssue(FakeComment):
+    def create_comment(self, body):
+        raise AssertionError("unexpected new technical comment")
+
+
+def process(all_comments, technical_comments, bot_cache, inputs="inputs"):
+    """
+    Mimics the comments loop of process_pr: returns the state derived from the comments and the
+    number of comments processed
+    """
+    state = {"signed": [], "last": None}
+    key = get_comments_checkpoint_key(
+        dict((k, dump_checkpoint_value(v)) for k, v in state.items()), inputs
+    )
+    comments, checkpoint = get_comments_checkpoint(
+        bot_cache, key, all_comments, technical_comments, "cms-sw/cmssw", BOT
+    )
+    emoji_deps = {}
+    if checkpoint:
+        emoji_deps = checkpoint["emoji"]
+        state = checkpoint["state"]
+    for comment in comments:
+        if comment.body.startswith("+1"):
+            process_pr.has_bot_emoji(bot_cache, comment, "cms-sw/cmssw", BOT, emoji_deps)
+            state["signed"].append(comment)
+            state["last"] = comment.created_at
+    set_comments_checkpoint(bot_cache, key, all_comments, technical_comments, state, emoji_deps)
+    return state, len(comments)
+
+
+def new_bot_cache(technical_comments=None):
+    bot_cache = extract_bot_cache(technical_comments or [])
+    for k, v in process_pr.BOT_CACHE_TEMPLATE.items():
+        bot_cache.setdefault(k, type(v)())
+    return bot_cache
+
+
+def make_comments():
+    issue = FakeIssue(0, "PR description")
+    technical = FakeComment(2, CMSBOT_TECHNICAL_MSG, BOT)
+    return issue, technical, [issue, FakeComment(1, "+1"), technical, FakeComment(3, "hello")]
+
+
+def test_checkpoint_hit_and_no_rewrite():
+    issue, technical, all_comments = make_comments()
+    bot_cache = new_bot_cache()
+    state, count = process(all_comments, [technical], bot_cache)
+    assert (count, [c.id for c in state["signed"]]) == (4, [1])
+    write_bot_cache(bot_cache, [technical], issue, False)
+    assert technical.edits == 1
+
+    # new comment: only it is processed, the technical comment was edited by the bot
+    all_comments.append(FakeComment(4, "+1 again"))
+    bot_cache = new_bot_cache([technical])
+    state, count = process(all_comments, [technical], bot_cache)
+    assert (count, [c.id for c in state["signed"]]) == (1, [1, 4])
+    assert state["last"] == all_comments[-1].created_at
+    write_bot_cache(bot_cache, [technical], issue, False)
+    assert technical.edits == 2
+
+    # no new comments: the checkpoint is used and the bot cache is not rewritten
+    bot_cache = new_bot_cache([technical])
+    state, count = process(all_comments, [technical], bot_cache)
+    assert (count, [c.id for c in state["signed"]]) == (0, [1, 4])
+    write_bot_cache(bot_cache, [technical], issue, False)
+    assert technical.edits == 2
+
+
+def run_twice(change, inputs="inputs"):
+    issue, technical, all_comments = make_comments()
+    bot_cache = new_bot_cache()
+    process(all_comments, [technical], bot_cache)
+    change(all_comments)
+    return process(all_comments, [technical], bot_cache, inputs)
+
+
+def test_checkpoint_fallback_after_edit():
+    def edit(all_comments):
+        all_comments[3].updated_at += timedelta(hours=1)
+
+    assert run_twice(edit)[1] == 4
+
+
+def test_checkpoint_fallback_after_delete():
+    def delete(all_comments):
+        del all_comments[1]
+
+    state, count = run_twice(delete)
+    assert (count, state["signed"]) == (3, [])
+
+
+def test_checkpoint_fallback_after_emoji_change():
+    def unreact(all_comments):
+        # the bot reaction was changed from +1 to -1
+        all_comments[1].viewer_reactions = ["-1"]
+        all_comments[1].reactions = {"+1": 0, "-1": 1}
+
+    assert run_twice(unreact)[1] == 4
+
+
+def test_checkpoint_fallback_after_input_change():
+    assert run_twice(lambda all_comments: None, "new inputs")[1] == 4
+    assert run_twice(lambda all_comments: None)[1] == 0
@@ -0,0 +1,87 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import diff_files
+from diff_files import DiffFetchError, fetch_diff_files, parse_diff_files
+
+DIFF = b"""diff --git a/Pkg/Sub/src/a.cc b/Pkg/Sub/src/a.cc
+index 1111111..2222222 100644
+--- a/Pkg/Sub/src/a.cc
++++ b/Pkg/Sub/src/a.cc
+@@ -1,3 +1,3 @@
+-diff --git a/not/a/file b/not/a/file
++--- a/not/a/file
+ context
+diff --git a/Pkg/Old/x.py b/Pkg/New/x.py
+similarity index 90%
+rename from Pkg/Old/x.py
+rename to Pkg/New/x.py
+diff --git a/Pkg/Sub/with space b/Pkg/Sub/with space
+new file mode 100644
+--- /dev/null
++++ b/Pkg/Sub/with space
+@@ -0,0 +1 @@
++rename from not/a/file
+diff --git "a/Pkg/Sub/caf\\303\\251" "b/Pkg/Sub/caf\\303\\251"
+deleted file mode 100644
+Binary files "a/Pkg/Sub/caf\\303\\251" and /dev/null differ
+"""
+
+FILES = [
+    "Pkg/New/x.py",
+    "Pkg/Old/x.py",
+    "Pkg/Sub/café",
+    "Pkg/Sub/src/a.cc",
+    "Pkg/Sub/with space",
+]
+
+
+def test_parse_diff_files():
+    assert sorted(set(parse_diff_files(io.BytesIO(DIFF)))) == FILES
+    text = io.StringIO(DIFF.decode("utf-8"))
+    assert sorted(set(parse_diff_files(text))) == FILES
+
+
+def test_fetch_diff_files(monkeypatch, tmp_path):
+    calls = []
+
+    def stream_diff_files(diff_url):
+        calls.append(diff_url)
+        if len(calls) < 3 or diff_url == "bad":
+            raise IOError("timeout")
+        return sorted(set(parse_diff_files(io.BytesIO(DIFF))))
+
+    monkeypatch.setattr(diff_files, "stream_diff_files", stream_diff_files)
+    monkeypatch.setattr(diff_files, "sleep", lambda s: None)
+    monkeypatch.setattr(diff_files, "DIFF_FILES_CACHE_DIR", str(tmp_path))
+    assert fetch_diff_files("url", head_sha="ab" * 20, retries=3) == FILES
+    assert len(calls) == 3
+    assert fetch_diff_files("url", head_sha="ab" * 20) == FILES
+    assert len(calls) == 3
+
+    with pytest.raises(DiffFetchError):
+        fetch_diff_files("bad", head_sha="cd" * 20, retries=1)
+    assert len(calls) == 5
+
+
+def test_diff_files_cache_prune(monkeypatch, tmp_path):
+    monkeypatch.setattr(diff_files, "DIFF_FILES_CACHE_DIR", str(tmp_path))
+    old_sha, used_sha, new_sha = "ab" + "1" * 38, "ab" + "2" * 38, "ab" + "3" * 38
+    for sha in [old_sha, used_sha]:
+        diff_files.write_diff_files_cache(sha, FILES)
+        old_time = os.stat(diff_files._cache_file(sha)).st_mtime - 31 * 86400
+        os.utime(diff_files._cache_file(sha), (old_time, old_time))
+    assert diff_files.read_diff_files_cache(used_sha) == FILES
+    diff_files.write_diff_files_cache(new_sha, FILES)
+    assert sorted(os.listdir(str(tmp_path / "ab"))) == [used_sha + ".json", new_sha + ".json"]
+
+
+def test_diff_files_cache_default_dir():
+    if "CMS_DIFF_FILES_CACHE_DIR" not in os.environ:
+        assert diff_files.DIFF_FILES_CACHE_DIR == os.path.join(
+            os.path.expanduser("~"), ".cache", "cms-bot", "diff-files"
+        )
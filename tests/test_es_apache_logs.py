@@ -0,0 +1,58 @@
+import os
+import sys
+from json import loads
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import es_apache_logs
+from es_apache_logs import add_forwarded_agent, apache_log_docs, parse_apache_line
+
+LINES = [
+    '1.2.3.4 - - [18/Oct/2026:10:00:00 +0200] "GET /SDT/a.html HTTP/1.1" 200 512 "-" "curl/8"',
+    '1.2.3.4 - - [18/Oct/2026:10:00:01 +0200] "GET /b HTTP/1.1" 404 - "ref" "10.0.0.1" x y',
+    '1.2.3.4 - - [18/Oct/2026:10:00:01 +0200] "GET /b HTTP/1.1" 200 1 "-" "www.bing.com"',
+    "1.2.3.4 - - [18/Oct/2026:10:00:01 +0200] short",
+    "not a log line",
+]
+
+
+def make_docs(items, payload, week):
+    return [("apache-test-" + week, add_forwarded_agent(payload, items))]
+
+
+def test_parse_apache_line():
+    for line in LINES[:3]:
+        items = line.split(" ")
+        items[3] = items[3][1:]
+        assert parse_apache_line(line) == items
+    for line in LINES[3:]:
+        assert parse_apache_line(line) is None
+
+
+def test_apache_log_docs():
+    docs = apache_log_docs(LINES, make_docs)
+    assert [d[0] for d in docs] == ["apache-test-2964"] * 2
+    payload = loads(docs[1][2])
+    assert payload["ip"] == "10.0.0.1"
+    assert payload["bytes"] == 0
+    assert payload["agent"] == "x y"
+    assert payload["@timestamp"] == loads(docs[0][2])["@timestamp"] + 1000
+
+
+def test_process_apache_logs(tmp_path, monkeypatch):
+    log = str(tmp_path / "access_log")
+    with open(log, "w") as ref:
+        ref.write("\n".join(LINES * 3) + "\n")
+    sent = []
+    monkeypatch.setattr(es_apache_logs, "send_bulk", lambda docs: sent.append(docs) or True)
+    assert es_apache_logs.process_apache_logs([log], make_docs, "test", str(tmp_path), 4) == (
+        True,
+        15,
+    )
+    assert [len(docs) for docs in sent] == [2, 2, 2, 0]
+    monkeypatch.setattr(es_apache_logs, "send_bulk", lambda docs: False)
+    with open(log, "a") as ref:
+        ref.write(LINES[0] + "\n")
+    assert es_apache_logs.process_apache_logs([log], make_docs, "test", str(tmp_path)) == (
+        False,
+        0,
+    )
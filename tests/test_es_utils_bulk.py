@@ -0,0 +1,61 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import es_utils
+from es_utils import BulkSender, send_bulk, send_payload
+
+
+def test_bulk_sender_flush(monkeypatch):
+    sent = []
+    monkeypatch.setattr(es_utils, "send_bulk", lambda docs, passwd_file: sent.append(docs) or True)
+    monkeypatch.setattr(es_utils, "send_request", lambda *args, **kwds: False)
+    monkeypatch.delenv("CMS_ES_CACHE_DIR", raising=False)
+    with BulkSender(max_docs=2, max_bytes=100) as bulk:
+        for i in range(3):
+            assert send_payload("test", "_doc", "id%s" % i, "{}")
+        assert len(sent) == 1
+        assert bulk.add("big", None, "x" * 100)
+        assert len(sent) == 2
+        send_payload("test", "_doc", "id3", "{}", passwd_file="other")
+    assert sent == [
+        [("cmssdt-test", "id0", "{}"), ("cmssdt-test", "id1", "{}")],
+        [("cmssdt-test", "id2", "{}"), ("big", None, "x" * 100)],
+    ]
+    assert bulk.ok
+    assert not es_utils.BULK_SENDERS
+    assert not send_payload("test", "_doc", "id4", "{}")
+
+
+def test_send_bulk_retries_and_spools(monkeypatch, tmp_path):
+    calls = []
+
+    def send_bulk_request(docs, passwd_file, es_ser):
+        calls.append((es_ser, [doc[1] for doc in docs]))
+        if len(calls) <= 2:
+            return [docs[0] + ("busy", True), docs[1] + ("mapping", False)]
+        return []
+
+    monkeypatch.setattr(es_utils, "send_bulk_request", send_bulk_request)
+    monkeypatch.setattr(es_utils, "ES_NEW_SERVER", "new")
+    monkeypatch.setenv("CMS_ES_CACHE_DIR", str(tmp_path))
+    docs = [("test", "aa1", "{}"), ("test", "bb2", "{}"), ("test", "cc3", "{}")]
+    assert send_bulk(docs, backoff=0)
+    assert sorted(calls) == sorted(
+        [(es_utils.ES_SERVER, ["aa1", "bb2", "cc3"]), ("new", ["aa1", "bb2", "cc3"])]
+        + [(es_utils.ES_SERVER, ["aa1"]), ("new", ["aa1"])]
+    )
+    assert os.listdir(str(tmp_path)) == ["bb"]
+    monkeypatch.setenv("CMS_ES_CACHE_DIR", "")
+    calls[:] = []
+    assert not send_bulk(docs, backoff=0)
+
+
+def test_send_bulk_server_last_attempt(monkeypatch):
+    def send_bulk_request(docs, passwd_file, es_ser):
+        return [docs[0] + ("busy", True), docs[1] + ("mapping", False)]
+
+    monkeypatch.setattr(es_utils, "send_bulk_request", send_bulk_request)
+    docs = [("test", "aa1", "{}"), ("test", "bb2", "{}")]
+    failed = es_utils.send_bulk_server(docs, None, "es", 0, 0)
+    assert failed == [docs[1] + ("mapping", False), docs[0] + ("busy", True)]
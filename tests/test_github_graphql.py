@@ -0,0 +1,163 @@
+import os
+import sys
+
+import github
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import github_graphql
+
+
+def comment_node(comment_id, login, body, reactions=None, viewer_reacted=()):
+    return {
+        "databaseId": comment_id,
+        "body": body,
+        "createdAt": "2024-05-01T10:00:%02dZ" % (comment_id % 60),
+        "updatedAt": "2024-05-01T10:00:%02dZ" % (comment_id % 60),
+        "url": "https://github.com/cms-sw/cmssw/pull/1#issuecomment-%s" % comment_id,
+        "author": {"login": login} if login else None,
+        "reactionGroups": [
+            {
+                "content": content,
+                "viewerHasReacted": content in viewer_reacted,
+                "reactors": {"totalCount": count},
+            }
+            for content, count in (reactions or {}).items()
+        ],
+    }
+
+
+def commit_node(sha, parents, date):
+    actor = {"name": "Some One", "email": "some.one@cern.ch", "date": date}
+    return {
+        "commit": {
+            "oid": sha,
+            "message": "Commit %s" % sha,
+            "author": actor,
+            "committer": actor,
+            "parents": {"nodes": [{"oid": p} for p in parents]},
+        }
+    }
+
+
+class StubRequester(object):
+    """Answers GraphQL queries from canned responses, in order"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.queries = []
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None, input=None):
+        assert verb == "POST"
+        assert url == "https://api.github.com/graphql"
+        self.queries.append(input)
+        return {}, self.responses.pop(0)
+
+
+def make_gh(responses):
+    gh = github.Github()
+    stub = StubRequester(responses)
+    gh._Github__requester = stub
+    return gh, stub
+
+
+def page(nodes, cursor=None):
+    return {
+        "totalCount": 3,
+        "pageInfo": {"hasNextPage": cursor is not None, "endCursor": cursor},
+        "nodes": nodes,
+    }
+
+
+def test_pr_snapshot():
+    first = {
+        "data": {
+            "viewer": {"login": "cmsbuild"},
+            "repository": {
+                "pullRequest": {
+                    "commits": {
+                        "totalCount": 2,
+                        "nodes": [
+                            commit_node("a" * 40, ["0" * 40], "2024-05-01T09:00:00Z"),
+                            commit_node("b" * 40, ["a" * 40, "c" * 40], "2024-05-01T09:30:00Z"),
+                        ],
+                    },
+                    "head": {
+                        "nodes": [
+                            {
+                                "commit": {
+                                    "oid": "b" * 40,
+                                    "status": {
+                                        "contexts": [
+                                            {
+                                                "context": "cms/code-checks",
+                                                "state": "SUCCESS",
+                                                "description": "Finished",
+                                                "targetUrl": "https://cmssdt.cern.ch/x",
+                                                "createdAt": "2024-05-01T09:45:00Z",
+                                            }
+                                        ]
+                                    },
+                                }
+                            }
+                        ]
+                    },
+                    "comments": page(
+                        [
+                            comment_node(
+                                11,
+                                "someone",
+                                "+1",
+                                {"THUMBS_UP": 2, "EYES": 1},
+                                viewer_reacted=("THUMBS_UP",),
+                            ),
+                            comment_node(12, None, "hold"),
+                        ],
+                        cursor="c12",
+                    ),
+                }
+            },
+        }
+    }
+    second = {
+        "data": {
+            "repository": {
+                "pullRequest": {"comments": page([comment_node(13, "cmsbuild", "test")])}
+            }
+        }
+    }
+    gh, stub = make_gh([first, second])
+
+    snapshot = github_graphql.load_pr_snapshot(gh, "cms-sw/cmssw", 1)
+
+    assert len(stub.queries) == 2
+    assert stub.queries[1]["variables"]["after"] == "c12"
+
+    assert [c.sha for c in snapshot.commits] == ["b" * 40, "a" * 40]
+    assert len(snapshot.commits[0].parents) == 2
+    assert snapshot.commits[1].commit.committer.date.hour == 9
+
+    statuses = snapshot.get_statuses("b" * 40)
+    assert [(s.context, s.state) for s in statuses] == [("cms/code-checks", "success")]
+    assert snapshot.get_statuses("a" * 40) is None
+
+    comments = snapshot.comments
+    assert [c.id for c in comments] == [11, 12, 13]
+    assert comments[0].user.login == "someone"
+    assert comments[0].reactions["+1"] == 2
+    assert comments[0].reactions["eyes"] == 1
+    assert comments[0].reactions["total_count"] == 3
+    assert comments[0].viewer == "cmsbuild"
+    assert comments[0].viewer_reactions == ["+1"]
+    assert comments[0].url == "https://api.github.com/repos/cms-sw/cmssw/issues/comments/11"
+    assert comments[1].user.login == "ghost"
+    assert comments[2].body == "test"
+
+
+def test_graphql_errors():
+    gh, _ = make_gh([{"errors": [{"message": "Something went wrong"}]}])
+    try:
+        github_graphql.load_pr_snapshot(gh, "cms-sw/cmssw", 1)
+    except github_graphql.GraphQLError as e:
+        assert "Something went wrong" in str(e)
+    else:
+        assert False, "GraphQLError not raised"
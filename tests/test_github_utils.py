@@ -0,0 +1,164 @@
+import email.message
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import github_utils
+from _py2with3compatibility import HTTPError
+
+RATE_LIMIT_HEADERS = {
+    "X-RateLimit-Remaining": "4000",
+    "X-RateLimit-Limit": "5000",
+    "X-RateLimit-Reset": "9999999999",
+}
+
+
+def make_headers(extra=None):
+    msg = email.message.Message()
+    for k, v in RATE_LIMIT_HEADERS.items():
+        msg[k] = v
+    for k, v in (extra or {}).items():
+        msg[k] = v
+    return msg
+
+
+class FakeResponse(object):
+    def __init__(self, body, headers, status=200):
+        self.status = status
+        self.headers = headers
+        self.body = json.dumps(body).encode()
+
+    def read(self):
+        return self.body
+
+
+class FakeGitHub(object):
+    """Answers GET requests from a dict of url -> (etag, body)"""
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.links = {}
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        etag, body = self.resources[request.full_url]
+        if request.get_header("If-none-match") == etag:
+            raise HTTPError(request.full_url, 304, "Not Modified", make_headers(), None)
+        headers = {"ETag": etag}
+        if request.full_url in self.links:
+            headers["Link"] = self.links[request.full_url]
+        return FakeResponse(body, make_headers(headers))
+
+
+@pytest.fixture
+def github(monkeypatch, tmp_path):
+    monkeypatch.setattr(github_utils, "GH_TOKENS", ["dummy"])
+    monkeypatch.setattr(github_utils, "GH_TOKEN_INDEX", 0)
+    monkeypatch.setattr(github_utils, "GH_API_CACHE_MAX_SIZE", github_utils.GH_API_CACHE_MAX_SIZE)
+    monkeypatch.setattr(
+        github_utils, "GH_API_CACHE_STATS", dict.fromkeys(github_utils.GH_API_CACHE_STATS, 0)
+    )
+    github_utils.set_github_api_cache(str(tmp_path / "cache"))
+    fake = FakeGitHub({})
+    monkeypatch.setattr(github_utils, "urlopen", fake)
+    yield fake
+    github_utils.set_github_api_cache("")
+
+
+def test_conditional_request_replays_cached_body(github):
+    url = "https://api.github.com/repos/cms-sw/cmssw/labels?per_page=100"
+    github.resources[url] = ('"etag-1"', [{"name": "orp-approved"}])
+
+    assert github_utils.github_api("/repos/cms-sw/cmssw/labels", method="GET") == [
+        {"name": "orp-approved"}
+    ]
+    assert github_utils.github_api("/repos/cms-sw/cmssw/labels", method="GET") == [
+        {"name": "orp-approved"}
+    ]
+
+    assert github.requests[0].get_header("If-none-match") is None
+    assert github.requests[1].get_header("If-none-match") == '"etag-1"'
+    stats = github_utils.get_github_api_cache_stats()
+    assert stats["miss"] == 1
+    assert stats["hit"] == 1
+    assert stats["not_modified"] == 1
+
+
+def test_changed_resource_updates_cache(github):
+    url = "https://api.github.com/repos/cms-sw/cmssw/labels?per_page=100"
+    github.resources[url] = ('"etag-1"', [{"name": "old"}])
+    github_utils.github_api("/repos/cms-sw/cmssw/labels", method="GET")
+    github.resources[url] = ('"etag-2"', [{"name": "new"}])
+
+    assert github_utils.github_api("/repos/cms-sw/cmssw/labels", method="GET") == [{"name": "new"}]
+    assert github_utils.github_api("/repos/cms-sw/cmssw/labels", method="GET") == [{"name": "new"}]
+    assert github_utils.get_github_api_cache_stats()["not_modified"] == 1
+
+
+def test_cache_size_is_bounded(github):
+    github_utils.set_github_api_cache(github_utils.GH_API_CACHE_DIR, max_size=2048)
+    for n in range(20):
+        url = "https://api.github.com/repos/cms-sw/cmssw/issues/%s?per_page=100" % n
+        github.resources[url] = ('"etag-%s"' % n, {"body": "x" * 200})
+        github_utils.github_api("/repos/cms-sw/cmssw/issues/%s" % n, method="GET")
+
+    assert github_utils.get_github_api_cache_stats()["evict"] > 0
+    assert github_utils._gh_api_cache_size() <= 2048
+
+
+def add_paginated_resource(github, uri, pages):
+    base = "https://api.github.com%s?per_page=100" % uri
+    last = '<%s&page=%s>; rel="last"' % (base, pages)
+    for n in range(1, pages + 1):
+        url = base if n == 1 else "%s&page=%s" % (base, n)
+        github.resources[url] = ('"etag-%s"' % n, [{"page": n}])
+    github.links[base] = '<%s&page=2>; rel="next", %s' % (base, last)
+
+
+def test_pages_are_merged_in_order(github, monkeypatch):
+    monkeypatch.setattr(github_utils, "GH_API_PAGE_THREADS", 4)
+    add_paginated_resource(github, "/orgs/cms-sw/repos", 9)
+
+    data = github_utils.github_api("/orgs/cms-sw/repos", method="GET")
+
+    assert [d["page"] for d in data] == list(range(1, 10))
+    assert github_utils.get_page_range() == list(range(2, 10))
+
+
+def test_max_pages_limits_fetched_pages(github):
+    add_paginated_resource(github, "/orgs/cms-sw/repos", 9)
+
+    data = github_utils.github_api("/orgs/cms-sw/repos", method="GET", max_pages=3)
+
+    assert [d["page"] for d in data] == [1, 2, 3]
+    assert len(github.requests) == 3
+
+
+def test_binary_response_is_not_cached(github, monkeypatch):
+    url = "https://api.github.com/repos/cms-sw/cmssw/tarball"
+    response = FakeResponse(None, make_headers({"ETag": '"etag-1"'}))
+    response.body = b"\x1f\x8b\xff\xfe"
+    monkeypatch.setattr(github_utils, "urlopen", lambda request: response)
+
+    status, headers, content = github_utils._github_api_request(url, None, {}, "GET")
+
+    assert (status, content) == (200, b"\x1f\x8b\xff\xfe")
+    assert github_utils.get_github_api_cache_stats()["store"] == 0
+
+
+def test_default_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("CMS_GH_API_CACHE_DIR", raising=False)
+    try:
+        github_utils.set_default_github_api_cache()
+        assert github_utils.GH_API_CACHE_DIR == str(tmp_path / ".cache" / "cms-bot" / "github-api")
+        github_utils.set_github_api_cache("")
+        monkeypatch.setenv("CMS_GH_API_CACHE_DIR", "")
+        github_utils.set_default_github_api_cache()
+        assert github_utils.GH_API_CACHE_DIR == ""
+    finally:
+        github_utils.set_github_api_cache("")
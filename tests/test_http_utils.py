@@ -0,0 +1,147 @@
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import http_utils
+from http_utils import HTTPConnectionPool
+
+try:
+    from http.client import RemoteDisconnected
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    pass
+
+
+class FakeResponse(object):
+    def __init__(self, will_close=False):
+        self.status = 200
+        self.reason = "OK"
+        self.msg = {}
+        self.will_close = will_close
+
+    def read(self):
+        return b"ok"
+
+
+class FakeConnection(object):
+    """Fails with send_error in request() or with recv_error in getresponse()"""
+
+    def __init__(self, send_error=None, recv_error=None, will_close=False):
+        self.send_error = send_error
+        self.recv_error = recv_error
+        self.will_close = will_close
+        self.requests = []
+        self.closed = False
+
+    def request(self, method, path, body=None, headers=None):
+        self.requests.append(method)
+        if self.send_error:
+            raise self.send_error
+
+    def getresponse(self):
+        if self.recv_error:
+            raise self.recv_error
+        return FakeResponse(self.will_close)
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(monkeypatch, idle, new):
+    pool = HTTPConnectionPool("https", "example.com", 443)
+    pool.idle = list(idle)
+    new = list(new)
+    monkeypatch.setattr(pool, "_new_connection", lambda: new.pop(0))
+    return pool
+
+
+@pytest.mark.parametrize(
+    "method,send_error,recv_error",
+    [
+        ("POST", BrokenPipeError(), None),
+        ("POST", ConnectionResetError(), None),
+        ("POST", None, RemoteDisconnected("closed")),
+        ("GET", None, ConnectionResetError()),
+    ],
+)
+def test_stale_connection_is_retried(monkeypatch, method, send_error, recv_error):
+    stale = FakeConnection(send_error, recv_error)
+    fresh = FakeConnection()
+    pool = make_pool(monkeypatch, [stale], [fresh])
+    assert pool.request(method, "/") == (200, "OK", {}, b"ok")
+    assert (stale.requests, stale.closed) == ([method], True)
+    assert fresh.requests == [method]
+    assert pool.idle == [fresh]
+
+
+@pytest.mark.parametrize(
+    "method,recv_error",
+    [
+        ("POST", socket.timeout()),
+        ("GET", socket.timeout()),
+        ("PATCH", ConnectionResetError()),
+    ],
+)
+def test_sent_request_is_not_retried(monkeypatch, method, recv_error):
+    stale = FakeConnection(recv_error=recv_error)
+    fresh = FakeConnection()
+    pool = make_pool(monkeypatch, [stale], [fresh])
+    with pytest.raises(type(recv_error)):
+        pool.request(method, "/")
+    assert fresh.requests == []
+    assert pool.idle == []
+
+
+def test_new_connection_is_not_retried(monkeypatch):
+    conn = FakeConnection(send_error=BrokenPipeError())
+    pool = make_pool(monkeypatch, [], [conn, FakeConnection()])
+    with pytest.raises(BrokenPipeError):
+        pool.request("GET", "/")
+    assert conn.closed
+
+
+def test_will_close_connection_is_not_reused(monkeypatch):
+    conn = FakeConnection(will_close=True)
+    pool = make_pool(monkeypatch, [], [conn])
+    pool.request("GET", "/")
+    assert conn.closed and pool.idle == []
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        if self.path == "/close":
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_urlopen_reuses_connections(monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thrd = threading.Thread(target=server.serve_forever)
+    thrd.daemon = True
+    thrd.start()
+    monkeypatch.setattr(http_utils, "HTTP_POOLS", {})
+    monkeypatch.setattr(http_utils, "_use_proxy", lambda host: False)
+    url = "http://127.0.0.1:%s" % server.server_address[1]
+    try:
+        for path in ["/a", "/b", "/close", "/c"]:
+            assert http_utils.urlopen(url + path).read() == path.encode()
+        stats = http_utils.get_http_pool_stats()["127.0.0.1"]
+        assert (stats["requests"], stats["connections"], stats["reused"]) == (4, 2, 2)
+        assert stats["reuse_ratio"] == 0.5
+    finally:
+        http_utils.close_http_pools()
+        server.shutdown()
+        server.server_close()
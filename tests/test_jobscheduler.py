@@ -0,0 +1,193 @@
+import json
+import os
+import sys
+from copy import deepcopy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "jobs"))
+import jobscheduler
+
+JOBS = {
+    "env": {},
+    "jobs": [
+        {
+            "name": "wf%s" % g,
+            "commands": [
+                {"command": "true", "cpu": 100 * (1 + (g + c) % 3), "rss": 1 + g % 4, "time": t}
+                for c, t in enumerate([30 + 7 * g, 10 + g % 5, 50][: 1 + g % 3])
+            ],
+        }
+        for g in range(12)
+    ],
+}
+
+
+def simulate(scheduler, order, tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setattr(jobscheduler, "simulation", True, raising=False)
+    monkeypatch.setattr(jobscheduler, "simulation_time", 0, raising=False)
+    resources = {
+        "total": {"cpu": 600, "rss": 8, "gpu": []},
+        "total_groups": 0,
+        "total_jobs": 0,
+        "done_groups": 0,
+        "done_jobs": 0,
+        "decisions": 0,
+    }
+    jobs = jobscheduler.initJobs(deepcopy(JOBS), resources, "")
+    if scheduler == "polling":
+        jobscheduler.runPolling(jobs, resources, order, 4)
+    else:
+        jobscheduler.EventScheduler(jobs, resources, order, 4).run()
+    assert resources["done_jobs"] == resources["total_jobs"]
+    times = {}
+    for group in jobs["jobs"]:
+        with open(str(tmp_path / (group["name"] + "-results.json"))) as ref:
+            for job in json.load(ref)["commands"]:
+                times[job["jobid"]] = (job["start_time"], job["end_time"])
+    return jobscheduler.gettime(), times
+
+
+def test_event_scheduler_matches_polling(tmp_path, monkeypatch):
+    for order in ["dynamic", "time"]:
+        event = simulate("event", order, tmp_path, monkeypatch)
+        assert event == simulate("polling", order, tmp_path, monkeypatch)
+        assert len(event[1]) == 24
+
+
+def test_event_scheduler_runs_jobs(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setattr(jobscheduler, "simulation", False, raising=False)
+    resources = {
+        "total": {"cpu": 200, "rss": 8, "gpu": []},
+        "total_groups": 0,
+        "total_jobs": 0,
+        "done_groups": 0,
+        "done_jobs": 0,
+        "decisions": 0,
+    }
+    jobs = deepcopy(JOBS)
+    jobs["jobs"] = jobs["jobs"][1:3]
+    jobs["jobs"][0]["commands"][0]["command"] = "exit 1"
+    jobs = jobscheduler.initJobs(jobs, resources, "")
+    jobscheduler.EventScheduler(jobs, resources, "time", 2).run()
+    assert [j["state"] for j in jobs["jobs"][0]["commands"]] == ["Done", "Pending"]
+    assert [j["exit_code"] for j in jobs["jobs"][1]["commands"]] == [0, 0, 0]
+    assert resources["done_groups"] == 2
+
+
+def test_critical_path_backfilling(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setattr(jobscheduler, "simulation", True, raising=False)
+    monkeypatch.setattr(jobscheduler, "simulation_time", 0, raising=False)
+    commands = {
+        "a": [(300, 600)],
+        "head": [(400, 500)],
+        "long": [(100, 450)],
+        "short": [(100, 200)],
+    }
+    jobs = {"env": {}, "jobs": []}
+    for name, cmds in commands.items():
+        jobs["jobs"].append(
+            {
+                "name": name,
+                "commands": [{"command": "true", "cpu": c, "rss": 1, "time": t} for c, t in cmds],
+            }
+        )
+    starts = {}
+    for order in ["time", "critical", "pack"]:
+        resources = {
+            "total": {"cpu": 400, "rss": 8, "gpu": []},
+            "total_groups": 0,
+            "total_jobs": 0,
+            "done_groups": 0,
+            "done_jobs": 0,
+            "decisions": 0,
+        }
+        xjobs = jobscheduler.initJobs(deepcopy(jobs), resources, "")
+        jobscheduler.simulation_time = 0
+        jobscheduler.EventScheduler(xjobs, resources, order, 10).run()
+        assert resources["done_jobs"] == resources["total_jobs"]
+        starts[order] = dict([(g["name"], g["commands"][0]["start_time"]) for g in xjobs["jobs"]])
+    # head is reserved at the end of a (and of its final command): short does not start
+    # after long as it would delay head, as with the greedy time order
+    assert starts["time"] == {"a": 0, "head": 670, "long": 0, "short": 460}
+    assert starts["critical"] == {"a": 0, "head": 610, "long": 0, "short": 1110}
+    assert starts["pack"] == starts["critical"]
+
+
+def test_telemetry_reclaims_and_pauses(tmp_path, monkeypatch):
+    import socket
+
+    monkeypatch.setattr(jobscheduler, "TELEMETRY_WARMUP", 0)
+    monkeypatch.setattr(jobscheduler, "nodeMemoryUsed", lambda: 0)
+    resources = {"total": {"cpu": 400, "rss": 100, "gpu": []}}
+    resources["available"] = {"cpu": 200, "rss": 40, "gpu": []}
+    job = {"jobid": "wf-1of1", "cpu": 200, "rss": 60}
+    path = str(tmp_path / "telemetry.sock")
+    telemetry = jobscheduler.JobTelemetry(path, resources, {"FOO": "bar"})
+    try:
+        telemetry.start(job)
+        env = telemetry.jobEnv(job)
+        assert (env["FOO"], env["CMS_JOBSCHEDULER_JOBID"]) == ("bar", "wf-1of1")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        for pid, rss, cpu in [(1, 10, 50), (2, 10, 50), (1, 20, 30), ("x", "y", 0)]:
+            sample = {"jobid": job["jobid"], "pid": pid, "rss": rss, "cpu": cpu, "time": 1}
+            sock.sendto(json.dumps(sample).encode(), path)
+        sock.sendto(b'{"jobid": "unknown", "pid": 1, "rss": 1, "cpu": 1}', path)
+        telemetry.wait(1)
+        assert telemetry.read() == 1
+        telemetry.adjust([job])
+        # peak rss 30 and cpu 80, with the 1.25 margin
+        assert resources["available"] == {"cpu": 300, "rss": 63, "gpu": []}
+        assert not telemetry.pause
+        sock.sendto(
+            json.dumps({"jobid": job["jobid"], "pid": 2, "rss": 80, "cpu": 50}).encode(), path
+        )
+        telemetry.read()
+        telemetry.adjust([job])
+        assert resources["available"] == {"cpu": 300, "rss": 40, "gpu": []}
+        assert telemetry.pause
+        telemetry.release(job)
+        assert resources["available"] == {"cpu": 200, "rss": 40, "gpu": []}
+    finally:
+        telemetry.close()
+    assert not os.path.exists(path)
+
+
+def test_telemetry_drops_finished_steps(tmp_path, monkeypatch):
+    import socket
+
+    monkeypatch.setattr(jobscheduler, "TELEMETRY_WARMUP", 0)
+    monkeypatch.setattr(jobscheduler, "nodeMemoryUsed", lambda: 0)
+    resources = {"total": {"cpu": 400, "rss": 100, "gpu": []}}
+    resources["available"] = {"cpu": 200, "rss": 40, "gpu": []}
+    job = {"jobid": "wf-1of1", "cpu": 200, "rss": 60}
+    path = str(tmp_path / "telemetry.sock")
+    telemetry = jobscheduler.JobTelemetry(path, resources, {})
+    try:
+        telemetry.start(job)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # step1 (pid 1) is done, then step2 (pid 2) runs
+        for samples in [
+            [{"pid": 1, "rss": 30, "cpu": 100}],
+            [{"pid": 1, "done": True}, {"pid": 2, "rss": 20, "cpu": 100}],
+        ]:
+            for sample in samples:
+                sample["jobid"] = job["jobid"]
+                sock.sendto(json.dumps(sample).encode(), path)
+            telemetry.wait(1)
+            telemetry.read()
+        data = telemetry.jobs[job["jobid"]]
+        assert list(data["pids"]) == [2]
+        assert (data["peak"], data["history"][-1][1]) == (30, 20)
+        # step3 (pid 3) starts while the monitor of step2 died without its done message
+        data["pids"][2] = (20, 100, data["pids"][2][2] - jobscheduler.TELEMETRY_STALE - 1)
+        sock.sendto(
+            json.dumps({"jobid": job["jobid"], "pid": 3, "rss": 25, "cpu": 50}).encode(), path
+        )
+        telemetry.read()
+        assert list(data["pids"]) == [3]
+        assert (data["peak"], data["history"][-1][1:]) == (30, (25, 50))
+    finally:
+        telemetry.close()
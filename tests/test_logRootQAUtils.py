@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import logRootQAUtils
+from logRootQAUtils import compareCommonLogs, compareLogs, filterLine, getRelevantDiff
+
+
+def test_filter_line():
+    assert filterLine("  at 2024-05-01 10:00:00.123 done\n") == "at DATETIME done"
+    assert filterLine("%MSG 01-Jan-2024 10:00:00 CET\n") == "%MSG DATETIME CET"
+    assert filterLine("Begin processing the 1st record on stream 3\n") == (
+        "Begin processing the 1st record on stream N"
+    )
+    assert filterLine("Closed file root://eos//store/a.root\n") is None
+    assert filterLine("Closed file /tmp/a.root\n") == "Closed file /tmp/a.root"
+    # All the characters of a plain string filter
+    assert filterLine("Report: my Memory\n") is None
+
+
+def write_log(path, lines):
+    with open(str(path), "w") as ref:
+        ref.write("".join(l + "\n" for l in lines))
+
+
+def test_compare_logs(tmp_path):
+    for d in ["base", "test"]:
+        os.makedirs(str(tmp_path / d / "1.0_WF"))
+    write_log(tmp_path / "base" / "1.0_WF" / "step1.log", ["a", "b", "b", "old 1", "old 2"])
+    write_log(
+        tmp_path / "test" / "1.0_WF" / "step1.log",
+        ["a"] + ["new %s" % i for i in range(30, 0, -1)] + ["new 1", "b"],
+    )
+    base, test = str(tmp_path / "base"), str(tmp_path / "test")
+    result = compareLogs(base + "/1.0_WF/step1.log", test + "/1.0_WF/step1.log")
+    assert result[:4] == (4, 32, 2, 30)
+    assert result[4] == ["old 1", "old 2"]
+    assert result[5] == ["new %s" % i for i in range(30, 10, -1)]
+    assert getRelevantDiff(result, "l1", "l2") == 23
+    logs = ["/1.0_WF/step1.log"] * 5
+    assert list(compareCommonLogs(base, test, logs, 3)) == [result] * 5
+
+
+def test_event_content_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(logRootQAUtils, "EDM_EVENT_SIZE_CACHE_DIR", str(tmp_path / "cache"))
+    rootFile = str(tmp_path / "step1.root")
+    with open(rootFile, "w") as ref:
+        ref.write("root")
+    with open(rootFile + ".edmEventSize", "w") as ref:
+        ref.write("File step1.root Events 10\n\nrecoTracks_x 10 5\n")
+    content = {"no_events": False, "products": ["File", "recoTracks_x"]}
+    assert logRootQAUtils.getEventContent(rootFile, True) == content
+    os.remove(rootFile + ".edmEventSize")
+    assert logRootQAUtils.getEventContent(rootFile, True) == content
+    # the same baseline file, linked from the workspace of another PR test
+    os.makedirs(str(tmp_path / "pr2"))
+    os.symlink(rootFile, str(tmp_path / "pr2" / "step1.root"))
+    assert logRootQAUtils.getEventContent(str(tmp_path / "pr2" / "step1.root"), True) == content
+    assert logRootQAUtils.parseEdmEventSize(("", "step1.root contains no Events")) == {
+        "no_events": True,
+        "products": [],
+    }
@@ -5,6 +5,7 @@ import unittest
 sys.path.append(os.path.join(os.path.dirname(__file__), "../"))
 
 from logreaderUtils import transform_and_write_config_file, add_exception_to_config, ResultTypeEnum
+from logreaderUtils import add_exception_to_config_regexp, get_exception_rule_set, make_step_log
 
 unittestlog = """
 ===== Test "Para_" ====
@@ -133,6 +134,23 @@ class TestSequenceFunctions(unittest.TestCase):
         transform_and_write_config_file("/tmp/unittestlogs.log-read_config", config_list)
         print("Example config file in %s" % ("/tmp/unittestlogs.log-read_config"))
 
+    def test_rule_set_matches_regexp(self):
+        custom_rule_set = [
+            {
+                "str_to_match": "test (.*) had ERRORS",
+                "name": "{0} failed",
+                "control_type": ResultTypeEnum.ISSUE,
+                "literal": " had errors",
+            }
+        ]
+        lines = unittestlog.split("\n") + make_step_log(1000)
+        for rules in [None, custom_rule_set]:
+            expected = []
+            for index, l in enumerate(lines):
+                add_exception_to_config_regexp(l, index, expected, rules)
+            self.assertTrue(len(expected) > 5)
+            self.assertEqual(get_exception_rule_set(rules).scan(lines), expected)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+from hashlib import sha256
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from logwatch import logwatch
+
+
+def append(log, text):
+    with open(str(log), "a") as ref:
+        ref.write(text)
+
+
+def run(logDir, logs, fail_on=None):
+    lines = []
+
+    def callback(line, count):
+        if line == fail_on:
+            return False
+        lines.append(line)
+        return True
+
+    ok, count = logwatch("test", log_dir=str(logDir)).process([str(l) for l in logs], callback)
+    return ok, lines
+
+
+def test_tail_and_rotation(tmp_path):
+    log = tmp_path / "access_log"
+    append(log, "l1\nl2\nl3 partial")
+    assert run(tmp_path, [log]) == (True, ["l1", "l2"])
+    assert run(tmp_path, [log]) == (True, [])
+    append(log, "\nl4\nl5\n")
+    assert run(tmp_path, [log], "l4") == (False, ["l3 partial"])
+    assert run(tmp_path, [log]) == (True, ["l4", "l5"])
+
+    # rotation: the log is renamed and a new one created
+    append(log, "l6\n")
+    rotated = tmp_path / "access_log-1"
+    os.rename(str(log), str(rotated))
+    t = time.time() - 3600
+    os.utime(str(rotated), (t, t))
+    append(log, "n1\nn2\n")
+    assert run(tmp_path, [rotated, log]) == (True, ["l6", "n1", "n2"])
+    assert run(tmp_path, [rotated, log]) == (True, [])
+
+
+def test_old_info_file(tmp_path):
+    log = tmp_path / "access_log"
+    append(log, "l1\nl2\nl3\n")
+    os.makedirs(str(tmp_path / "logwatch_test"))
+    with open(str(tmp_path / "logwatch_test" / "info"), "w") as ref:
+        ref.write("%s 2\n" % ("0" * 64))
+    # Unknown first line hash: all the log is read again
+    assert run(tmp_path, [log]) == (True, ["l1", "l2", "l3"])
+    with open(str(tmp_path / "logwatch_test" / "info"), "w") as ref:
+        ref.write("%s 2\n" % sha256(b"l1").hexdigest())
+    assert run(tmp_path, [log]) == (True, ["l2", "l3"])
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+from time import sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from monitor_sampler import (
+    AdaptiveInterval,
+    ColumnWriter,
+    ProcSampler,
+    columns_to_json,
+    parse_smaps_rollup,
+    parse_stat,
+    read_columns,
+)
+
+
+def test_parse_proc_files():
+    stat = "42 (a (b) c) S 7 42 42 0 -1 0 0 0 0 0 120 30 0 0 20 0 3 0 900 0 0"
+    assert parse_stat(stat) == (7, 150, 3, 900)
+    smaps = "Rss: 100 kB\nPss: 60 kB\nPrivate_Clean: 10 kB\nPrivate_Dirty: 20 kB\n"
+    assert parse_smaps_rollup(smaps) == (60 * 1024, 30 * 1024)
+
+
+def test_sample_process_tree():
+    proc = subprocess.Popen(["sh", "-c", "sleep 30 & sleep 30 & wait"])
+    try:
+        sleep(0.5)
+        sampler = ProcSampler(proc.pid)
+        stats = sampler.sample()
+        assert stats["processes"] == 2
+        assert stats["rss"] > 0 and stats["num_fds"] > 0
+        assert sampler.tree(sampler.last_scan + 1) == sampler.pids
+        assert len(sampler.pids) == 3
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_adaptive_interval():
+    interval = AdaptiveInterval(1, 4, factor=2)
+    stats = {"rss": 1000, "cpu": 100, "processes": 1}
+    assert [interval.update(stats) for i in range(4)] == [1, 2, 4, 4]
+    assert interval.update(dict(stats, rss=2000)) == 1
+    assert interval.update(dict(stats, rss=2000)) == 2
+    assert interval.update(dict(stats, rss=2000, processes=2)) == 1
+
+
+def test_columns_round_trip(tmp_path):
+    path = str(tmp_path / "stats.columns")
+    samples = [{"time": t, "interval": 1.0, "rss": t * 10, "cpu": 100} for t in range(5)]
+    writer = ColumnWriter(path, block_size=2)
+    for stats in samples:
+        writer.add(stats)
+    writer.close()
+    with open(path) as ref:
+        assert len(ref.readlines()) == 3
+    read = list(read_columns(path))
+    assert [(s["time"], s["rss"], s["pss"]) for s in read] == [(t, t * 10, 0) for t in range(5)]
+    columns_to_json(path, str(tmp_path / "stats.json"))
+    with open(str(tmp_path / "stats.json")) as ref:
+        assert json.load(ref) == read
@@ -24,10 +24,18 @@ class SkipWatchers:
     def __enter__(self):
         global skip_watchers
         skip_watchers = True
+        self.reset_watchers_index()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         global skip_watchers
         skip_watchers = False
+        self.reset_watchers_index()
+
+    @staticmethod
+    def reset_watchers_index():
+        # process_pr caches the compiled watchers.yaml, which must not outlive the hook
+        if "process_pr" in sys.modules:
+            sys.modules["process_pr"].WATCHERS_INDEX.clear()
 
 
 # Utility function for recording calls and optionally calling the original function
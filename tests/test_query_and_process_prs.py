@@ -0,0 +1,117 @@
+import importlib.util
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import github_utils
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "query-and-process-prs.py")
+spec = importlib.util.spec_from_file_location("query_and_process_prs", SCRIPT)
+qpp = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(qpp)
+
+
+class FakeIssue(object):
+    def __init__(self, number, pull_request=True):
+        self.number = number
+        self.pull_request = pull_request
+
+
+class FakeRepo(object):
+    full_name = "cms-sw/cmssw"
+
+    def __init__(self, issues):
+        self.issues = issues
+
+    def get_issues(self, **kwds):
+        return self.issues
+
+    def get_issue(self, number):
+        return [i for i in self.issues if i.number == number][0]
+
+
+class FakeGithub(object):
+    repo = None
+
+    def __init__(self, login_or_token=None):
+        pass
+
+    def get_repo(self, name):
+        return FakeGithub.repo
+
+
+class FakeResult(object):
+    def __init__(self, value):
+        self.value = value
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self.value
+
+
+class FakePool(object):
+    """Runs the workers synchronously, with their own GitHub api cache stats"""
+
+    def __init__(self):
+        self.calls = []
+
+    def apply_async(self, func, args):
+        self.calls.append(args)
+        parent_stats = dict(github_utils.GH_API_CACHE_STATS)
+        try:
+            return FakeResult(func(*args))
+        finally:
+            github_utils.GH_API_CACHE_STATS.update(parent_stats)
+
+
+def fake_process_pr(repo_config, gh, repo, issue, dryRun, **kwds):
+    print("processing", issue.number)
+    github_utils.GH_API_CACHE_STATS["hit"] += issue.number
+    github_utils.GH_API_CACHE_STATS["not_modified"] += 1
+    if issue.number == 2:
+        raise RuntimeError("failed to process")
+
+
+def setup_script(monkeypatch, tmp_path, issues):
+    token = tmp_path / "token"
+    token.write_text("dummy")
+    FakeGithub.repo = FakeRepo(issues)
+    monkeypatch.setattr(qpp, "repo_config", types.SimpleNamespace(GH_TOKEN=str(token)), False)
+    monkeypatch.setattr(qpp, "process_pr", fake_process_pr, False)
+    monkeypatch.setattr(qpp, "Github", FakeGithub)
+    monkeypatch.setattr(qpp, "api_rate_limits", lambda gh, msg=True: None)
+    monkeypatch.setattr(
+        github_utils, "GH_API_CACHE_STATS", dict.fromkeys(github_utils.GH_API_CACHE_STATS, 0)
+    )
+    return FakeGithub.repo
+
+
+def test_check_prs_jobs(monkeypatch, tmp_path, capsys):
+    repo = setup_script(monkeypatch, tmp_path, [FakeIssue(1), FakeIssue(2), FakeIssue(3, None)])
+    pool = FakePool()
+    stats = {"count": 0, "time": 0.0, "failed": []}
+    assert qpp.check_prs(None, repo, None, False, True, pool, 2, stats) == 1
+    assert pool.calls == [("cms-sw/cmssw", 1, True), ("cms-sw/cmssw", 2, True)]
+    assert (stats["count"], stats["failed"]) == (2, ["cms-sw/cmssw#2"])
+    # the cache stats of the workers are added up in the parent
+    assert github_utils.get_github_api_cache_stats()["hit"] == 3
+    assert github_utils.get_github_api_cache_stats()["not_modified"] == 2
+    out = capsys.readouterr().out
+    assert "Only processing PRs, skipped issue:  3" in out
+    # the output of each worker is printed as a block, after its header
+    assert "==================== cms-sw/cmssw#1 ====================\nprocessing 1\n" in out
+    assert "RuntimeError: failed to process" in out
+    assert "Processed cms-sw/cmssw#1 in" in out
+    assert "Failed cms-sw/cmssw#2 in" in out
+
+
+def test_check_prs_serial(monkeypatch, tmp_path, capsys):
+    repo = setup_script(monkeypatch, tmp_path, [FakeIssue(1), FakeIssue(3)])
+    stats = {"count": 0, "time": 0.0, "failed": []}
+    assert qpp.check_prs(None, repo, None, False, True, None, 1, stats) == 0
+    assert (stats["count"], stats["failed"]) == (2, [])
+    assert github_utils.get_github_api_cache_stats()["hit"] == 4
+    assert "processing 3" in capsys.readouterr().out
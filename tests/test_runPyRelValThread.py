@@ -0,0 +1,43 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from runPyRelValThread import PyRelValsThread
+
+STEP_LOG = """Begin processing the 1st record. Run 1, Event 1, LumiSection 1
+%MSG-w Foo:  Bar
+%MSG
+Begin processing the 2nd record. Run 1, Event 2, LumiSection 1
+%MSG-e Foo:  Bar
+----- Begin Fatal Exception 18-Oct-2026 10:00:00 CEST-----------------
+"""
+
+
+def make_relval_logs(basedir):
+    for wf, steps in [("1.0_ProdMinBias", 3), ("11.5_Other", 1), ("136.1_Data", 2)]:
+        os.makedirs(os.path.join(basedir, wf))
+        for step in range(1, steps + 1):
+            with open(os.path.join(basedir, wf, "step%s_%s.log" % (step, wf)), "w") as ref:
+                ref.write(STEP_LOG * step)
+        open(os.path.join(basedir, wf, "wf.done"), "w").close()
+    open(os.path.join(basedir, "done.1of1"), "w").close()
+
+
+def parse_logs(topDir, jobs):
+    basedir = os.path.join(topDir, "pyRelValPartialLogs")
+    make_relval_logs(basedir)
+    relvals = PyRelValsThread(1, basedir, "1of1", topDir)
+    relvals.parseLog(jobs)
+    with open(os.path.join(topDir, "runTheMatrixMsgs.pkl"), "rb") as ref:
+        return pickle.load(ref)
+
+
+def test_parse_logs(tmp_path, monkeypatch):
+    monkeypatch.setenv("SKIP_ES_STATS", "true")
+    serial = parse_logs(str(tmp_path / "serial"), 1)
+    assert serial["1.0"] == {"events": [2, 4, 6], "failed": [1, 2, 3], "warning": [1, 2, 3]}
+    assert serial["11.5"] == {"events": [2, -1, -1], "failed": [1, -1, -1], "warning": [1, -1, -1]}
+    assert parse_logs(str(tmp_path / "parallel"), 3) == serial
+    read_config = tmp_path / "parallel" / "pyRelValPartialLogs" / "1.0_ProdMinBias"
+    assert (read_config / "step2_1.0_ProdMinBias.log-read_config").exists()
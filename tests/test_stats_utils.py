@@ -0,0 +1,103 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import stats_utils
+from es_utils import es_workflow_stats, get_summary_stats_from_json_file
+from stats_utils import StatsSketch, WorkflowSummary, load_summary, summary_stats
+
+SAMPLES = [
+    {"time": t, "rss": rss, "cpu": cpu, "processes": 2}
+    for t, rss, cpu in [(1, 300, 400), (2, 100, 800), (3, 400, 200), (4, 200, 600), (5, 500, 0)]
+]
+
+
+def test_summary_stats(tmp_path):
+    path = str(tmp_path / "wf_stats-step1.json")
+    with open(path, "w") as ref:
+        json.dump(SAMPLES, ref)
+    sdata = get_summary_stats_from_json_file(path, 2)
+    assert (sdata["time"], sdata["processes"]) == (5, 2)
+    assert [sdata["rss_" + t] for t in ["min", "max", "avg", "median", "25", "75", "90"]] == [
+        100,
+        500,
+        300,
+        300,
+        150,
+        450,
+        500,
+    ]
+    assert (sdata["cpu_min"], sdata["cpu_max"], sdata["cpu_avg"]) == (0, 400, 200)
+    # avg weighted by the sampling intervals
+    columns = stats_utils.rows_to_columns(SAMPLES)
+    columns["interval"] = [1, 1, 1, 1, 6]
+    assert summary_stats(columns)["rss_avg"] == 400
+
+
+def test_summary_stats_numpy():
+    numpy = pytest.importorskip("numpy")
+    random.seed(1)
+    for dlen in [1, 2, 5, 100]:
+        columns = dict(
+            [(x, [random.randint(0, 10**10) for i in range(dlen)]) for x in ["rss", "vms"]]
+        )
+        columns["cpu"] = [random.randint(0, 800) for i in range(dlen)]
+        expected = summary_stats(columns, 4)
+        stats_utils.numpy = None
+        try:
+            assert summary_stats(columns, 4) == expected
+        finally:
+            stats_utils.numpy = numpy
+
+
+def test_workflow_summary_sketch(tmp_path):
+    random.seed(2)
+    values = [random.gauss(1000, 100) for i in range(20000)]
+    halves = [WorkflowSummary(), WorkflowSummary()]
+    for i, v in enumerate(values):
+        halves[i % 2].add({"rss": v, "time": i})
+    halves[0].merge(halves[1])
+    path = str(tmp_path / "wf_stats-step1.json")
+    with open(path, "w") as ref:
+        json.dump(halves[0].to_dict(), ref)
+    sdata = get_summary_stats_from_json_file(path, 1)
+    values.sort()
+    assert sdata["time"] == 19999
+    assert (sdata["rss_min"], sdata["rss_max"]) == (values[0], values[-1])
+    for t, q in [("25", 0.25), ("median", 0.5), ("90", 0.9)]:
+        assert abs(sdata["rss_" + t] - values[int(q * len(values))]) < 5
+    assert len(load_summary(halves[0].to_dict()).sketches["rss"].centroids) <= 100
+
+
+def test_sketch_weights():
+    sketch = StatsSketch()
+    for v, w in [(10, 1), (20, 1), (30, 8)]:
+        sketch.add(v, w)
+    sketch.add(40, 0)
+    assert (sketch.count, sketch.max, sketch.summary()["avg"]) == (3, 30, 27)
+    assert 25 < sketch.quantile(0.5) < 30
+    assert sketch.quantile(0.9) == 30
+
+
+def test_es_workflow_stats():
+    hits = [
+        {"workflow": "1.0", "step": "step1", "time": t, "rss_75": r, "cpu_75": c}
+        for t, r, c in [(10, 2000, 100), (21, 4000, 5)]
+    ] + [{"workflow": "1.0", "step": "step2", "time": 7, "rss_75": 10, "cpu_75": 20}, {}]
+    for hit in hits:
+        hit.update({"rss_max": 5000, "cpu_max": 200})
+    stats = es_workflow_stats({"hits": {"hits": [{"_source": h} for h in hits]}})
+    assert stats["1.0"]["step1"] == {
+        "time": 15,
+        "rss": 3000,
+        "cpu": 52,
+        "rss_max": 5000,
+        "cpu_max": 200,
+        "rss_avg": 4000,
+        "cpu_avg": 126,
+    }
+    assert (stats["1.0"]["step2"]["rss"], stats["1.0"]["step2"]["cpu"]) == (5000, 20)
@@ -0,0 +1,94 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from unitTestLogParser import UnitTestLogConsumer, UnitTestLogParser, parseUnitTestLog
+import checkTestLog
+from splitUnitTestLog import LogSplitter
+
+LOG = [
+    b">> Entering Package Sub/Pkg\n",
+    b'===== Test "testA" ====\n',
+    b"Begin Fatal Exception\n",
+    b"---> test testA had ERRORS\n",
+    b"^^^^ End Test testA ^^^^\n",
+    b'===== Test "testB" ====\n',
+    b"caf\xc3\xa9\n",
+    b"---> test testB succeeded\n",
+    b"^^^^ End Test testB ^^^^\n",
+    b">> Tests for package Sub/Pkg ran.\n",
+    b">> Leaving Package Sub/Pkg\n",
+]
+
+
+class Recorder(UnitTestLogConsumer):
+    def __init__(self):
+        self.events = []
+        self.lines = []
+
+    def line(self, line, lineNo, isTestMarker):
+        self.lines.append((lineNo, isTestMarker))
+
+    def packageStart(self, pkg, lineNo):
+        self.events.append(("packageStart", pkg, lineNo))
+
+    def packageLeave(self, pkg, lineNo):
+        self.events.append(("packageLeave", pkg, lineNo))
+
+    def packageTestsRan(self, pkg, lineNo):
+        self.events.append(("packageTestsRan", pkg, lineNo))
+
+    def testStart(self, test, lineNo):
+        self.events.append(("testStart", test, lineNo))
+
+    def testResult(self, test, result, lineNo):
+        self.events.append(("testResult", test, result, lineNo))
+
+    def testEnd(self, test, lineNo):
+        self.events.append(("testEnd", test, lineNo))
+
+    def exception(self, config):
+        self.events.append(("exception", config["name"]))
+
+    def endLog(self, nLines):
+        self.events.append(("endLog", nLines))
+
+
+def test_events():
+    rec = Recorder()
+    UnitTestLogParser([rec, UnitTestLogConsumer()], exceptionRules=[]).parseLines(LOG)
+    assert rec.events == [
+        ("packageStart", "Sub/Pkg", 0),
+        ("testStart", "testA", 1),
+        ("exception", " Fatal Exception at line #3"),
+        ("testResult", "testA", "had ERRORS", 3),
+        ("testEnd", "testA", 4),
+        ("testStart", "testB", 5),
+        ("testResult", "testB", "succeeded", 7),
+        ("testEnd", "testB", 8),
+        ("packageTestsRan", "Sub/Pkg", 9),
+        ("packageLeave", "Sub/Pkg", 10),
+        ("endLog", 11),
+    ]
+    assert [n for n, marker in rec.lines if marker] == [1, 3, 4, 5, 7, 8]
+
+
+def test_check_and_split_in_one_pass(tmp_path):
+    logFile = str(tmp_path / "unitTests.log")
+    with open(logFile, "wb") as ref:
+        ref.write(b"".join(LOG))
+    summary = open(str(tmp_path / "summary.log"), "w")
+    parseUnitTestLog(
+        logFile, [checkTestLog.TestLogChecker(summary, True), LogSplitter(summary, True)]
+    )
+    summary.close()
+
+    with open(str(tmp_path / "unitTestResults.pkl"), "rb") as ref:
+        unpickler = pickle.Unpickler(ref)
+        assert unpickler.load() == {"Sub/Pkg": [["testA", "testB"], 1, 1]}
+        assert unpickler.load() == {"testA": "had ERRORS", "testB": "succeeded"}
+    with open(str(tmp_path / "unitTestLogs" / "Sub" / "Pkg" / "unitTest.log")) as ref:
+        assert ref.read() == "".join(l.decode("ascii", "ignore") for l in LOG[1:10])
+    with open(str(tmp_path / "summary.log")) as ref:
+        assert ref.read().count("in total:  tests OK : 1 tests FAIL : 1") == 2
@@ -0,0 +1,57 @@
+import glob
+import os
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from watchers_index import WatchersIndex, get_watchers_regexp
+
+CMS_BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHANGED_FILES = [
+    "Geometry/HGCalCommonData/data/hgcal.xml",
+    "DataFormats/TrackReco/interface/Track.h",
+    "DataFormats/Tra",
+    "DataFormats/L1Trigger/src/classes.h",
+    "L1Trigger/L1TMuon/src/Foo.cc",
+    "RecoEcal/EgammaCoreTools/src/EcalClusterTools.cc",
+    "RecoPPS/Local/src/Foo.cc",
+    "MagneticField/Engine/src/MagneticField.cc",
+    "HLTrigger/Configuration/python/HLT_GRun_cff.py",
+    ".clang-tidy",
+    "xclang-tidy",
+    "README.md",
+    "",
+]
+
+
+def test_watchers_index_matches_regexp():
+    for watchers_file in [os.path.join(CMS_BOT_DIR, "watchers.yaml")] + glob.glob(
+        os.path.join(CMS_BOT_DIR, "repos", "*", "*", "watchers.yaml")
+    ):
+        with open(watchers_file) as ref:
+            watchers = yaml.safe_load(ref) or {}
+        # Regexp matching is slow for the full watchers.yaml, only use a sample of packages
+        regexps = sorted(set(regexp for v in watchers.values() for regexp in v))
+        chg_files = CHANGED_FILES + [regexp + "/src/file.cc" for regexp in regexps[::25]]
+        index = WatchersIndex(watchers)
+        assert index.get_watchers(chg_files) == get_watchers_regexp(watchers, chg_files)
+        for chg_file in CHANGED_FILES:
+            assert index.get_watchers([chg_file]) == get_watchers_regexp(watchers, [chg_file])
+
+
+def test_watchers_index_prefix_and_regexp():
+    index = WatchersIndex(
+        {
+            "alice": ["Geometry/", "DataFormats/Tra"],
+            "bob": ["Geometry"],
+            "carol": [".*L1T", "RecoPPS/*"],
+            "dave": [],
+        }
+    )
+    assert index.get_watchers(["Geometry/Foo/a.cc"]) == {"alice", "bob"}
+    assert index.get_watchers(["GeometryX/a.cc"]) == {"bob"}
+    assert index.get_watchers(["DataFormats/TrackReco/a.h"]) == {"alice"}
+    assert index.get_watchers(["L1Trigger/L1TMuon/a.cc", "RecoPPS"]) == {"carol"}
+    assert index.get_watchers(["Foo/a.cc"]) == set()
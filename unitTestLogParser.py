@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Single pass parser of the scram unit tests logs (unitTests.log of an IB and the
+per package unitTest.log files split out of it).
+
+The log is read once and the markers written by scram (">> Entering Package",
+'===== Test "..." ====', "^^^^ End Test ... ^^^^", "---> test ... had ERRORS",
+...) are turned into events, which are dispatched to all the consumers. So one
+read of the log can feed e.g. splitUnitTestLog.LogSplitter,
+checkTestLog.TestLogChecker and the ES payloads of es_ibs_log.py.
+"""
+
+from __future__ import print_function
+import re
+
+PKG_START_RE = re.compile("^>> Entering Package (.*)")
+PKG_LEAVE_RE = re.compile("^>> Leaving Package (.*)")
+PKG_TESTS_RAN_RE = re.compile("^>> Tests for package (.*) ran.")
+TEST_START_RE = re.compile('^===== Test\\s+"(.*)" ====')
+TEST_END_RE = re.compile(r"^\^\^\^\^ End Test\s+(.*?)\s+\^\^\^\^")
+TEST_RESULT_RE = re.compile(".*---> test\\s+([^\\s]+)\\s+(had ERRORS|succeeded)")
+
+
+class UnitTestLogConsumer(object):
+    """Base class for the consumers of the UnitTestLogParser events, all are optional"""
+
+    def startLog(self, logFile):
+        pass
+
+    def line(self, line, lineNo, isTestMarker):
+        """called for each line (before its other events), only if overridden"""
+        pass
+
+    def packageStart(self, pkg, lineNo):
+        pass
+
+    def packageLeave(self, pkg, lineNo):
+        pass
+
+    def packageTestsRan(self, pkg, lineNo):
+        pass
+
+    def testResult(self, test, result, lineNo):
+        pass
+
+    def testStart(self, test, lineNo):
+        pass
+
+    def testEnd(self, test, lineNo):
+        pass
+
+    def exception(self, config):
+        """a logreaderUtils exception rule match, only if the parser looks for them"""
+        pass
+
+    def endLog(self, nLines):
+        pass
+
+
+class UnitTestLogParser(object):
+    def __init__(self, consumers, exceptionRules=None):
+        """
+        exceptionRules: None to not look for exceptions, otherwise the custom rules
+        for logreaderUtils.get_exception_rule_set (which are used on top of the default ones)
+        """
+        self.consumers = consumers
+        self.exceptionRules = exceptionRules
+        self.lineConsumers = [c for c in consumers if type(c).line is not UnitTestLogConsumer.line]
+
+    def _emit(self, event, *args):
+        for consumer in self.consumers:
+            getattr(consumer, event)(*args)
+
+    def parseLines(self, lines, logFile=None):
+        """lines can be str or bytes (decoded as ascii, ignoring errors)"""
+        exceptionRuleSet = None
+        if self.exceptionRules is not None:
+            from logreaderUtils import get_exception_rule_set
+
+            exceptionRuleSet = get_exception_rule_set(self.exceptionRules)
+
+        self._emit("startLog", logFile)
+        lineNo = -1
+        for line in lines:
+            lineNo += 1
+            if not isinstance(line, str):
+                line = line.decode("ascii", "ignore")
+
+            if exceptionRuleSet is not None:
+                config = exceptionRuleSet.match(line.strip(), lineNo)
+                if config:
+                    self._emit("exception", config)
+
+            events = []
+            if line.startswith(">> "):
+                for regexp, event in (
+                    (PKG_START_RE, "packageStart"),
+                    (PKG_LEAVE_RE, "packageLeave"),
+                    (PKG_TESTS_RAN_RE, "packageTestsRan"),
+                ):
+                    match = regexp.match(line)
+                    if match:
+                        events.append((event, match.group(1)))
+            isTestMarker = False
+            if "---> test" in line:
+                match = TEST_RESULT_RE.match(line)
+                if match:
+                    isTestMarker = True
+                    events.append(("testResult", match.group(1), match.group(2)))
+            if line.startswith("===== Test"):
+                match = TEST_START_RE.match(line)
+                if match:
+                    isTestMarker = True
+                    events.append(("testStart", match.group(1)))
+            elif line.startswith("^^^^ End Test"):
+                match = TEST_END_RE.match(line)
+                if match:
+                    isTestMarker = True
+                    events.append(("testEnd", match.group(1)))
+
+            for consumer in self.lineConsumers:
+                consumer.line(line, lineNo, isTestMarker)
+            for event in events:
+                self._emit(event[0], *(event[1:] + (lineNo,)))
+        self._emit("endLog", lineNo + 1)
+
+    def parse(self, logFile):
+        lf = open(logFile, "rb")
+        try:
+            self.parseLines(lf, logFile)
+        finally:
+            lf.close()
+
+
+def parseUnitTestLog(logFile, consumers, exceptionRules=None):
+    """reads logFile once and sends its events to all the consumers"""
+    UnitTestLogParser(consumers, exceptionRules).parse(logFile)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Index of watchers.yaml (github user -> list of watched file regexps).
+
+Each watched regexp is matched against the beginning of a changed file
+(i.e. re.match("^" + regexp + ".*", file)). Most of the entries are plain
+path prefixes (e.g. "Geometry/" or "DataFormats/Tra"), these are stored in
+a prefix trie so that the users watching a file are found by walking the
+file path once. The few real regexps (e.g. ".*L1T") are compiled once and
+only tried for files which match at least one of them.
+
+Run this script to compare it with the old per file/user/regexp matching:
+  watchers_index.py [-n repeat] [-f files] [watchers.yaml] [changed-files.txt]
+"""
+
+from __future__ import print_function
+import re
+
+REGEXP_CHARS = re.compile(r"[^A-Za-z0-9_/\-]")
+
+
+class WatchersIndex(object):
+    def __init__(self, watchers):
+        self.trie = {}
+        self.regexps = []
+        self.combined_regexp = None
+        regexp_users = {}
+        for user, watched_regexp in list((watchers or {}).items()):
+            for regexp in watched_regexp or []:
+                if REGEXP_CHARS.search(regexp):
+                    regexp_users.setdefault(regexp, set()).add(user)
+                    continue
+                node = self.trie
+                for c in regexp:
+                    node = node.setdefault(c, {})
+                node.setdefault(None, set()).add(user)
+        for regexp in sorted(regexp_users):
+            self.regexps.append((re.compile(regexp), regexp_users[regexp]))
+        if self.regexps:
+            self.combined_regexp = re.compile(
+                "|".join("(?:%s)" % regexp for regexp in sorted(regexp_users))
+            )
+
+    def get_file_watchers(self, chg_file, users=None):
+        if users is None:
+            users = set()
+        node = self.trie
+        for c in chg_file:
+            if None in node:
+                users.update(node[None])
+            node = node.get(c)
+            if node is None:
+                break
+        else:
+            if None in node:
+                users.update(node[None])
+        if self.combined_regexp and self.combined_regexp.match(chg_file):
+            for regexp, regexp_users in self.regexps:
+                if regexp.match(chg_file):
+                    users.update(regexp_users)
+        return users
+
+    def get_watchers(self, chg_files):
+        """Returns the set of users watching at least one of chg_files"""
+        users = set()
+        for chg_file in set(chg_files):
+            self.get_file_watchers(chg_file, users)
+        return users
+
+
+def get_watchers_regexp(watchers, chg_files):
+    """Reference implementation: one regexp match per file, user and regexp"""
+    return set(
+        [
+            user
+            for chg_file in chg_files
+            for user, watched_regexp in list(watchers.items())
+            for regexp in watched_regexp
+            if re.match("^" + regexp + ".*", chg_file)
+        ]
+    )
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+    from os.path import dirname, abspath, join
+    from time import time
+    import yaml
+
+    parser = OptionParser(usage="%prog [-n repeat] [-f files] [watchers.yaml] [changed-files.txt]")
+    parser.add_option("-n", "--repeat", dest="repeat", type="int", default=1)
+    parser.add_option(
+        "-f", "--files", dest="files", type="int", default=100, help="Number of synthetic files"
+    )
+    opts, args = parser.parse_args()
+    watchers_file = args[0] if args else join(dirname(abspath(__file__)), "watchers.yaml")
+    with open(watchers_file) as ref:
+        watchers = yaml.safe_load(ref) or {}
+    if len(args) > 1:
+        with open(args[1]) as ref:
+            chg_files = [f.strip() for f in ref if f.strip()]
+    else:
+        # A large synthetic PR: one file in each of the first N watched packages
+        chg_files = sorted(
+            set(
+                "%s/src/file.cc" % regexp.replace(".*", "")
+                for watched_regexp in watchers.values()
+                for regexp in watched_regexp
+            )
+        )[: opts.files]
+    print(
+        "Watchers: %s users, %s regexps; changed files: %s"
+        % (len(watchers), sum(len(v) for v in watchers.values()), len(chg_files))
+    )
+
+    stime = time()
+    for _ in range(opts.repeat):
+        ref_users = get_watchers_regexp(watchers, chg_files)
+    ref_time = (time() - stime) / opts.repeat
+
+    stime = time()
+    index = WatchersIndex(watchers)
+    build_time = time() - stime
+    stime = time()
+    for _ in range(opts.repeat):
+        users = index.get_watchers(chg_files)
+    index_time = (time() - stime) / opts.repeat
+
+    print("Regexp matching: %.4f sec, %s users" % (ref_time, len(ref_users)))
+    print(
+        "Watchers index : %.4f sec, %s users (index built in %.4f sec)"
+        % (index_time, len(users), build_time)
+    )
+    if users != ref_users:
+        print("ERROR: results differ: %s" % sorted(users ^ ref_users))
+        exit(1)
+    if index_time > 0:
+        print("Speedup: %.1fx" % (ref_time / index_time))